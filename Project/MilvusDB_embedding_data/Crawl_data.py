@@ -1,24 +1,27 @@
 import psycopg2
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterator
 import logging
 from datetime import datetime
 import json
 import csv
+import uuid
 
 
 class DataCrawler:
     """Module để crawl data từ PostgreSQL và format theo structure mong muốn"""
 
-    def __init__(self, db_config: Dict[str, str]):
+    def __init__(self, db_config: Dict[str, str], itersize: int = 2000):
         """
         Khởi tạo DataCrawler với config database
 
         Args:
             db_config: Dictionary chứa thông tin kết nối DB
                       {'host': 'localhost', 'database': 'your_db', 'user': 'user', 'password': 'pass'}
+            itersize: Số rows mỗi lần fetch từ server-side cursor
         """
         self.db_config = db_config
         self.connection = None
+        self.itersize = itersize
 
     def connect_db(self) -> bool:
         """Kết nối đến PostgreSQL database"""
@@ -36,6 +39,94 @@ class DataCrawler:
             self.connection.close()
             logging.info("Đã đóng kết nối database")
 
+    def _iter_query(self, query: str, params: tuple = None) -> Iterator[Dict[str, Any]]:
+        """
+        Chạy query bằng server-side (named) cursor và yield từng row dạng dict
+
+        Args:
+            query: Câu SQL
+            params: Tham số cho query
+
+        Yields:
+            Dictionary {column: value}, fetch từng đợt self.itersize rows
+        """
+        if not self.connection:
+            if not self.connect_db():
+                raise Exception("Không kết nối được database")
+
+        cursor = self.connection.cursor(name=f"crawl_{uuid.uuid4().hex[:8]}")
+        cursor.itersize = self.itersize
+
+        try:
+            cursor.execute(query, params)
+            columns = None
+
+            for row in cursor:
+                if columns is None:
+                    columns = [desc[0] for desc in cursor.description]
+                yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+            # Kết thúc transaction của named cursor
+            self.connection.rollback()
+
+    def _sample_percent(self, limit: int, oversample: float = 3.0) -> float:
+        """
+        Tính % cho TABLESAMPLE BERNOULLI từ số rows ước lượng (pg_class.reltuples)
+
+        Args:
+            limit: Số record cần lấy
+            oversample: Hệ số lấy dư, bù cho phương sai của sample và reltuples cũ
+
+        Returns:
+            Phần trăm trong khoảng (0, 100], 100 nếu chưa có thống kê
+        """
+        if not self.connection:
+            if not self.connect_db():
+                raise Exception("Không kết nối được database")
+
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = 'ai_craw.toidispy_full'::regclass")
+            row = cursor.fetchone()
+        self.connection.rollback()
+
+        estimated_rows = row[0] if row else 0
+        if not estimated_rows or estimated_rows <= 0:
+            return 100.0
+        return min(100.0, max(0.0001, limit * oversample * 100.0 / estimated_rows))
+
+    def iter_random_data(self, limit: int = 200) -> Iterator[Dict[str, Any]]:
+        """Giống crawl_random_data nhưng trả về generator"""
+        # TABLESAMPLE BERNOULLI chọn từng row độc lập (SYSTEM chọn cả block nên rows bị dồn cụm),
+        # ORDER BY RANDOM() chỉ chạy trên mẫu nhỏ
+        sample_percent = self._sample_percent(limit)
+        # Query để lấy data ngẫu nhiên và format theo structure mong muốn
+        # Sửa tên bảng và column name dựa trên schema thực tế
+        query = """
+        SELECT 
+            COALESCE(_id, CONCAT('SP_', SUBSTRING(MD5(_id::text), 1, 8))) as id_sanpham,
+            COALESCE(original_url, thumb_url, '') as image,
+            COALESCE(CAST(created_at_std AS text), CAST(NOW() AS text)) as date,
+            COALESCE(CAST("like" AS text), '0') as like,
+            COALESCE(CAST(comment AS text), '0') as comment,
+            COALESCE(CAST(share AS text), '0') as share,
+            COALESCE(final_url, link, '') as link_redirect,
+            COALESCE(platform, 'Website') as platform,
+            COALESCE(domain, 'unknown') as name_store
+        FROM ai_craw.toidispy_full TABLESAMPLE BERNOULLI (%s)
+        ORDER BY RANDOM()
+        LIMIT %s
+        """
+        while True:
+            # Tối đa limit rows nên giữ trong bộ nhớ được
+            rows = list(self._iter_query(query, (sample_percent, limit)))
+            if len(rows) >= limit or sample_percent >= 100.0:
+                break
+            # reltuples cũ / mẫu thiếu: query lại với % cao hơn
+            print(f"⚠️ Sample {sample_percent:.4f}% chỉ được {len(rows)}/{limit} rows, thử lại với % cao hơn")
+            sample_percent = min(100.0, sample_percent * 4)
+        yield from rows
+
     def crawl_random_data(self, limit: int = 200) -> List[Dict[str, Any]]:
         """
         Crawl ngẫu nhiên data từ bảng toidispy_full và format theo structure mong muốn
@@ -46,40 +137,8 @@ class DataCrawler:
         Returns:
             List dictionary chứa data theo format mong muốn
         """
-        if not self.connection:
-            if not self.connect_db():
-                return []
-
         try:
-            cursor = self.connection.cursor()
-
-            # Query để lấy data ngẫu nhiên và format theo structure mong muốn
-            # Sửa tên bảng và column name dựa trên schema thực tế
-            query = """
-            SELECT 
-                COALESCE(_id, CONCAT('SP_', SUBSTRING(MD5(_id::text), 1, 8))) as id_sanpham,
-                COALESCE(original_url, thumb_url, '') as image,
-                COALESCE(CAST(created_at_std AS text), CAST(NOW() AS text)) as date,
-                COALESCE(CAST("like" AS text), '0') as like,
-                COALESCE(CAST(comment AS text), '0') as comment,
-                COALESCE(CAST(share AS text), '0') as share,
-                COALESCE(final_url, link, '') as link_redirect,
-                COALESCE(platform, 'Website') as platform,
-                COALESCE(domain, 'unknown') as name_store
-            FROM ai_craw.toidispy_full
-            ORDER BY RANDOM()
-            LIMIT %s
-            """
-
-            cursor.execute(query, (limit,))
-            columns = [desc[0] for desc in cursor.description]
-            results = []
-
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                results.append(row_dict)
-
-            cursor.close()
+            results = list(self.iter_random_data(limit))
             logging.info(f"Đã crawl {len(results)} records ngẫu nhiên từ database")
             return results
 
@@ -98,47 +157,8 @@ class DataCrawler:
         Returns:
             List dictionary chứa data theo format mong muốn
         """
-        if not self.connection:
-            if not self.connect_db():
-                return []
-
         try:
-            cursor = self.connection.cursor()
-
-            # Query được sửa để tránh lỗi với reserved keywords và sửa column name
-            base_query = """
-            SELECT 
-                COALESCE(_id, CONCAT('SP_', SUBSTRING(MD5(_id::text), 1, 8))) as id_sanpham,
-                COALESCE(original_url, thumb_url, '') as image,
-                COALESCE(CAST(created_at_std AS text), CAST(NOW() AS text)) as date,
-                COALESCE(CAST("like" AS text), '0') as like,
-                COALESCE(CAST(comment AS text), '0') as comment,
-                COALESCE(CAST(share AS text), '0') as share,
-                COALESCE(final_url, link, '') as link_redirect,
-                COALESCE(platform, 'Website') as platform,
-                COALESCE(domain, 'unknown') as name_store
-            FROM ai_craw.toidispy_full
-            """
-
-            # Thêm điều kiện WHERE nếu có
-            if conditions:
-                base_query += f" WHERE {conditions}"
-
-            base_query += " ORDER BY created_at_std DESC"
-
-            # Thêm LIMIT nếu có
-            if limit > 0:
-                base_query += f" LIMIT {limit}"
-
-            cursor.execute(base_query)
-            columns = [desc[0] for desc in cursor.description]
-            results = []
-
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                results.append(row_dict)
-
-            cursor.close()
+            results = list(self.iter_data_from_db(limit, conditions))
             logging.info(f"Đã crawl {len(results)} records từ database")
             return results
 
@@ -146,6 +166,35 @@ class DataCrawler:
             logging.error(f"Lỗi khi crawl data: {e}")
             return []
 
+    def iter_data_from_db(self, limit: int = 100, conditions: str = "") -> Iterator[Dict[str, Any]]:
+        """Giống crawl_data_from_db nhưng trả về generator (server-side cursor)"""
+        # Query được sửa để tránh lỗi với reserved keywords và sửa column name
+        base_query = """
+        SELECT 
+            COALESCE(_id, CONCAT('SP_', SUBSTRING(MD5(_id::text), 1, 8))) as id_sanpham,
+            COALESCE(original_url, thumb_url, '') as image,
+            COALESCE(CAST(created_at_std AS text), CAST(NOW() AS text)) as date,
+            COALESCE(CAST("like" AS text), '0') as like,
+            COALESCE(CAST(comment AS text), '0') as comment,
+            COALESCE(CAST(share AS text), '0') as share,
+            COALESCE(final_url, link, '') as link_redirect,
+            COALESCE(platform, 'Website') as platform,
+            COALESCE(domain, 'unknown') as name_store
+        FROM ai_craw.toidispy_full
+        """
+
+        # Thêm điều kiện WHERE nếu có
+        if conditions:
+            base_query += f" WHERE {conditions}"
+
+        base_query += " ORDER BY created_at_std DESC"
+
+        # Thêm LIMIT nếu có
+        if limit > 0:
+            base_query += f" LIMIT {limit}"
+
+        return self._iter_query(base_query)
+
     def get_product_data(self, product_id: str = None, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Lấy data sản phẩm với filter theo ID (optional)
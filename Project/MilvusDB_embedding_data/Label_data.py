@@ -1,8 +1,7 @@
 import psycopg2
 import os
 import json
-import requests
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Iterator
 from dataclasses import dataclass, asdict
 from enum import Enum
 import base64
@@ -14,7 +13,16 @@ import uuid
 import numpy as np
 from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
 import time
-from embedding_service import EmbeddingService
+from embedding_server import create_embedding_service
+from http_fetcher import get_default_fetcher
+from dedup_index import DedupIndex
+from index_profiles import VECTOR_FIELDS, build_index_params, build_search_params, detect_index_profile, get_profile_name
+from scalar_fields import (
+    DATE_TS_FIELD, DEFAULT_NUM_PARTITIONS, EMBEDDING_MODEL_FIELD, collection_partition_key,
+    create_scalar_indexes, date_ts_field, embedding_model_field, embedding_model_version, has_field, parse_date_ts
+)
+from vector_dtypes import detect_vector_dtype, get_vector_dtype_name, to_milvus_vectors, vector_field
+from time_partitions import ensure_partitions, is_month_partition, month_partition_name
 import ollama
 
 
@@ -67,12 +75,20 @@ class ProductRecord:
 class IntegratedProductPipeline:
     """Module tích hợp: Crawl Data → Label → Insert Milvus với Jina v4"""
 
+    # Số rows crawl được gom lại để lọc trùng lặp 1 lần
+    CRAWL_CHUNK_SIZE = 500
+
     def __init__(self,
                  db_config: Dict[str, str],
                  google_api_key: str,
                  ollama_model: str = "llava:7b",
                  milvus_host: str = "10.10.10.140",
-                 milvus_port: str = "19530"):
+                 milvus_port: str = "19530",
+                 crawl_itersize: int = 2000,
+                 index_profile: Optional[str] = None,
+                 partition_key: Optional[str] = None,
+                 vector_dtype: Optional[str] = None,
+                 partition_by_month: bool = False):
         """
         Khởi tạo pipeline tích hợp với Ollama và Google + Jina v4
 
@@ -82,10 +98,18 @@ class IntegratedProductPipeline:
             ollama_model: Model Ollama để sử dụng (llava:7b, llava:13b, bakllava, etc.)
             milvus_host: Milvus host
             milvus_port: Milvus port
+            crawl_itersize: Số rows mỗi lần fetch từ server-side cursor khi crawl
+            index_profile: ANN index profile (mặc định MILVUS_INDEX_PROFILE)
+            partition_key: Field làm partition key khi tạo collection mới ('platform' / 'name_store')
+            vector_dtype: Kiểu lưu vector khi tạo collection mới (FLOAT / FLOAT16 / BFLOAT16,
+                          mặc định MILVUS_VECTOR_DTYPE)
+            partition_by_month: Insert vào partition theo tháng của date ('p_YYYYMM'),
+                                tự bật nếu collection đã có partition tháng
         """
         # Database config
         self.db_config = db_config
         self.db_connection = None
+        self.crawl_itersize = crawl_itersize
 
         # AI Labeler
         self.ollama_model = ollama_model
@@ -93,8 +117,13 @@ class IntegratedProductPipeline:
 
         # Khởi tạo EmbeddingService với Jina v4
         print("🔧 Khởi tạo Jina v4 Embedding Service...")
-        self.embedding_service = EmbeddingService()
+        # EMBEDDING_SERVER_URL / EMBEDDING_BATCHING: dùng chung model thay vì load riêng
+        self.embedding_service = create_embedding_service()
         self.embedding_dim = self.embedding_service.embedding_dim
+        self.embedding_model_version = embedding_model_version(self.embedding_service.model_name)
+
+        # HTTP client dùng chung (connection pool, retry)
+        self.http_fetcher = get_default_fetcher()
 
         # Khởi tạo Google Gemini
         if google_api_key:
@@ -106,6 +135,17 @@ class IntegratedProductPipeline:
         self.milvus_port = milvus_port
         self.collection_name = "product_collection_Goldenphoenix"  # Tên collection mới
         self.collection = None
+        self.index_profile = get_profile_name(index_profile)
+        self.partition_key = collection_partition_key(partition_key)
+        self.vector_dtype = get_vector_dtype_name(vector_dtype)
+        if partition_by_month and self.partition_key:
+            raise ValueError("partition_by_month không dùng chung được với partition_key")
+        self.partition_by_month = partition_by_month
+        self.known_partitions = set()
+        self.has_date_ts = False
+        # Collection có embedding_model thì mỗi record được tag phiên bản model đã tạo vectors
+        self.has_embedding_model = False
+        self.dedup_index = DedupIndex(self.collection_name)
 
         # Log embedding model info
         model_info = self.embedding_service.get_model_info()
@@ -118,6 +158,7 @@ class IntegratedProductPipeline:
         self._connect_db()
         self._connect_milvus()
         self._setup_collection()
+        self.dedup_index.load_or_rebuild(self.collection)
 
     def _connect_db(self) -> bool:
         """Kết nối đến PostgreSQL database"""
@@ -145,8 +186,8 @@ class IntegratedProductPipeline:
         """Tạo schema cho collection với embedding dimensions động"""
         fields = [
             FieldSchema(name="id_sanpham", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=100),
-            FieldSchema(name="image_vector", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_dim),
-            FieldSchema(name="description_vector", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_dim),
+            vector_field("image_vector", self.embedding_dim, self.vector_dtype),
+            vector_field("description_vector", self.embedding_dim, self.vector_dtype),
             FieldSchema(name="image", dtype=DataType.VARCHAR, max_length=1000),
             FieldSchema(name="description", dtype=DataType.VARCHAR, max_length=5000),
             FieldSchema(name="metadata", dtype=DataType.JSON),
@@ -155,8 +196,12 @@ class IntegratedProductPipeline:
             FieldSchema(name="comment", dtype=DataType.VARCHAR, max_length=20),
             FieldSchema(name="share", dtype=DataType.VARCHAR, max_length=20),
             FieldSchema(name="link_redirect", dtype=DataType.VARCHAR, max_length=2000),
-            FieldSchema(name="platform", dtype=DataType.VARCHAR, max_length=200),
-            FieldSchema(name="name_store", dtype=DataType.VARCHAR, max_length=500)
+            FieldSchema(name="platform", dtype=DataType.VARCHAR, max_length=200,
+                        is_partition_key=self.partition_key == "platform"),
+            FieldSchema(name="name_store", dtype=DataType.VARCHAR, max_length=500,
+                        is_partition_key=self.partition_key == "name_store"),
+            date_ts_field(),
+            embedding_model_field()
         ]
 
         schema = CollectionSchema(
@@ -173,38 +218,55 @@ class IntegratedProductPipeline:
                 print(f"✅ Load collection '{self.collection_name}' thành công")
             else:
                 schema = self._create_collection_schema()
-                self.collection = Collection(self.collection_name, schema)
+                if self.partition_key:
+                    self.collection = Collection(self.collection_name, schema,
+                                                 num_partitions=DEFAULT_NUM_PARTITIONS)
+                else:
+                    self.collection = Collection(self.collection_name, schema)
                 self._create_indexes()
                 print(f"✅ Tạo collection '{self.collection_name}' thành công với {self.embedding_dim}D vectors")
 
+            self.has_date_ts = has_field(self.collection, DATE_TS_FIELD)
+            self.has_embedding_model = has_field(self.collection, EMBEDDING_MODEL_FIELD)
+            self.vector_dtype = detect_vector_dtype(self.collection)
+            self.known_partitions = {partition.name for partition in self.collection.partitions}
+            if not self.partition_by_month and any(is_month_partition(name) for name in self.known_partitions):
+                self.partition_by_month = True
+                print("🗂️  Collection đã có partition theo tháng → insert theo partition tháng")
+            if not self.has_date_ts:
+                print(f"⚠️  Collection chưa có field {DATE_TS_FIELD}, chạy migrate_scalar_fields.py để filter theo ngày nhanh hơn")
+
             self.collection.load()
 
         except Exception as e:
             raise Exception(f"❌ Lỗi setup collection: {str(e)}")
 
     def _create_indexes(self):
-        """Tạo index cho vector fields"""
-        # Chọn nlist phù hợp với embedding dimension
-        nlist = min(self.embedding_dim, 1024)
-
-        index_params = {
-            "metric_type": "COSINE",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": nlist}
-        }
-
-        self.collection.create_index(
-            field_name="image_vector",
-            index_params=index_params,
-            index_name="image_vector_index"
-        )
-
-        self.collection.create_index(
-            field_name="description_vector",
-            index_params=index_params,
-            index_name="description_vector_index"
-        )
-        print(f"✅ Tạo indexes thành công với nlist={nlist}")
+        """Tạo index cho vector fields theo index profile"""
+        index_params = build_index_params(self.index_profile)
+
+        for field_name in VECTOR_FIELDS:
+            self.collection.create_index(
+                field_name=field_name,
+                index_params=index_params,
+                index_name=f"{field_name}_index"
+            )
+        print(f"✅ Tạo indexes thành công: {index_params['index_type']} {index_params['params']}")
+        create_scalar_indexes(self.collection)
+
+    def _insert_columns(self, data: List[list], dates: List[str]):
+        """Insert column data; partition theo tháng thì tách rows theo partition trước khi insert"""
+        if not self.partition_by_month:
+            self.collection.insert(data)
+            return
+
+        groups: Dict[str, List[int]] = {}
+        for i, date in enumerate(dates):
+            groups.setdefault(month_partition_name(parse_date_ts(date)), []).append(i)
+        ensure_partitions(self.collection, groups, self.known_partitions)
+        for partition_name, indexes in groups.items():
+            self.collection.insert([[column[i] for i in indexes] for column in data],
+                                   partition_name=partition_name)
 
     # === DUPLICATE CHECK METHODS ===
     def check_id_exists(self, id_sanpham: str) -> bool:
@@ -236,37 +298,18 @@ class IntegratedProductPipeline:
         """
         Kiểm tra nhiều ID cùng lúc để tối ưu performance
 
+        Dùng dedup index local, chỉ query Milvus (chunk `in [...]`) cho các ID chưa có local.
+        Lỗi Milvus được raise ra ngoài thay vì coi tất cả là chưa tồn tại.
+
         Args:
             id_list: List các ID cần kiểm tra
 
         Returns:
             Dictionary {id: exists_status}
         """
-        try:
-            if not id_list:
-                return {}
-
-            # Tạo expression OR cho nhiều ID
-            id_conditions = [f'id_sanpham == "{id_val}"' for id_val in id_list]
-            expr = " or ".join(id_conditions)
-
-            # Query tất cả ID cùng lúc
-            results = self.collection.query(
-                expr=expr,
-                output_fields=["id_sanpham"],
-                limit=len(id_list)
-            )
-
-            # Tạo set các ID đã tồn tại
-            existing_ids = {result["id_sanpham"] for result in results}
-
-            # Tạo dictionary kết quả
-            return {id_val: id_val in existing_ids for id_val in id_list}
-
-        except Exception as e:
-            print(f"⚠️  Lỗi kiểm tra batch IDs: {str(e)}")
-            # Fallback: coi như tất cả đều chưa tồn tại
-            return {id_val: False for id_val in id_list}
+        if not id_list:
+            return {}
+        return self.dedup_index.check_ids(self.collection, id_list)
 
     def filter_existing_records(self, raw_data_list: List[Dict[str, Any]]) -> tuple:
         """
@@ -321,30 +364,53 @@ class IntegratedProductPipeline:
             return new_records, existing_records, duplicate_count
 
         except Exception as e:
-            print(f"❌ Lỗi khi lọc records trùng lặp: {str(e)}")
-            # Fallback: trả về tất cả records như mới
-            return raw_data_list, [], 0
+            # Không fallback coi tất cả là record mới: sẽ label lại record đã có
+            raise Exception(f"Lỗi khi lọc records trùng lặp: {str(e)}")
+
+    def _filter_chunk(self, chunk: List[Dict[str, Any]], stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Lọc trùng lặp 1 chunk crawl và cập nhật stats"""
+        new_records, existing_records, duplicate_count = self.filter_existing_records(chunk)
+        stats['crawled_count'] += len(chunk)
+        stats['duplicate_count'] += duplicate_count
+        stats['skipped_duplicates'].extend(record.get('id_sanpham', 'unknown') for record in existing_records)
+        return new_records
+
+    def _iter_new_records(self, start_date: str, end_date: str, limit: int,
+                          stats: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Crawl dạng stream, lọc trùng lặp theo từng chunk"""
+        chunk = []
+
+        for raw_data in self.iter_data_by_date_range(start_date, end_date, limit):
+            chunk.append(raw_data)
+            if len(chunk) >= self.CRAWL_CHUNK_SIZE:
+                yield from self._filter_chunk(chunk, stats)
+                chunk = []
+
+        if chunk:
+            yield from self._filter_chunk(chunk, stats)
 
     # === CRAWL DATA METHODS ===
-    def crawl_data_by_date_range(self, start_date: str, end_date: str, limit: int = 1000) -> List[Dict[str, Any]]:
+    def iter_data_by_date_range(self, start_date: str, end_date: str, limit: int = 1000) -> Iterator[Dict[str, Any]]:
         """
-        Crawl data từ database theo khoảng thời gian từ bảng product_marketing_summary
+        Crawl data theo khoảng thời gian dạng generator, dùng server-side (named) cursor
 
         Args:
             start_date: Ngày bắt đầu (YYYY-MM-DD)
             end_date: Ngày kết thúc (YYYY-MM-DD)
             limit: Số lượng record tối đa
 
-        Returns:
-            List dictionary chứa data thô từ database
+        Yields:
+            Dictionary data thô của từng record, fetch từng đợt self.crawl_itersize rows
         """
         if not self.db_connection:
             if not self._connect_db():
-                return []
+                raise Exception("Không kết nối được PostgreSQL")
 
-        try:
-            cursor = self.db_connection.cursor()
+        cursor = self.db_connection.cursor(name=f"crawl_{uuid.uuid4().hex[:8]}")
+        cursor.itersize = self.crawl_itersize
+        count = 0
 
+        try:
             query = """
             SELECT 
                 COALESCE(product_id::text, CONCAT('SP_', SUBSTRING(MD5(RANDOM()::text), 1, 8))) as id_sanpham,
@@ -371,17 +437,35 @@ class IntegratedProductPipeline:
             """
 
             cursor.execute(query, (start_date, end_date, limit))
-            columns = [desc[0] for desc in cursor.description]
-            results = []
+            columns = None
 
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                results.append(row_dict)
+            for row in cursor:
+                if columns is None:
+                    columns = [desc[0] for desc in cursor.description]
+                count += 1
+                yield dict(zip(columns, row))
 
+            print(f"✅ Crawl được {count} records từ {start_date} đến {end_date}")
+
+        finally:
             cursor.close()
-            print(f"✅ Crawl được {len(results)} records từ {start_date} đến {end_date}")
-            return results
+            # Kết thúc transaction của named cursor
+            self.db_connection.rollback()
+
+    def crawl_data_by_date_range(self, start_date: str, end_date: str, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Crawl data từ database theo khoảng thời gian từ bảng product_marketing_summary
 
+        Args:
+            start_date: Ngày bắt đầu (YYYY-MM-DD)
+            end_date: Ngày kết thúc (YYYY-MM-DD)
+            limit: Số lượng record tối đa
+
+        Returns:
+            List dictionary chứa data thô từ database
+        """
+        try:
+            return list(self.iter_data_by_date_range(start_date, end_date, limit))
         except Exception as e:
             print(f"❌ Lỗi khi crawl data: {e}")
             return []
@@ -478,9 +562,7 @@ Bạn là một chuyên gia phân tích sản phẩm. Hãy phân tích hình ả
     def _download_image(self, url: str) -> bytes:
         """Download image từ URL"""
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            return response.content
+            return self.http_fetcher.fetch(url, timeout=30)
         except Exception as e:
             raise Exception(f"Lỗi download ảnh: {str(e)}")
 
@@ -827,8 +909,8 @@ Bạn là một chuyên gia phân tích sản phẩm. Hãy phân tích hình ả
         try:
             data = [
                 [record.id_sanpham],
-                [record.image_vector],
-                [record.description_vector],
+                to_milvus_vectors([record.image_vector], self.vector_dtype),
+                to_milvus_vectors([record.description_vector], self.vector_dtype),
                 [record.image],
                 [record.description],
                 [record.metadata],
@@ -840,9 +922,13 @@ Bạn là một chuyên gia phân tích sản phẩm. Hãy phân tích hình ả
                 [record.platform],
                 [record.name_store]
             ]
+            if self.has_date_ts:
+                data.append([parse_date_ts(record.date)])
+            if self.has_embedding_model:
+                data.append([self.embedding_model_version] * len(data[0]))
 
-            mr = self.collection.insert(data)
-            self.collection.flush()
+            self._insert_columns(data, [record.date])
+            self.dedup_index.add_many([record.id_sanpham])
 
             return record.id_sanpham
 
@@ -865,8 +951,9 @@ Bạn là một chuyên gia phân tích sản phẩm. Hãy phân tích hình ả
 
             # Chuẩn bị data cho batch insert
             ids = [record.id_sanpham for record in records]
-            image_vectors = [record.image_vector for record in records]
-            description_vectors = [record.description_vector for record in records]
+            image_vectors = to_milvus_vectors([record.image_vector for record in records], self.vector_dtype)
+            description_vectors = to_milvus_vectors([record.description_vector for record in records],
+                                                    self.vector_dtype)
             images = [record.image for record in records]
             descriptions = [record.description for record in records]
             metadatas = [record.metadata for record in records]
@@ -893,9 +980,13 @@ Bạn là một chuyên gia phân tích sản phẩm. Hãy phân tích hình ả
                 platforms,
                 name_stores
             ]
+            if self.has_date_ts:
+                data.append([parse_date_ts(date) for date in dates])
+            if self.has_embedding_model:
+                data.append([self.embedding_model_version] * len(data[0]))
 
-            mr = self.collection.insert(data)
-            self.collection.flush()
+            self._insert_columns(data, dates)
+            self.dedup_index.add_many(ids)
 
             print(f"✅ Batch insert thành công {len(records)} records")
             return ids
@@ -942,81 +1033,69 @@ Bạn là một chuyên gia phân tích sản phẩm. Hãy phân tích hình ả
             'total_time_seconds': 0
         }
 
+        new_count = 0
         try:
-            # STEP 1: Crawl data từ database
-            print("📥 STEP 1: Crawl data từ database...")
-            raw_data_list = self.crawl_data_by_date_range(start_date, end_date, limit)
-
-            if not raw_data_list:
-                print("⚠️  Không có data để xử lý")
-                return stats
-
-            stats['crawled_count'] = len(raw_data_list)
-            print(f"✅ Crawl được {len(raw_data_list)} records")
-
-            # STEP 2: Check duplicates và lọc bỏ
-            print("🔍 STEP 2: Kiểm tra và lọc bỏ records trùng lặp...")
-            new_records, existing_records, duplicate_count = self.filter_existing_records(raw_data_list)
-
-            stats['duplicate_count'] = duplicate_count
-            stats['skipped_duplicates'] = [record.get('id_sanpham', 'unknown') for record in existing_records]
+            # Crawl (server-side cursor) → lọc trùng theo chunk → label + insert,
+            # không giữ toàn bộ kết quả crawl trong bộ nhớ
+            print(f"📥 Stream crawl + lọc trùng lặp + xử lý với batch_size={batch_size}...")
 
-            if not new_records:
-                print("⚠️  Tất cả records đã tồn tại trong Milvus, không có gì để xử lý")
-                return stats
-
-            print(f"✅ Sẽ xử lý {len(new_records)} records mới")
-
-            # STEP 3: Process từng record với batch
-            print(f"🔄 STEP 3: Xử lý {len(new_records)} records mới với batch_size={batch_size}")
-
-            for i in range(0, len(new_records), batch_size):
-                batch = new_records[i:i + batch_size]
-                batch_num = (i // batch_size) + 1
-                total_batches = (len(new_records) + batch_size - 1) // batch_size
-
-                print(f"📦 Batch {batch_num}/{total_batches}: Xử lý {len(batch)} records")
+            for record_idx, raw_data in enumerate(self._iter_new_records(start_date, end_date, limit, stats), 1):
+                new_count = record_idx
 
-                for j, raw_data in enumerate(batch):
-                    record_idx = i + j + 1
-
-                    try:
-                        print(f"  🔍 [{record_idx}/{len(new_records)}] Xử lý: {raw_data.get('id_sanpham', 'unknown')}")
+                try:
+                    print(f"  🔍 [{record_idx}] Xử lý: {raw_data.get('id_sanpham', 'unknown')}")
 
-                        # Process single record: label + vector
-                        record = self.process_single_record(raw_data, provider)
-                        stats['processed_count'] += 1
+                    # Process single record: label + vector
+                    record = self.process_single_record(raw_data, provider)
+                    stats['processed_count'] += 1
 
-                        # Insert vào Milvus
-                        inserted_id = self.insert_record(record)
-                        stats['inserted_count'] += 1
-                        stats['inserted_ids'].append(inserted_id)
+                    # Insert vào Milvus
+                    inserted_id = self.insert_record(record)
+                    stats['inserted_count'] += 1
+                    stats['inserted_ids'].append(inserted_id)
 
-                        print(f"  ✅ [{record_idx}/{len(new_records)}] Thành công: {inserted_id}")
+                    print(f"  ✅ [{record_idx}] Thành công: {inserted_id}")
 
-                        # Delay nhỏ để tránh rate limit
-                        time.sleep(0.5)
+                    # Delay nhỏ để tránh rate limit
+                    time.sleep(0.5)
 
-                    except Exception as e:
-                        stats['failed_count'] += 1
-                        error_info = {
-                            'id_sanpham': raw_data.get('id_sanpham', 'unknown'),
-                            'image_url': raw_data.get('image', ''),
-                            'error': str(e)
-                        }
-                        stats['failed_records'].append(error_info)
-                        print(f"  ❌ [{record_idx}/{len(new_records)}] Lỗi: {str(e)}")
-                        continue
+                except Exception as e:
+                    stats['failed_count'] += 1
+                    error_info = {
+                        'id_sanpham': raw_data.get('id_sanpham', 'unknown'),
+                        'image_url': raw_data.get('image', ''),
+                        'error': str(e)
+                    }
+                    stats['failed_records'].append(error_info)
+                    print(f"  ❌ [{record_idx}] Lỗi: {str(e)}")
 
                 # Log batch progress
-                print(f"📦 Batch {batch_num}/{total_batches} hoàn thành")
-                print(f"   ✅ Thành công: {stats['processed_count']}/{len(new_records)}")
-                print(f"   ❌ Thất bại: {stats['failed_count']}/{len(new_records)}")
+                if record_idx % batch_size == 0:
+                    print(f"📦 Batch {record_idx // batch_size} hoàn thành")
+                    print(f"   ✅ Thành công: {stats['processed_count']}/{record_idx}")
+                    print(f"   ❌ Thất bại: {stats['failed_count']}/{record_idx}")
+
+            if not stats['crawled_count']:
+                print("⚠️  Không có data để xử lý")
+            elif not new_count:
+                print("⚠️  Tất cả records đã tồn tại trong Milvus, không có gì để xử lý")
 
         except Exception as e:
             print(f"❌ Lỗi nghiêm trọng trong pipeline: {str(e)}")
 
         finally:
+            # Flush 1 lần cuối run thay vì sau mỗi insert (tránh tạo nhiều segment nhỏ)
+            try:
+                self.collection.flush()
+            except Exception as e:
+                print(f"⚠️  Không flush được collection: {str(e)}")
+
+            # Lưu dedup index cho lần chạy sau
+            try:
+                self.dedup_index.save()
+            except Exception as e:
+                print(f"⚠️  Không lưu được dedup index: {str(e)}")
+
             # Tính toán thời gian
             end_time = time.time()
             stats['total_time_seconds'] = round(end_time - start_time, 2)
@@ -1028,16 +1107,14 @@ Bạn là một chuyên gia phân tích sản phẩm. Hãy phân tích hình ả
             print(f"📊 THỐNG KÊ TỔNG KẾT:")
             print(f"   📥 Crawl: {stats['crawled_count']} records")
             print(f"   🔄 Trùng lặp (bỏ qua): {stats['duplicate_count']} records")
-            print(f"   🆕 Records mới: {len(new_records) if 'new_records' in locals() else 0} records")
+            print(f"   🆕 Records mới: {new_count} records")
             print(f"   🔄 Xử lý: {stats['processed_count']} records")
             print(f"   ✅ Insert thành công: {stats['inserted_count']} records")
             print(f"   ❌ Thất bại: {stats['failed_count']} records")
             print(f"   ⏱️  Tổng thời gian: {stats['total_time_seconds']}s")
 
             # Tính tỉ lệ thành công trên records mới (không tính trùng lặp)
-            new_records_count = len(new_records) if 'new_records' in locals() else max(
-                stats['crawled_count'] - stats['duplicate_count'], 1)
-            success_rate = stats['inserted_count'] / max(new_records_count, 1) * 100
+            success_rate = stats['inserted_count'] / max(new_count, 1) * 100
             print(f"   📈 Tỉ lệ thành công: {success_rate:.1f}%")
 
             # Hiển thị collection stats
@@ -1062,13 +1139,12 @@ Bạn là một chuyên gia phân tích sản phẩm. Hãy phân tích hình ả
             field_name: Field vector để search ("image_vector" hoặc "description_vector")
             top_k: Số kết quả trả về
         """
-        search_params = {
-            "metric_type": "COSINE",
-            "params": {"nprobe": 10}
-        }
+        # Params theo index thật trên field (self.index_profile chỉ là fallback khi chưa có index)
+        profile = detect_index_profile(self.collection, field_name, default=self.index_profile)
+        search_params = build_search_params(profile)
 
         results = self.collection.search(
-            data=[query_vector],
+            data=to_milvus_vectors([query_vector], self.vector_dtype),
             anns_field=field_name,
             param=search_params,
             limit=top_k,
@@ -0,0 +1,201 @@
+"""
+Benchmark recall@k và latency (p50/p99) của ANN index trên collection thật
+
+- Đọc vectors của collection bằng query_iterator, tính ground truth bằng brute force (NumPy)
+- Lấy mẫu query từ chính collection, search qua Milvus với từng giá trị trong sweep của profile
+- In bảng kết quả và lưu JSON để so sánh giữa các profile
+- --calibration: ghi thêm bảng (k, giá trị sweep) -> recall/p99 cho SearchParamTuner phía RAG
+
+Ví dụ (sau khi rebuild_indexes.py --profile HNSW):
+    python benchmark_index.py --collection product_collection_v4 --profile HNSW --queries 200 --k 10 100 200 \\
+        --calibration ../RAG_MultilAgent_Core/config/search_calibration.json
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pymilvus import Collection, connections
+
+from index_profiles import INDEX_PROFILES, VECTOR_FIELDS, build_search_params, get_index_profile
+from vector_dtypes import detect_vector_dtype, from_milvus_vector, to_milvus_vectors
+
+
+def load_vectors(collection: Collection, field: str, limit: Optional[int] = None,
+                 batch_size: int = 5000) -> Tuple[List[str], np.ndarray]:
+    """Đọc toàn bộ (hoặc limit) vectors của field (decode FLOAT16/BFLOAT16 về float32), trả về ids và ma trận đã L2-normalize"""
+    dtype_name = detect_vector_dtype(collection, field)
+    ids, chunks = [], []
+    iterator = collection.query_iterator(
+        batch_size=batch_size,
+        limit=limit if limit else -1,
+        expr='id_sanpham != ""',
+        output_fields=["id_sanpham", field]
+    )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            ids.extend(row["id_sanpham"] for row in batch)
+            chunks.append(np.vstack([from_milvus_vector(row[field], dtype_name) for row in batch]))
+            print(f"📥 Đã đọc {len(ids)} vectors...", end="\r")
+    finally:
+        iterator.close()
+    print()
+
+    matrix = np.vstack(chunks) if chunks else np.empty((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return ids, matrix / np.maximum(norms, 1e-12)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int, chunk_size: int = 256) -> np.ndarray:
+    """Ground truth top-k theo cosine (brute force), trả về chỉ số trong corpus"""
+    results = []
+    for i in range(0, len(queries), chunk_size):
+        scores = queries[i:i + chunk_size] @ corpus.T
+        top = np.argpartition(-scores, kth=min(k, scores.shape[1] - 1), axis=1)[:, :k]
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+        results.append(np.take_along_axis(top, order, axis=1))
+    return np.vstack(results)
+
+
+def run_sweep(collection: Collection, field: str, queries: np.ndarray, truth_ids: List[set],
+              k: int, search_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Search từng query (1 request/query để đo latency thực tế, convert theo kiểu vector của collection), tính recall và percentiles"""
+    dtype_name = detect_vector_dtype(collection, field)
+    latencies, recalls = [], []
+    for query, truth in zip(to_milvus_vectors(queries, dtype_name), truth_ids):
+        start = time.perf_counter()
+        results = collection.search(
+            data=[query],
+            anns_field=field,
+            param=search_params,
+            limit=k,
+            output_fields=["id_sanpham"]
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {hit.entity.get("id_sanpham") for hit in results[0]}
+        recalls.append(len(found & truth) / k)
+
+    latencies = np.asarray(latencies)
+    return {
+        'search_params': search_params['params'],
+        f'recall@{k}': round(float(np.mean(recalls)), 4),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'qps_single_client': round(1000 / float(latencies.mean()), 1),
+    }
+
+
+def benchmark(collection_name: str, profile: str, field: str = "description_vector",
+              num_queries: int = 200, ks: Tuple[int, ...] = (10,), corpus_limit: Optional[int] = None,
+              seed: int = 42) -> Dict[str, Any]:
+    """Chạy benchmark cho 1 collection với sweep tham số search của profile, cho từng k"""
+    collection = Collection(collection_name)
+    collection.load()
+
+    indexes = {index.field_name: index.params for index in collection.indexes}
+    print(f"🔍 Index hiện tại của {field}: {indexes.get(field)}")
+
+    ids, corpus = load_vectors(collection, field, corpus_limit)
+    if len(ids) == 0:
+        raise ValueError(f"Collection '{collection_name}' không có dữ liệu")
+    if corpus_limit and corpus_limit < collection.num_entities:
+        print("⚠️  Corpus bị giới hạn: recall đo được chỉ là cận dưới")
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(ids), size=min(num_queries, len(ids)), replace=False)
+    queries = corpus[sample]
+
+    print(f"🧮 Tính ground truth brute force cho {len(queries)} queries trên {len(ids)} vectors...")
+    truth = exact_top_k(corpus, queries, max(ks))
+
+    sweep_key, sweep_values = next(iter(get_index_profile(profile)["sweep"].items()))
+    rows = []
+    for k in sorted(ks):
+        # exact_top_k trả về theo thứ tự giảm dần nên top-k nhỏ hơn là prefix
+        truth_ids = [{ids[idx] for idx in row[:k]} for row in truth]
+        print(f"📏 k={k}")
+        for value in sweep_values:
+            # HNSW / DiskANN yêu cầu ef / search_list >= k
+            if sweep_key in ("ef", "search_list") and value < k:
+                continue
+            search_params = build_search_params(profile, overrides={sweep_key: value})
+            row = run_sweep(collection, field, queries, truth_ids, k, search_params)
+            row.update({'k': k, 'param': sweep_key, 'value': value, 'recall': row[f'recall@{k}']})
+            rows.append(row)
+            print(f"   {sweep_key}={value:<6} recall@{k}={row['recall']:.4f}  "
+                  f"p50={row['p50_ms']:.2f}ms  p99={row['p99_ms']:.2f}ms")
+
+    return {
+        'collection': collection_name,
+        'profile': profile,
+        'field': field,
+        'index': indexes.get(field),
+        'num_entities': collection.num_entities,
+        'corpus_size': len(ids),
+        'num_queries': len(queries),
+        'ks': sorted(ks),
+        'param': sweep_key,
+        'results': rows,
+        'timestamp': datetime.now().isoformat(),
+    }
+
+
+def update_calibration(path: str, report: Dict[str, Any]):
+    """Ghi/merge kết quả benchmark vào bảng calibration {profile: {field: {param, rows}}}"""
+    table = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+
+    table.setdefault(report['profile'], {})[report['field']] = {
+        'param': report['param'],
+        'index': report['index'],
+        'num_entities': report['num_entities'],
+        'updated_at': report['timestamp'],
+        'rows': [
+            {key: row[key] for key in ('k', 'value', 'recall', 'p50_ms', 'p99_ms')}
+            for row in report['results']
+        ],
+    }
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(table, f, indent=2, ensure_ascii=False, default=str)
+    print(f"📐 Đã cập nhật calibration: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recall@k / latency của Milvus index")
+    parser.add_argument("--host", default="10.10.4.25")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--profile", required=True, choices=sorted(INDEX_PROFILES),
+                        help="Profile của index đang build trên collection (quyết định tham số sweep)")
+    parser.add_argument("--field", default="description_vector", choices=list(VECTOR_FIELDS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[10])
+    parser.add_argument("--corpus-limit", type=int, default=None)
+    parser.add_argument("--output", default=None, help="File JSON lưu kết quả")
+    parser.add_argument("--calibration", default=None, help="File calibration cho SearchParamTuner (RAG)")
+    args = parser.parse_args()
+
+    connections.connect(alias="default", host=args.host, port=args.port)
+    report = benchmark(args.collection, args.profile, args.field, args.queries, tuple(args.k), args.corpus_limit)
+
+    output = args.output or f"benchmark_{args.collection}_{args.profile}_{args.field}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    print(f"💾 Đã lưu kết quả: {output}")
+
+    if args.calibration:
+        update_calibration(args.calibration, report)
+
+
+if __name__ == "__main__":
+    main()
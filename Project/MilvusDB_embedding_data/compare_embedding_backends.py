@@ -0,0 +1,154 @@
+"""
+So sánh embedding giữa backend PyTorch (tham chiếu) và ONNX Runtime / OpenVINO (fp32 hoặc int8) trên CPU
+
+- Parity: cosine giữa vector của 2 backend cho cùng text / image (min, mean) và overlap@k
+  của neighbors khi dùng vector mỗi backend để xếp hạng cùng một tập texts
+- Tốc độ: p50 / p99 latency khi embed từng query text và QPS khi embed batch
+
+Thoát với mã 1 nếu min cosine < --min-cosine (parity check trước khi bật JINA_BACKEND=onnx).
+
+Ví dụ:
+    python compare_embedding_backends.py --backend onnx --quantize --min-cosine 0.98
+    python compare_embedding_backends.py --texts-file queries.txt --images a.jpg b.jpg
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from embedding_service import JinaV4EmbeddingService
+
+SAMPLE_TEXTS = [
+    "Áo thun nam cotton in hình tối giản",
+    "Váy maxi hoa nhí đi biển mùa hè",
+    "Cốc sứ in tên theo yêu cầu làm quà tặng",
+    "Áo hoodie unisex form rộng màu pastel",
+    "Túi tote canvas in hình mèo dễ thương",
+    "Funny cat t-shirt for cat lovers",
+    "Personalized family name mug, Christmas gift",
+    "Vintage sunset mountain poster wall art",
+    "Ốp lưng điện thoại in ảnh cặp đôi",
+    "Gối tựa sofa in chữ thư pháp Tết",
+    "Matching couple hoodies with custom initials",
+    "Sticker laptop chống nước phong cách anime",
+]
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return np.sum(a * b, axis=1) / np.maximum(norms, 1e-12)
+
+
+def neighbor_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """Overlap@k giữa neighbors (trừ chính nó) xếp hạng bằng vector của mỗi backend"""
+    k = min(k, len(reference) - 1)
+    if k <= 0:
+        return 1.0
+
+    def top_k(vectors: np.ndarray) -> List[set]:
+        normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = normalized @ normalized.T
+        np.fill_diagonal(scores, -np.inf)
+        return [set(row) for row in np.argsort(-scores, axis=1)[:, :k]]
+
+    return float(np.mean([len(a & b) / k for a, b in zip(top_k(reference), top_k(candidate))]))
+
+
+def measure_speed(service: JinaV4EmbeddingService, texts: List[str], repeats: int,
+                  batch_size: int) -> Dict[str, float]:
+    """p50 / p99 latency từng query và QPS khi embed batch"""
+    service.embed_text(texts[0])  # warmup
+
+    latencies = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            service.embed_text(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        service.embed_texts_batch(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+
+    latencies = np.asarray(latencies)
+    return {
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'batch_qps': round(len(texts) * repeats / elapsed, 1),
+    }
+
+
+def compare(reference: JinaV4EmbeddingService, candidate: JinaV4EmbeddingService, texts: List[str],
+            images: List[str], k: int = 5, repeats: int = 3, batch_size: int = 32) -> Dict[str, Any]:
+    """Parity + tốc độ của candidate so với reference"""
+    report = {'num_texts': len(texts), 'num_images': len(images), 'k': k}
+
+    modalities = [("text", lambda service: service.embed_texts_batch(texts, batch_size=batch_size))]
+    if images:
+        modalities.append(("image", lambda service: service.embed_images_batch(images)))
+
+    for name, embed in modalities:
+        ref_vectors = np.asarray(embed(reference), dtype=np.float32)
+        cand_vectors = np.asarray(embed(candidate), dtype=np.float32)
+        valid = np.linalg.norm(ref_vectors, axis=1) > 0
+        cosines = cosine_rows(ref_vectors[valid], cand_vectors[valid])
+        report[name] = {
+            'min_cosine': round(float(cosines.min()), 5) if len(cosines) else None,
+            'mean_cosine': round(float(cosines.mean()), 5) if len(cosines) else None,
+            f'overlap@{k}': round(neighbor_overlap(ref_vectors[valid], cand_vectors[valid], k), 4),
+        }
+        print(f"🔍 {name:<5} cosine min={report[name]['min_cosine']} mean={report[name]['mean_cosine']} "
+              f"overlap@{k}={report[name][f'overlap@{k}']}")
+
+    for role, service in (("reference", reference), ("candidate", candidate)):
+        report[role] = {'backend': service.backend, 'dtype': service.get_model_info()['torch_dtype'],
+                        **measure_speed(service, texts, repeats, batch_size)}
+        print(f"⏱️  {role:<9} {service.backend:<8} p50={report[role]['p50_ms']}ms "
+              f"p99={report[role]['p99_ms']}ms batch={report[role]['batch_qps']} texts/s")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity + latency giữa backend PyTorch và ONNX Runtime")
+    parser.add_argument("--backend", default="onnx", choices=["onnx", "openvino"])
+    parser.add_argument("--quantize", action="store_true", help="So với bản int8 dynamic quantization")
+    parser.add_argument("--texts-file", default=None, help="File text, mỗi dòng 1 query (mặc định bộ mẫu)")
+    parser.add_argument("--images", nargs="*", default=[], help="URL / đường dẫn ảnh để so vision tower")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=0.99,
+                        help="Ngưỡng cosine tối thiểu (int8 thường thấp hơn fp32)")
+    parser.add_argument("--output", default=None, help="File JSON lưu kết quả")
+    args = parser.parse_args()
+
+    texts = SAMPLE_TEXTS
+    if args.texts_file:
+        with open(args.texts_file, encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    os.environ["JINA_ONNX_QUANTIZE"] = "true" if args.quantize else "false"
+    reference = JinaV4EmbeddingService(device="cpu", backend="torch")
+    candidate = JinaV4EmbeddingService(device="cpu", backend=args.backend)
+    report = compare(reference, candidate, texts, args.images, args.k, args.repeats, args.batch_size)
+
+    output = args.output or f"compare_backend_{args.backend}{'_int8' if args.quantize else ''}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Đã lưu kết quả: {output}")
+
+    min_cosine = min(report[name]['min_cosine'] for name in ("text", "image")
+                     if name in report and report[name]['min_cosine'] is not None)
+    if min_cosine < args.min_cosine:
+        print(f"❌ Parity không đạt: min cosine {min_cosine} < {args.min_cosine}")
+        sys.exit(1)
+    print(f"✅ Parity đạt: min cosine {min_cosine} >= {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
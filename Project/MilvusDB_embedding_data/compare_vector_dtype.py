@@ -0,0 +1,124 @@
+"""
+So sánh recall@k giữa collection float32 (baseline) và bản copy FLOAT16 / BFLOAT16 / index nén
+
+- Ground truth tính brute force trên vectors float32 của baseline
+- Cùng một tập query (float32, convert theo kiểu lưu của từng collection) search trên cả hai
+- In recall@k, overlap@k giữa hai collection, p50/p99 latency và RAM ước lượng của vector fields
+
+Ví dụ (sau khi migrate_scalar_fields.py --vector-dtype FLOAT16):
+    python compare_vector_dtype.py --baseline product_collection_v4 --candidate product_collection_v4_fp16 --k 10
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pymilvus import Collection, connections
+
+from benchmark_index import exact_top_k, load_vectors
+from index_profiles import INDEX_PROFILES, VECTOR_FIELDS, build_search_params
+from vector_dtypes import BYTES_PER_DIM, detect_vector_dtype, to_milvus_vectors
+
+
+def search_ids(collection: Collection, field: str, queries: np.ndarray, k: int,
+               search_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Search từng query (convert theo kiểu vector của collection), kèm p50/p99 latency phía client"""
+    dtype_name = detect_vector_dtype(collection, field)
+    found, latencies = [], []
+    for query in to_milvus_vectors(queries, dtype_name):
+        start = time.perf_counter()
+        results = collection.search(data=[query], anns_field=field, param=search_params,
+                                    limit=k, output_fields=["id_sanpham"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append({hit.entity.get("id_sanpham") for hit in results[0]})
+
+    latencies = np.asarray(latencies)
+    return {
+        'dtype': dtype_name,
+        'ids': found,
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+def vector_memory_mb(collection: Collection, dtype_name: str) -> float:
+    """RAM ước lượng của raw vectors (image_vector + description_vector), chưa tính index"""
+    dim = next(field.params.get("dim", 0) for field in collection.schema.fields if field.name in VECTOR_FIELDS)
+    return round(collection.num_entities * dim * BYTES_PER_DIM[dtype_name] * len(VECTOR_FIELDS) / 2 ** 20, 1)
+
+
+def compare(baseline_name: str, candidate_name: str, field: str = "description_vector",
+            num_queries: int = 200, k: int = 10, profile: Optional[str] = None,
+            candidate_profile: Optional[str] = None, corpus_limit: Optional[int] = None,
+            seed: int = 42) -> Dict[str, Any]:
+    """Recall@k của baseline và candidate so với ground truth float32"""
+    baseline = Collection(baseline_name)
+    candidate = Collection(candidate_name)
+    baseline.load()
+    candidate.load()
+
+    ids, corpus = load_vectors(baseline, field, corpus_limit)
+    if len(ids) == 0:
+        raise ValueError(f"Collection '{baseline_name}' không có dữ liệu")
+
+    rng = np.random.default_rng(seed)
+    queries = corpus[rng.choice(len(ids), size=min(num_queries, len(ids)), replace=False)]
+
+    print(f"🧮 Tính ground truth brute force cho {len(queries)} queries trên {len(ids)} vectors...")
+    truth = [{ids[idx] for idx in row} for row in exact_top_k(corpus, queries, k)]
+
+    report = {'field': field, 'k': k, 'num_queries': len(queries)}
+    runs: Dict[str, List[set]] = {}
+    for role, collection, role_profile in (("baseline", baseline, profile),
+                                           ("candidate", candidate, candidate_profile or profile)):
+        search_params = build_search_params(role_profile)
+        run = search_ids(collection, field, queries, k, search_params)
+        runs[role] = run.pop('ids')
+        recall = np.mean([len(found & expected) / k for found, expected in zip(runs[role], truth)])
+        report[role] = {
+            'collection': collection.name,
+            'search_params': search_params['params'],
+            **run,
+            f'recall@{k}': round(float(recall), 4),
+            'vector_memory_mb': vector_memory_mb(collection, run['dtype']),
+        }
+        print(f"   {role:<9} {collection.name} ({run['dtype']}): recall@{k}={recall:.4f}  "
+              f"p50={run['p50_ms']:.2f}ms  p99={run['p99_ms']:.2f}ms  "
+              f"~{report[role]['vector_memory_mb']} MB vectors")
+
+    overlap = np.mean([len(a & b) / k for a, b in zip(runs["baseline"], runs["candidate"])])
+    report[f'overlap@{k}'] = round(float(overlap), 4)
+    print(f"🔁 overlap@{k} baseline vs candidate: {overlap:.4f}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh recall giữa collection float32 và bản fp16/bf16")
+    parser.add_argument("--host", default="10.10.4.25")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--baseline", required=True, help="Collection float32")
+    parser.add_argument("--candidate", required=True, help="Collection FLOAT16 / BFLOAT16 / index nén")
+    parser.add_argument("--field", default="description_vector", choices=list(VECTOR_FIELDS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--profile", default=None, choices=sorted(INDEX_PROFILES),
+                        help="Profile quyết định search params (mặc định MILVUS_INDEX_PROFILE)")
+    parser.add_argument("--candidate-profile", default=None, choices=sorted(INDEX_PROFILES),
+                        help="Profile của candidate nếu khác baseline (ví dụ IVF_SQ8)")
+    parser.add_argument("--corpus-limit", type=int, default=None)
+    parser.add_argument("--output", default=None, help="File JSON lưu kết quả")
+    args = parser.parse_args()
+
+    connections.connect(alias="default", host=args.host, port=args.port)
+    report = compare(args.baseline, args.candidate, args.field, args.queries, args.k,
+                     args.profile, args.candidate_profile, args.corpus_limit)
+
+    output = args.output or f"compare_{args.baseline}_{args.candidate}_{args.field}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    print(f"💾 Đã lưu kết quả: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
 import time
 
+from vector_dtypes import vector_field
+
 
 # Kết nối tới Milvus
 def connect_milvus():
@@ -15,8 +17,9 @@ def connect_milvus():
 def create_collection_schema():
     fields = [
         FieldSchema(name="id_sanpham", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=100),
-        FieldSchema(name="image_vector", dtype=DataType.FLOAT_VECTOR, dim=1536),
-        FieldSchema(name="description_vector", dtype=DataType.FLOAT_VECTOR, dim=1536),
+        # Kiểu vector theo MILVUS_VECTOR_DTYPE (FLOAT / FLOAT16 / BFLOAT16)
+        vector_field("image_vector", 1536),
+        vector_field("description_vector", 1536),
         FieldSchema(name="image", dtype=DataType.VARCHAR, max_length=1000),
         FieldSchema(name="description", dtype=DataType.VARCHAR, max_length=5000),
         FieldSchema(name="metadata", dtype=DataType.JSON),
@@ -0,0 +1,226 @@
+"""
+Dedup index: tập primary key (id_sanpham) đã có trong Milvus, lưu local
+
+- Mỗi ID được hash thành uint64 (blake2b 8 bytes), lưu trong mảng NumPy đã sắp xếp
+  (~8 bytes/ID, 10 triệu ID ≈ 80 MB) và persist ra file .npy
+- Kiểm tra membership cho cả crawl bằng np.searchsorted, không cần query Milvus
+- ID chưa có trong index được xác nhận lại với Milvus bằng các query `in [...]` theo chunk,
+  nên record do process khác insert vẫn được phát hiện (incremental sync)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pod_dedup_index")
+
+
+def hash_ids(id_list: Iterable[str]) -> np.ndarray:
+    """Hash danh sách ID thành mảng uint64"""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(id_val).encode('utf-8'), digest_size=8).digest(), 'little')
+         for id_val in id_list),
+        dtype=np.uint64
+    )
+
+
+class DedupIndex:
+    """Tập hash của primary keys đã insert, thread-safe"""
+
+    def __init__(self,
+                 collection_name: str,
+                 index_dir: Optional[str] = None,
+                 query_chunk_size: int = 1000,
+                 max_age_hours: float = 24):
+        """
+        Args:
+            collection_name: Tên Milvus collection (mỗi collection 1 file index)
+            index_dir: Thư mục lưu index (mặc định DEDUP_INDEX_DIR hoặc ~/.cache/pod_dedup_index)
+            query_chunk_size: Số ID tối đa trong mỗi query `in [...]`
+            max_age_hours: Quá thời gian này kể từ lần full sync thì build lại từ Milvus
+        """
+        self.collection_name = collection_name
+        self.index_dir = os.path.expanduser(index_dir or os.getenv("DEDUP_INDEX_DIR", DEFAULT_INDEX_DIR))
+        self.query_chunk_size = query_chunk_size
+        self.max_age_hours = max_age_hours
+
+        self._lock = threading.Lock()
+        self._hashes = np.empty(0, dtype=np.uint64)  # đã sắp xếp, không trùng
+        self._pending: set = set()                   # hash mới add, chưa merge
+        self.meta = {'collection_name': collection_name, 'count': 0, 'full_sync_at': None}
+        self.stats = {'local_hits': 0, 'milvus_hits': 0, 'milvus_queries': 0}
+
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    @property
+    def _array_path(self) -> str:
+        return os.path.join(self.index_dir, f"{self.collection_name}.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.index_dir, f"{self.collection_name}.meta.json")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._hashes) + len(self._pending)
+
+    # === PERSISTENCE ===
+    def load(self) -> bool:
+        """Load index từ đĩa, trả về False nếu chưa có hoặc đã quá hạn"""
+        if not (os.path.exists(self._array_path) and os.path.exists(self._meta_path)):
+            return False
+
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            hashes = np.load(self._array_path)
+        except Exception as e:
+            print(f"⚠️  Không đọc được dedup index: {e}")
+            return False
+
+        full_sync_at = meta.get('full_sync_at') or 0
+        if time.time() - full_sync_at > self.max_age_hours * 3600:
+            return False
+
+        with self._lock:
+            self._hashes = hashes.astype(np.uint64, copy=False)
+            self._pending = set()
+            self.meta = meta
+        return True
+
+    def save(self):
+        """Ghi index xuống đĩa (atomic)"""
+        with self._lock:
+            self._merge_pending()
+            hashes = self._hashes
+            self.meta['count'] = int(len(hashes))
+            meta = dict(self.meta)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.index_dir, suffix='.npy.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, hashes)
+        os.replace(tmp_path, self._array_path)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.index_dir, suffix='.json.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    # === SYNC VỚI MILVUS ===
+    def rebuild(self, collection, batch_size: int = 10000):
+        """Full sync: đọc toàn bộ primary keys của collection bằng query_iterator"""
+        print(f"🔄 Build dedup index từ collection '{self.collection_name}'...")
+        start = time.time()
+        chunks = []
+
+        iterator = collection.query_iterator(
+            batch_size=batch_size,
+            expr='id_sanpham != ""',
+            output_fields=["id_sanpham"]
+        )
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                chunks.append(hash_ids(row["id_sanpham"] for row in batch))
+        finally:
+            iterator.close()
+
+        hashes = np.unique(np.concatenate(chunks)) if chunks else np.empty(0, dtype=np.uint64)
+        with self._lock:
+            self._hashes = hashes
+            self._pending = set()
+            self.meta['full_sync_at'] = time.time()
+
+        self.save()
+        print(f"✅ Dedup index: {len(hashes)} IDs ({time.time() - start:.1f}s)")
+
+    def load_or_rebuild(self, collection):
+        """Load index từ đĩa, build lại từ Milvus nếu chưa có hoặc quá hạn"""
+        if self.load():
+            print(f"✅ Load dedup index: {len(self)} IDs")
+        else:
+            self.rebuild(collection)
+
+    def _query_existing(self, collection, id_list: List[str]) -> List[str]:
+        """Query Milvus theo chunk `id_sanpham in [...]`, trả về các ID đã tồn tại"""
+        found = []
+        for i in range(0, len(id_list), self.query_chunk_size):
+            chunk = id_list[i:i + self.query_chunk_size]
+            # json.dumps để escape dấu nháy / ký tự đặc biệt trong ID
+            expr = f"id_sanpham in {json.dumps(chunk, ensure_ascii=False)}"
+            results = collection.query(expr=expr, output_fields=["id_sanpham"], limit=len(chunk))
+            found.extend(result["id_sanpham"] for result in results)
+            with self._lock:
+                self.stats['milvus_queries'] += 1
+        return found
+
+    # === MEMBERSHIP ===
+    def _merge_pending(self):
+        """Merge các hash mới vào mảng đã sắp xếp (gọi khi đang giữ lock)"""
+        if self._pending:
+            pending = np.fromiter(self._pending, dtype=np.uint64, count=len(self._pending))
+            self._hashes = np.union1d(self._hashes, pending)
+            self._pending = set()
+
+    def contains_many(self, id_list: List[str]) -> np.ndarray:
+        """Kiểm tra membership trong index local (không query Milvus)"""
+        if not id_list:
+            return np.zeros(0, dtype=bool)
+
+        hashes = hash_ids(id_list)
+        with self._lock:
+            self._merge_pending()
+            sorted_hashes = self._hashes
+
+        if len(sorted_hashes) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+
+        positions = np.searchsorted(sorted_hashes, hashes)
+        positions = np.minimum(positions, len(sorted_hashes) - 1)
+        return sorted_hashes[positions] == hashes
+
+    def add_many(self, id_list: Iterable[str]):
+        """Thêm ID vừa insert vào index"""
+        hashes = hash_ids(id_list)
+        with self._lock:
+            self._pending.update(int(h) for h in hashes)
+
+    def check_ids(self, collection, id_list: List[str]) -> Dict[str, bool]:
+        """
+        Kiểm tra tồn tại cho nhiều ID
+
+        ID có trong index local được coi là đã tồn tại; các ID còn lại được xác nhận
+        với Milvus theo chunk và bổ sung vào index. Lỗi Milvus được raise ra ngoài
+        thay vì coi tất cả là record mới.
+        """
+        if not id_list:
+            return {}
+
+        unique_ids = list(dict.fromkeys(id_list))
+        local_hits = self.contains_many(unique_ids)
+        result = {id_val: bool(hit) for id_val, hit in zip(unique_ids, local_hits)}
+
+        missing = [id_val for id_val, hit in result.items() if not hit]
+        found = self._query_existing(collection, missing) if missing else []
+        if found:
+            self.add_many(found)
+            for id_val in found:
+                result[id_val] = True
+
+        with self._lock:
+            self.stats['local_hits'] += int(local_hits.sum())
+            self.stats['milvus_hits'] += len(found)
+        return result
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['size'] = len(self)
+        return stats
@@ -1,36 +1,82 @@
 import torch
 import numpy as np
 from PIL import Image
-import requests
 from io import BytesIO
 from transformers import AutoModel, AutoProcessor
-from sklearn.preprocessing import normalize
+from sklearn.preprocessing import normalize as l2_normalize
+import os
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Union, Optional
 import base64
+from http_fetcher import get_default_fetcher
+from image_cache import get_default_cache
+from onnx_backend import get_backend_name, load_onnx_model
 
 warnings.filterwarnings("ignore")
 
 
+DEFAULT_TEXT_BATCH_MAX_TOKENS = 8192
+DEFAULT_IMAGE_LOADER_WORKERS = 8
+
+
+def plan_text_batches(lengths: List[int], batch_size: int, max_tokens: int) -> List[List[int]]:
+    """
+    Chia texts thành batch theo độ dài token (length bucketing + token budget)
+
+    Sắp index theo độ dài rồi gom liên tiếp, mỗi batch tối đa batch_size texts và
+    len(batch) * độ dài lớn nhất <= max_tokens (text dài hơn max_tokens đứng riêng 1 batch).
+
+    Returns:
+        List các list index (theo thứ tự ban đầu của texts)
+    """
+    batches, current, longest = [], [], 0
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        new_longest = max(longest, lengths[index])
+        if current and (len(current) >= batch_size or (len(current) + 1) * new_longest > max_tokens):
+            batches.append(current)
+            current, new_longest = [], lengths[index]
+        current.append(index)
+        longest = new_longest
+    if current:
+        batches.append(current)
+    return batches
+
+
 class JinaV4EmbeddingService:
     """
     Service sử dụng Jina v4 để tạo embedding cho text và image
     Hỗ trợ cả single và batch processing
     """
 
-    def __init__(self, device=None,max_length=8192):
+    def __init__(self, device=None,max_length=8192, backend=None):
         """
         Khởi tạo Jina v4 embedding service
 
         Args:
             device: Device để chạy model ('cuda', 'cpu', hoặc None để auto-detect)
+            backend: 'torch', 'onnx' hoặc 'openvino' (None = env JINA_BACKEND, mặc định 'torch')
         """
+        self.backend = get_backend_name(backend)
+        self._image_pool_lock = threading.Lock()
+        self._decode_pool = None
+        self._prefetch_pool = None
+        self.padding_stats = {'texts': 0, 'batches': 0, 'real_tokens': 0, 'padded_tokens': 0,
+                              'fixed_padded_tokens': 0}
+        if self.backend != "torch":
+            # ONNX Runtime / OpenVINO chỉ chạy trên CPU
+            device = 'cpu'
         self.device = device if device else ('cuda' if torch.cuda.is_available() else 'cpu')
         print(f"🚀 Khởi tạo Jina v4 trên device: {self.device}")
         self.max_length = max_length
         # Load Jina v4 model và processor
         self.model_name = "jinaai/jina-clip-v2"
 
+        if self.backend != "torch":
+            self._load_onnx_model()
+            return
+
         # Xác định dtype phù hợp với device và hardware
         if self.device == 'cuda' and torch.cuda.is_available():
             # Kiểm tra khả năng hỗ trợ của GPU
@@ -90,6 +136,18 @@ class JinaV4EmbeddingService:
             except Exception as e2:
                 raise Exception(f"Không thể load model: {e2}")
 
+    def _load_onnx_model(self):
+        """Load processor + text / vision tower ONNX thay cho model PyTorch (export lần đầu nếu chưa có)"""
+        self.processor = AutoProcessor.from_pretrained(
+            self.model_name,
+            trust_remote_code=True
+        )
+        self.model = load_onnx_model(self.backend, model_name=self.model_name)
+        self.embedding_dim = self._get_embedding_dimension()
+
+        print(f"✅ Load model {self.model_name} ({self.backend}, {self.model.dtype}) thành công!")
+        print(f"📊 Embedding dimension: {self.embedding_dim}")
+
     def _get_embedding_dimension(self):
         """Lấy dimension của embedding vector với error handling tốt hơn"""
         try:
@@ -106,23 +164,25 @@ class JinaV4EmbeddingService:
             print(f"⚠️ Không thể tự động detect embedding dimension: {e}")
             return 1024  # Default dimension cho Jina CLIP v2
 
-    def _load_image(self, image_url: str) -> Image.Image:
+    def _load_image(self, image_url: Union[str, bytes, Image.Image]) -> Image.Image:
         """
-        Load image từ URL hoặc đường dẫn local
+        Load image từ URL, đường dẫn local, bytes đã tải sẵn hoặc PIL Image
 
         Args:
-            image_url: URL hoặc đường dẫn đến image
+            image_url: URL/đường dẫn đến image, hoặc bytes/PIL Image đã tải sẵn
 
         Returns:
             PIL Image object
         """
         try:
-            if image_url.startswith(('http://', 'https://')):
-                response = requests.get(image_url, timeout=30, headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                })
-                response.raise_for_status()
-                image = Image.open(BytesIO(response.content))
+            if isinstance(image_url, Image.Image):
+                image = image_url
+            elif isinstance(image_url, (bytes, bytearray)):
+                image = Image.open(BytesIO(image_url))
+            elif image_url.startswith(('http://', 'https://')):
+                # Lấy bản resize sẵn cho CLIP từ image cache dùng chung
+                image_bytes = get_default_cache().get_variant(image_url, 'clip', fetch_fn=self._fetch_image)
+                image = Image.open(BytesIO(image_bytes))
             else:
                 image = Image.open(image_url)
 
@@ -138,7 +198,13 @@ class JinaV4EmbeddingService:
             return image
 
         except Exception as e:
-            raise ValueError(f"Không thể load image từ {image_url}: {e}")
+            source = image_url if isinstance(image_url, str) else type(image_url).__name__
+            raise ValueError(f"Không thể load image từ {source}: {e}")
+
+    @staticmethod
+    def _fetch_image(image_url: str) -> bytes:
+        """Tải ảnh khi image cache miss"""
+        return get_default_fetcher().fetch(image_url, timeout=30)
 
     def _safe_model_inference(self, model_fn, **kwargs):
         """
@@ -191,7 +257,7 @@ class JinaV4EmbeddingService:
                 embedding = outputs.cpu().float().numpy()[0]  # Luôn chuyển về float32
 
             if normalize_output:
-                embedding = normalize([embedding])[0]
+                embedding = l2_normalize([embedding])[0]
 
             return embedding.astype(np.float32)
 
@@ -229,7 +295,7 @@ class JinaV4EmbeddingService:
                 embedding = outputs.cpu().float().numpy()[0]  # Luôn chuyển về float32
 
             if normalize_output:
-                embedding = normalize([embedding])[0]
+                embedding = l2_normalize([embedding])[0]
 
             return embedding.astype(np.float32)
 
@@ -261,29 +327,42 @@ class JinaV4EmbeddingService:
 
         return image_vector, text_vector
 
-    def embed_texts_batch(self, texts: List[str], normalize: bool = True, batch_size: int = 32) -> List[np.ndarray]:
+    def embed_texts_batch(self, texts: List[str], normalize: bool = True, batch_size: int = 32,
+                          max_tokens: Optional[int] = None) -> List[np.ndarray]:
         """
         Batch embedding cho nhiều text cùng lúc (hiệu quả hơn)
 
+        Texts được sắp theo số token rồi gom thành batch tối đa batch_size texts và max_tokens
+        token sau khi pad (số text x độ dài text dài nhất), kết quả trả về đúng thứ tự ban đầu.
+
         Args:
             texts: List text cần embedding
             normalize: Có normalize vectors hay không
-            batch_size: Kích thước batch
+            batch_size: Số text tối đa mỗi batch
+            max_tokens: Token budget mỗi batch (mặc định env TEXT_BATCH_MAX_TOKENS)
 
         Returns:
             List numpy arrays chứa text embeddings
         """
-        all_embeddings = []
+        if not texts:
+            return []
+        if max_tokens is None:
+            max_tokens = int(os.getenv("TEXT_BATCH_MAX_TOKENS", DEFAULT_TEXT_BATCH_MAX_TOKENS))
+
+        tokenizer = getattr(self.processor, "tokenizer", self.processor)
+        encodings = tokenizer(list(texts), truncation=True)
+        lengths = [len(ids) for ids in encodings["input_ids"]]
 
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
+        all_embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        batches = plan_text_batches(lengths, batch_size, max_tokens)
 
+        for batch_indices in batches:
             try:
-                inputs = self.processor(
-                    text=batch_texts,
-                    return_tensors="pt",
+                # Pad lại từ token ids đã có, không tokenize lần 2
+                inputs = tokenizer.pad(
+                    {key: [encodings[key][i] for i in batch_indices] for key in encodings.keys()},
                     padding=True,
-                    truncation=True
+                    return_tensors="pt"
                 )
 
                 # Chuyển inputs sang device
@@ -295,64 +374,86 @@ class JinaV4EmbeddingService:
                     embeddings = outputs.cpu().float().numpy()  # Luôn chuyển về float32
 
                 if normalize:
-                    embeddings = normalize(embeddings)
+                    embeddings = l2_normalize(embeddings)
 
-                for emb in embeddings:
-                    all_embeddings.append(emb.astype(np.float32))
+                for index, emb in zip(batch_indices, embeddings):
+                    all_embeddings[index] = emb.astype(np.float32)
 
             except Exception as e:
                 print(f"❌ Lỗi batch embedding texts: {e}")
-                # Thêm zero vectors cho batch bị lỗi
-                for _ in batch_texts:
-                    all_embeddings.append(np.zeros(self.embedding_dim, dtype=np.float32))
+                # Zero vectors cho batch bị lỗi
+                for index in batch_indices:
+                    all_embeddings[index] = np.zeros(self.embedding_dim, dtype=np.float32)
 
+        self._record_padding(lengths, batches, batch_size)
         return all_embeddings
 
-    def embed_images_batch(self, image_urls: List[str], normalize: bool = True, batch_size: int = 16) -> List[
-        np.ndarray]:
+    def _record_padding(self, lengths: List[int], batches: List[List[int]], batch_size: int):
+        """Cộng dồn padding efficiency (token thật / token sau khi pad), so với cắt cố định batch_size"""
+        real = sum(lengths)
+        padded = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+        fixed = sum(len(chunk) * max(chunk) for chunk in
+                    (lengths[i:i + batch_size] for i in range(0, len(lengths), batch_size)))
+
+        self.padding_stats['texts'] += len(lengths)
+        self.padding_stats['batches'] += len(batches)
+        self.padding_stats['real_tokens'] += real
+        self.padding_stats['padded_tokens'] += padded
+        self.padding_stats['fixed_padded_tokens'] += fixed
+
+        if len(batches) > 1:
+            print(f"📏 {len(lengths)} texts / {len(batches)} batches - padding efficiency "
+                  f"{real / padded:.1%} (cắt cố định: {real / fixed:.1%})")
+
+    def get_padding_stats(self) -> dict:
+        """Padding efficiency cộng dồn của embed_texts_batch"""
+        stats = dict(self.padding_stats)
+        stats['padding_efficiency'] = round(stats['real_tokens'] / stats['padded_tokens'], 4) \
+            if stats['padded_tokens'] else 1.0
+        stats['fixed_padding_efficiency'] = round(stats['real_tokens'] / stats['fixed_padded_tokens'], 4) \
+            if stats['fixed_padded_tokens'] else 1.0
+        return stats
+
+    def embed_images_batch(self, image_urls: List[Union[str, bytes, Image.Image]], normalize: bool = True,
+                           batch_size: int = 16) -> List[np.ndarray]:
         """
         Batch embedding cho nhiều image cùng lúc
 
         Args:
-            image_urls: List URL images cần embedding
+            image_urls: List URL images (hoặc bytes/PIL Image đã tải sẵn) cần embedding
             normalize: Có normalize vectors hay không
             batch_size: Kích thước batch (nhỏ hơn text vì image tốn memory hơn)
 
         Returns:
             List numpy arrays chứa image embeddings
         """
+        if not image_urls:
+            return []
+
+        batches = [image_urls[i:i + batch_size] for i in range(0, len(image_urls), batch_size)]
         all_embeddings = []
 
-        for i in range(0, len(image_urls), batch_size):
-            batch_urls = image_urls[i:i + batch_size]
-            batch_images = []
+        # Batch kế tiếp được tải + decode + preprocess trong thread nền trong lúc batch hiện tại chạy model
+        prefetch_pool = self._get_image_pools()[1]
+        pending = prefetch_pool.submit(self._prepare_image_batch, batches[0])
 
-            # Load batch images
-            for url in batch_urls:
-                try:
-                    if url and url.strip():
-                        image = self._load_image(url)
-                        batch_images.append(image)
-                    else:
-                        batch_images.append(None)
-                except:
-                    batch_images.append(None)
+        for n, batch_urls in enumerate(batches):
+            valid_mask, inputs, error = pending.result()
+            if n + 1 < len(batches):
+                pending = prefetch_pool.submit(self._prepare_image_batch, batches[n + 1])
 
-            # Process batch
             try:
-                valid_images = [img for img in batch_images if img is not None]
+                if error:
+                    raise error
 
-                if not valid_images:
+                if inputs is None:
                     # Tất cả images trong batch đều invalid
-                    for _ in batch_images:
+                    for _ in batch_urls:
                         all_embeddings.append(np.zeros(self.embedding_dim, dtype=np.float32))
                     continue
 
-                # Preprocess valid images
-                inputs = self.processor(images=valid_images, return_tensors="pt")
-
-                # Chuyển inputs sang device
-                inputs = {k: v.to(self.device) for k, v in inputs.items() if isinstance(v, torch.Tensor)}
+                # Chuyển inputs sang device (pinned memory → copy không chặn)
+                inputs = {k: v.to(self.device, non_blocking=True) for k, v in inputs.items()}
 
                 with torch.no_grad():
                     # Safe inference với dtype error handling
@@ -360,12 +461,12 @@ class JinaV4EmbeddingService:
                     embeddings = outputs.cpu().float().numpy()  # Luôn chuyển về float32
 
                 if normalize:
-                    embeddings = normalize(embeddings)
+                    embeddings = l2_normalize(embeddings)
 
                 # Map embeddings back to original order
                 valid_idx = 0
-                for img in batch_images:
-                    if img is not None:
+                for is_valid in valid_mask:
+                    if is_valid:
                         all_embeddings.append(embeddings[valid_idx].astype(np.float32))
                         valid_idx += 1
                     else:
@@ -374,11 +475,52 @@ class JinaV4EmbeddingService:
             except Exception as e:
                 print(f"❌ Lỗi batch embedding images: {e}")
                 # Thêm zero vectors cho batch bị lỗi
-                for _ in batch_images:
+                for _ in batch_urls:
                     all_embeddings.append(np.zeros(self.embedding_dim, dtype=np.float32))
 
         return all_embeddings
 
+    def _get_image_pools(self) -> tuple:
+        """(decode pool, prefetch pool) tạo lần đầu dùng; số thread decode theo env IMAGE_LOADER_WORKERS"""
+        with self._image_pool_lock:
+            if self._decode_pool is None:
+                workers = int(os.getenv("IMAGE_LOADER_WORKERS", DEFAULT_IMAGE_LOADER_WORKERS))
+                self._decode_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-decode")
+                # 1 thread chuẩn bị batch kế tiếp, tách khỏi decode pool để không tự chờ chính mình
+                self._prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-prefetch")
+            return self._decode_pool, self._prefetch_pool
+
+    def _prepare_image_batch(self, batch_urls: list) -> tuple:
+        """
+        Tải + decode + resize song song rồi preprocess 1 batch images (chạy trong prefetch thread)
+
+        Returns:
+            tuple: (valid_mask, inputs tensors hoặc None nếu không có image hợp lệ, exception nếu lỗi preprocess)
+        """
+        images = list(self._get_image_pools()[0].map(self._load_image_or_none, batch_urls))
+        valid_mask = [image is not None for image in images]
+        valid_images = [image for image in images if image is not None]
+        if not valid_images:
+            return valid_mask, None, None
+
+        try:
+            inputs = self.processor(images=valid_images, return_tensors="pt")
+            inputs = {k: v for k, v in inputs.items() if isinstance(v, torch.Tensor)}
+            if self.device == 'cuda':
+                inputs = {k: v.pin_memory() for k, v in inputs.items()}
+            return valid_mask, inputs, None
+        except Exception as e:
+            return valid_mask, None, e
+
+    def _load_image_or_none(self, url: Union[str, bytes, Image.Image, None]) -> Optional[Image.Image]:
+        """_load_image cho batch: None nếu url rỗng hoặc load lỗi"""
+        if url is None or (isinstance(url, (str, bytes)) and not url.strip()):
+            return None
+        try:
+            return self._load_image(url)
+        except Exception:
+            return None
+
     def get_model_info(self) -> dict:
         """
         Lấy thông tin về model
@@ -390,6 +532,7 @@ class JinaV4EmbeddingService:
             'model_name': self.model_name,
             'embedding_dimension': self.embedding_dim,
             'device': self.device,
+            'backend': self.backend,
             'torch_dtype': str(self.model.dtype) if hasattr(self, 'model') and hasattr(self.model,
                                                                                        'dtype') else 'unknown'
         }
@@ -428,6 +571,9 @@ class JinaV4EmbeddingService:
                 del self.model
             if hasattr(self, 'processor') and self.processor is not None:
                 del self.processor
+            if getattr(self, '_decode_pool', None) is not None:
+                self._decode_pool.shutdown(wait=False)
+                self._prefetch_pool.shutdown(wait=False)
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
         except:
@@ -441,8 +587,8 @@ class EmbeddingService(JinaV4EmbeddingService):
     Tích hợp với hàm _generate_vectors từ pipeline
     """
 
-    def __init__(self, device=None):
-        super().__init__(device)
+    def __init__(self, device=None, backend=None):
+        super().__init__(device, backend=backend)
         print(f"🤖 EmbeddingService khởi tạo với Jina v4")
         print(f"📊 Embedding dimensions: {self.embedding_dim}")
 
@@ -468,7 +614,8 @@ class EmbeddingService(JinaV4EmbeddingService):
         print(f"✅ Tạo embedding thành công - Text: {len(text_vector)}D, Image: {len(image_vector)}D")
         return image_vector, text_vector
 
-    def _generate_vectors_batch(self, descriptions: List[str], image_urls: List[str] = None) -> tuple:
+    def _generate_vectors_batch(self, descriptions: List[str],
+                                image_urls: List[Union[str, bytes]] = None) -> tuple:
         """
         Tạo embedding vectors cho nhiều text và image cùng lúc (hiệu quả hơn)
 
@@ -476,7 +623,7 @@ class EmbeddingService(JinaV4EmbeddingService):
 
         Args:
             descriptions: List text descriptions
-            image_urls: List image URLs (optional)
+            image_urls: List image URLs hoặc bytes ảnh đã tải sẵn (optional)
 
         Returns:
             tuple: (image_vectors_list, text_vectors_list)
@@ -0,0 +1,224 @@
+"""
+HTTP fetcher dùng chung cho việc tải ảnh
+
+- Connection pooling + keep-alive (requests.Session / httpx.AsyncClient)
+- Giới hạn số request đồng thời trên mỗi host (ảnh chủ yếu đến từ vài CDN)
+- Retry với exponential backoff cho lỗi mạng và status 429/5xx
+"""
+import asyncio
+import os
+import threading
+import weakref
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class HttpFetcher:
+    """Fetcher đồng bộ, thread-safe, dùng chung 1 session cho mọi thread"""
+
+    def __init__(self,
+                 pool_size: int = 32,
+                 per_host_limit: int = 8,
+                 retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 timeout: float = 15,
+                 headers: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            pool_size: Số connection giữ lại (keep-alive) cho mỗi host
+            per_host_limit: Số request đồng thời tối đa trên mỗi host
+            retries: Số lần retry khi lỗi mạng hoặc status 429/5xx
+            backoff_factor: Hệ số backoff giữa các lần retry (0.5s, 1s, 2s...)
+            timeout: Timeout mặc định (giây)
+            headers: Headers mặc định cho mọi request
+        """
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = _host_of(url)
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def get(self, url: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        """GET qua session pool, giới hạn đồng thời theo host"""
+        with self._host_semaphore(url):
+            return self.session.get(url, timeout=timeout or self.timeout, **kwargs)
+
+    def fetch(self, url: str, timeout: Optional[float] = None) -> bytes:
+        """Tải nội dung URL, raise exception nếu status lỗi"""
+        response = self.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    def close(self):
+        self.session.close()
+
+
+async def _close_on_loop_shutdown(client: httpx.AsyncClient, on_close) -> AsyncIterator[None]:
+    """Async generator giữ mở tới khi loop gọi shutdown_asyncgens() (cuối asyncio.run), rồi đóng client"""
+    try:
+        yield
+    finally:
+        on_close()
+        await client.aclose()
+
+
+class AsyncHttpFetcher:
+    """
+    Fetcher bất đồng bộ dựa trên httpx.AsyncClient
+
+    httpx.AsyncClient và asyncio.Semaphore gắn với event loop tạo ra chúng, nên mỗi loop
+    có client + semaphore riêng, client được đóng khi loop kết thúc. Code chạy mỗi lượt
+    trong 1 asyncio.run() mới (không giữ được keep-alive giữa các lượt) nên dùng
+    HttpFetcher qua asyncio.to_thread.
+    """
+
+    def __init__(self,
+                 pool_size: int = 32,
+                 per_host_limit: int = 8,
+                 retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 timeout: float = 15,
+                 headers: Optional[Dict[str, str]] = None):
+        """Tham số giống HttpFetcher"""
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+
+        # event loop -> (client, semaphores theo host, generator đóng client khi loop kết thúc)
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    async def _loop_state(self) -> Tuple[httpx.AsyncClient, Dict[str, asyncio.Semaphore]]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is not None:
+                return state[0], state[1]
+            client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size)
+            )
+            # Client giữ tham chiếu tới loop nên phải tự xoá entry, WeakKeyDictionary không tự dọn được
+            closer = _close_on_loop_shutdown(client, lambda: self._forget(loop))
+            self._loops[loop] = (client, {}, closer)
+        await closer.__anext__()
+        return client, self._loops[loop][1]
+
+    def _forget(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            self._loops.pop(loop, None)
+
+    def _host_semaphore(self, semaphores: Dict[str, asyncio.Semaphore], url: str) -> asyncio.Semaphore:
+        host = _host_of(url)
+        semaphore = semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            semaphores[host] = semaphore
+        return semaphore
+
+    async def get(self, url: str, timeout: Optional[float] = None) -> httpx.Response:
+        """GET với retry + backoff, giới hạn đồng thời theo host"""
+        client, semaphores = await self._loop_state()
+        attempt = 0
+        while True:
+            try:
+                async with self._host_semaphore(semaphores, url):
+                    response = await client.get(url, timeout=timeout or self.timeout)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    async def fetch(self, url: str, timeout: Optional[float] = None) -> bytes:
+        """Tải nội dung URL, raise exception nếu status lỗi"""
+        response = await self.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    async def fetch_many(self, urls: List[str]) -> List[Union[bytes, Exception]]:
+        """Tải nhiều URL song song, lỗi được trả về tại vị trí tương ứng"""
+        return await asyncio.gather(*(self.fetch(url) for url in urls), return_exceptions=True)
+
+    async def aclose(self):
+        """Đóng client của event loop hiện tại"""
+        with self._lock:
+            state = self._loops.get(asyncio.get_running_loop())
+        if state is not None:
+            await state[2].aclose()
+
+
+_default_fetcher = None
+_default_async_fetcher = None
+_default_lock = threading.Lock()
+
+
+def _default_options() -> Dict[str, int]:
+    return {
+        'pool_size': int(os.getenv("HTTP_POOL_SIZE", 32)),
+        'per_host_limit': int(os.getenv("HTTP_PER_HOST_LIMIT", 8)),
+        'retries': int(os.getenv("HTTP_RETRIES", 3)),
+    }
+
+
+def get_default_fetcher() -> HttpFetcher:
+    """HttpFetcher dùng chung trong process"""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = HttpFetcher(**_default_options())
+        return _default_fetcher
+
+
+def get_default_async_fetcher() -> AsyncHttpFetcher:
+    """AsyncHttpFetcher dùng chung trong process"""
+    global _default_async_fetcher
+    with _default_lock:
+        if _default_async_fetcher is None:
+            _default_async_fetcher = AsyncHttpFetcher(**_default_options())
+        return _default_async_fetcher
@@ -0,0 +1,113 @@
+"""
+ANN index profiles cho image_vector / description_vector
+
+Mỗi profile gồm tham số build index, tham số search mặc định và dải giá trị
+để benchmark (sweep). Khi search, profile lấy theo index đã build trên collection
+(detect_index_profile); MILVUS_INDEX_PROFILE (mặc định IVF_FLAT, giống cấu hình cũ)
+chỉ dùng khi tạo index mới hoặc collection chưa có index.
+"""
+import copy
+import os
+from typing import Any, Dict, Optional
+
+VECTOR_FIELDS = ("image_vector", "description_vector")
+DEFAULT_METRIC = "COSINE"
+DEFAULT_PROFILE = "IVF_FLAT"
+
+INDEX_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Cấu hình hiện tại: recall cao, tốn RAM bằng dữ liệu gốc
+    "IVF_FLAT": {
+        "index_type": "IVF_FLAT",
+        "build_params": {"nlist": 1024},
+        "search_params": {"nprobe": 12},
+        "sweep": {"nprobe": [8, 12, 32, 64, 128]},
+    },
+    # Graph index: latency thấp nhất, RAM ~1.2-1.5x dữ liệu gốc
+    "HNSW": {
+        "index_type": "HNSW",
+        "build_params": {"M": 16, "efConstruction": 200},
+        "search_params": {"ef": 64},
+        "sweep": {"ef": [32, 64, 128, 256]},
+    },
+    # Scalar quantization 8-bit: RAM ~1/4 float32, recall gần IVF_FLAT
+    "IVF_SQ8": {
+        "index_type": "IVF_SQ8",
+        "build_params": {"nlist": 1024},
+        "search_params": {"nprobe": 16},
+        "sweep": {"nprobe": [8, 16, 32, 64, 128]},
+    },
+    # Nén product quantization: tiết kiệm RAM, recall thấp hơn (m phải chia hết dim)
+    "IVF_PQ": {
+        "index_type": "IVF_PQ",
+        "build_params": {"nlist": 1024, "m": 32, "nbits": 8},
+        "search_params": {"nprobe": 32},
+        "sweep": {"nprobe": [16, 32, 64, 128]},
+    },
+    # Index trên đĩa (NVMe) cho catalog lớn hơn RAM
+    "DISKANN": {
+        "index_type": "DISKANN",
+        "build_params": {},
+        "search_params": {"search_list": 100},
+        "sweep": {"search_list": [50, 100, 200]},
+    },
+    # ScaNN (Milvus >= 2.4): quantization + reorder bằng raw data
+    "SCANN": {
+        "index_type": "SCANN",
+        "build_params": {"nlist": 1024, "with_raw_data": True},
+        "search_params": {"nprobe": 32, "reorder_k": 200},
+        "sweep": {"nprobe": [16, 32, 64, 128]},
+    },
+}
+
+
+def get_profile_name(name: Optional[str] = None) -> str:
+    """Tên profile đang dùng (tham số > MILVUS_INDEX_PROFILE > IVF_FLAT)"""
+    name = (name or os.getenv("MILVUS_INDEX_PROFILE", DEFAULT_PROFILE)).upper()
+    if name not in INDEX_PROFILES:
+        raise ValueError(f"Index profile không hợp lệ: {name} (có: {', '.join(INDEX_PROFILES)})")
+    return name
+
+
+def detect_index_profile(collection, field_name: str = "description_vector",
+                         default: Optional[str] = None) -> str:
+    """
+    Profile theo index_type đã build trên field (collection.indexes), để search params
+    khớp index thật sau khi rebuild_indexes.py đổi profile
+
+    Returns:
+        Tên profile; get_profile_name(default) nếu field chưa có index hoặc index_type không có trong INDEX_PROFILES
+    """
+    for index in collection.indexes:
+        if index.field_name != field_name:
+            continue
+        index_type = str(index.params.get("index_type", "")).upper()
+        if index_type in INDEX_PROFILES:
+            return index_type
+        print(f"⚠️ Index {index_type or '?'} trên {field_name} không có profile, dùng {get_profile_name(default)}")
+    return get_profile_name(default)
+
+
+def get_index_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """Bản copy của profile để caller tự do chỉnh sửa"""
+    return copy.deepcopy(INDEX_PROFILES[get_profile_name(name)])
+
+
+def build_index_params(name: Optional[str] = None, metric_type: str = DEFAULT_METRIC,
+                       overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """index_params cho collection.create_index"""
+    profile = get_index_profile(name)
+    return {
+        "metric_type": metric_type,
+        "index_type": profile["index_type"],
+        "params": {**profile["build_params"], **(overrides or {})},
+    }
+
+
+def build_search_params(name: Optional[str] = None, metric_type: str = DEFAULT_METRIC,
+                        overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """param cho collection.search"""
+    profile = get_index_profile(name)
+    return {
+        "metric_type": metric_type,
+        "params": {**profile["search_params"], **(overrides or {})},
+    }
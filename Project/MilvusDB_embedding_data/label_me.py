@@ -1,8 +1,7 @@
 import psycopg2
 import os
 import json
-import requests
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Iterator
 from dataclasses import dataclass, asdict
 from enum import Enum
 import base64
@@ -13,7 +12,7 @@ import uuid
 import numpy as np
 from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
 import time
-from embedding_service import EmbeddingService
+from embedding_server import create_embedding_service
 import ollama
 import torch
 import re
@@ -22,6 +21,19 @@ from threading import Lock
 import queue
 import threading
 import io
+from staged_pipeline import PipelineStage, StagedPipeline
+from image_cache import get_default_cache
+from http_fetcher import get_default_fetcher
+from dedup_index import DedupIndex
+from index_profiles import VECTOR_FIELDS, build_index_params, get_profile_name
+from scalar_fields import (
+    DATE_TS_FIELD, DEFAULT_NUM_PARTITIONS, EMBEDDING_MODEL_FIELD, collection_partition_key,
+    create_scalar_indexes, date_ts_field, embedding_model_field, embedding_model_version, has_field, parse_date_ts
+)
+from vector_dtypes import detect_vector_dtype, get_vector_dtype_name, to_milvus_vectors, vector_field
+from time_partitions import ensure_partitions, is_month_partition, month_partition_name
+from run_journal import RunJournal
+from postgres_sink import PostgresSink
 
 # Configuration
 class ModelProvider(Enum):
@@ -64,18 +76,50 @@ class ProductRecord:
     metadata: dict
     image_vector: List[float]
     description_vector: List[float]
+    embedding_model: Optional[str] = None  # None = vừa embed bằng model hiện tại
 
 
 class StreamingProductPipeline:
     """Pipeline streaming: Crawl → Label → Embedding → Insert ngay lập tức"""
 
+    # Cấu hình mặc định cho staged mode: số worker và kích thước queue mỗi stage
+    DEFAULT_STAGE_CONFIG = {
+        'download': {'workers': 8, 'queue_size': 64},
+        'label': {'workers': 1, 'queue_size': 16},
+        # Micro-batch: gom record từ các label workers, flush khi đủ batch_size hoặc hết max_wait
+        'embed': {'workers': 1, 'queue_size': 32, 'batch_size': 16, 'max_wait': 0.5},
+        'postgres': {'workers': 1, 'queue_size': 64},
+        'milvus': {'workers': 1, 'queue_size': 256},
+    }
+    # Số rows crawl được gom lại để lọc trùng lặp 1 lần trong staged / streaming mode
+    CRAWL_CHUNK_SIZE = 500
+
+    # Database lưu kết quả label (ai_craw.data_label)
+    LABEL_DB_CONFIG = {
+        'host': '45.79.189.110',
+        'database': 'ai_db',
+        'user': 'ai_engineer',
+        'password': 'StrongPassword123',
+        'port': 5432
+    }
+
     def __init__(self,
                  db_config: Dict[str, str],
                  qwen_model: str = "qwen2.5vl:latest",
                  milvus_host: str = "10.10.4.25",
                  milvus_port: str = "19530",
                  max_workers: int = 1,
-                 insert_batch_size: int = 5):
+                 insert_batch_size: int = 100,
+                 insert_max_wait: float = 5.0,
+                 flush_interval: float = 60.0,
+                 compact_on_finish: bool = True,
+                 stage_config: Optional[Dict[str, Dict[str, int]]] = None,
+                 crawl_itersize: int = 2000,
+                 label_db_config: Optional[Dict[str, Any]] = None,
+                 index_profile: Optional[str] = None,
+                 partition_key: Optional[str] = None,
+                 vector_dtype: Optional[str] = None,
+                 partition_by_month: bool = False):
         """
         Khởi tạo streaming pipeline
 
@@ -85,32 +129,85 @@ class StreamingProductPipeline:
             milvus_host: Milvus host
             milvus_port: Milvus port
             max_workers: Số thread xử lý song song
-            insert_batch_size: Số records trong mỗi batch insert
+            insert_batch_size: Số records tối đa trong mỗi batch insert
+            insert_max_wait: Insert batch chưa đầy khi record đầu tiên đã chờ quá số giây này
+            flush_interval: Khoảng thời gian tối thiểu (giây) giữa 2 lần flush Milvus
+            compact_on_finish: Trigger compaction của Milvus khi kết thúc run
+            stage_config: Override cấu hình từng stage cho staged mode,
+                          ví dụ {'download': {'workers': 16}, 'label': {'workers': 2}}
+            crawl_itersize: Số rows mỗi lần fetch từ server-side cursor khi crawl
+            label_db_config: Kết nối database lưu ai_craw.data_label (mặc định LABEL_DB_CONFIG)
+            index_profile: ANN index profile khi tạo collection mới (mặc định MILVUS_INDEX_PROFILE)
+            partition_key: Field làm partition key khi tạo collection mới ('platform' / 'name_store')
+            vector_dtype: Kiểu lưu vector khi tạo collection mới (FLOAT / FLOAT16 / BFLOAT16,
+                          mặc định MILVUS_VECTOR_DTYPE)
+            partition_by_month: Insert vào partition theo tháng của date ('p_YYYYMM'),
+                                tự bật nếu collection đã có partition tháng
         """
         # Database config
         self.db_config = db_config
         self.db_connection = None
+        self.crawl_itersize = crawl_itersize
 
         # AI Labeler
         self.qwen_model = qwen_model
         self.max_workers = max_workers
         self.insert_batch_size = insert_batch_size
+        self.insert_max_wait = insert_max_wait
         self._lock = Lock()
 
+        # Milvus flush theo thời gian thay vì sau mỗi insert (tránh tạo nhiều segment nhỏ)
+        self.flush_interval = flush_interval
+        self.compact_on_finish = compact_on_finish
+        self._last_flush_time = time.time()
+        self._flush_lock = Lock()
+
+        # Staged pipeline config
+        self.stage_config = {name: dict(conf) for name, conf in self.DEFAULT_STAGE_CONFIG.items()}
+        for name, conf in (stage_config or {}).items():
+            self.stage_config.setdefault(name, {}).update(conf)
+
         # Embedding service
         print("🔧 Khởi tạo Jina v4 Embedding Service...")
-        self.embedding_service = EmbeddingService()
+        # EMBEDDING_SERVER_URL / EMBEDDING_BATCHING: dùng chung model thay vì load riêng
+        self.embedding_service = create_embedding_service()
         self.embedding_dim = self.embedding_service.embedding_dim
+        self.embedding_model_version = embedding_model_version(self.embedding_service.model_name)
 
         # Milvus config
         self.milvus_host = milvus_host
         self.milvus_port = milvus_port
         self.collection_name = "product_collection_v4"
         self.collection = None
+        self.index_profile = get_profile_name(index_profile)
+        self.partition_key = collection_partition_key(partition_key)
+        self.vector_dtype = get_vector_dtype_name(vector_dtype)
+        if partition_by_month and self.partition_key:
+            raise ValueError("partition_by_month không dùng chung được với partition_key")
+        self.partition_by_month = partition_by_month
+        self.known_partitions = set()
+        self._partition_lock = Lock()
+        self.has_date_ts = False
+        # Collection có embedding_model thì mỗi record được tag phiên bản model đã tạo vectors
+        self.has_embedding_model = False
+        self.dedup_index = DedupIndex(self.collection_name)
+
+        # Journal tiến độ từng record để resume khi pipeline bị dừng giữa chừng
+        self.run_journal = RunJournal(self.collection_name)
+        self.journal_states = {}
+
+        # Postgres sink: pool + batched upsert, journal được đánh dấu sau mỗi lần flush
+        self.postgres_sink = PostgresSink(
+            label_db_config or self.LABEL_DB_CONFIG,
+            on_flushed=self.run_journal.mark_postgres_saved
+        )
+        self._stop_event = threading.Event()
 
         # Cache và queues cho streaming
-        self.image_cache = {}
-        self.cache_lock = Lock()
+        # Image cache trên đĩa, dùng chung với embedding service và UI
+        self.image_cache = get_default_cache()
+        # HTTP client dùng chung: connection pool, giới hạn theo host, retry
+        self.http_fetcher = get_default_fetcher()
         
         # Queue cho streaming insert
         self.ready_records_queue = queue.Queue()
@@ -133,12 +230,14 @@ class StreamingProductPipeline:
         print(f"🔧 Device: {model_info['device']}")
         print(f"🦙 Qwen2.5-VL Model: {self.qwen_model}")
         print(f"🚀 Max Workers: {self.max_workers}")
-        print(f"📦 Insert Batch Size: {self.insert_batch_size}")
+        print(f"📦 Insert Batch Size: {self.insert_batch_size} (max wait {self.insert_max_wait}s)")
+        print(f"🚿 Milvus flush interval: {self.flush_interval}s")
 
         # Initialize connections
         self._connect_db()
         self._connect_milvus()
         self._setup_collection()
+        self.dedup_index.load_or_rebuild(self.collection)
 
     def _connect_db(self) -> bool:
         """Kết nối đến PostgreSQL database"""
@@ -166,8 +265,8 @@ class StreamingProductPipeline:
         """Tạo schema cho collection"""
         fields = [
             FieldSchema(name="id_sanpham", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=100),
-            FieldSchema(name="image_vector", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_dim),
-            FieldSchema(name="description_vector", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_dim),
+            vector_field("image_vector", self.embedding_dim, self.vector_dtype),
+            vector_field("description_vector", self.embedding_dim, self.vector_dtype),
             FieldSchema(name="image", dtype=DataType.VARCHAR, max_length=1000),
             FieldSchema(name="description", dtype=DataType.VARCHAR, max_length=5000),
             FieldSchema(name="metadata", dtype=DataType.JSON),
@@ -176,8 +275,12 @@ class StreamingProductPipeline:
             FieldSchema(name="comment", dtype=DataType.VARCHAR, max_length=20),
             FieldSchema(name="share", dtype=DataType.VARCHAR, max_length=20),
             FieldSchema(name="link_redirect", dtype=DataType.VARCHAR, max_length=2000),
-            FieldSchema(name="platform", dtype=DataType.VARCHAR, max_length=200),
-            FieldSchema(name="name_store", dtype=DataType.VARCHAR, max_length=500)
+            FieldSchema(name="platform", dtype=DataType.VARCHAR, max_length=200,
+                        is_partition_key=self.partition_key == "platform"),
+            FieldSchema(name="name_store", dtype=DataType.VARCHAR, max_length=500,
+                        is_partition_key=self.partition_key == "name_store"),
+            date_ts_field(),
+            embedding_model_field()
         ]
 
         schema = CollectionSchema(
@@ -194,68 +297,63 @@ class StreamingProductPipeline:
                 print(f"✅ Load collection '{self.collection_name}' thành công")
             else:
                 schema = self._create_collection_schema()
-                self.collection = Collection(self.collection_name, schema)
+                if self.partition_key:
+                    self.collection = Collection(self.collection_name, schema,
+                                                 num_partitions=DEFAULT_NUM_PARTITIONS)
+                else:
+                    self.collection = Collection(self.collection_name, schema)
                 self._create_indexes()
                 print(f"✅ Tạo collection '{self.collection_name}' thành công với {self.embedding_dim}D vectors")
 
+            self.has_date_ts = has_field(self.collection, DATE_TS_FIELD)
+            self.has_embedding_model = has_field(self.collection, EMBEDDING_MODEL_FIELD)
+            self.vector_dtype = detect_vector_dtype(self.collection)
+            self.known_partitions = {partition.name for partition in self.collection.partitions}
+            if not self.partition_by_month and any(is_month_partition(name) for name in self.known_partitions):
+                self.partition_by_month = True
+                print("🗂️  Collection đã có partition theo tháng → insert theo partition tháng")
+            if not self.has_date_ts:
+                print(f"⚠️  Collection chưa có field {DATE_TS_FIELD}, chạy migrate_scalar_fields.py để filter theo ngày nhanh hơn")
+
             self.collection.load()
 
         except Exception as e:
             raise Exception(f"❌ Lỗi setup collection: {str(e)}")
 
     def _create_indexes(self):
-        """Tạo index cho vector fields"""
-        nlist = min(self.embedding_dim, 1024)
-
-        index_params = {
-            "metric_type": "COSINE",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": nlist}
-        }
+        """Tạo index cho vector fields theo index profile"""
+        index_params = build_index_params(self.index_profile)
+
+        for field_name in VECTOR_FIELDS:
+            self.collection.create_index(
+                field_name=field_name,
+                index_params=index_params,
+                index_name=f"{field_name}_index"
+            )
+        print(f"✅ Tạo indexes thành công: {index_params['index_type']} {index_params['params']}")
+        create_scalar_indexes(self.collection)
 
-        self.collection.create_index(
-            field_name="image_vector",
-            index_params=index_params,
-            index_name="image_vector_index"
-        )
+    def _insert_columns(self, data: List[list], dates: List[str]):
+        """Insert column data; partition theo tháng thì tách rows theo partition trước khi insert"""
+        if not self.partition_by_month:
+            self.collection.insert(data)
+            return
 
-        self.collection.create_index(
-            field_name="description_vector",
-            index_params=index_params,
-            index_name="description_vector_index"
-        )
-        print(f"✅ Tạo indexes thành công với nlist={nlist}")
+        groups: Dict[str, List[int]] = {}
+        for i, date in enumerate(dates):
+            groups.setdefault(month_partition_name(parse_date_ts(date)), []).append(i)
+        with self._partition_lock:
+            ensure_partitions(self.collection, groups, self.known_partitions)
+        for partition_name, indexes in groups.items():
+            self.collection.insert([[column[i] for i in indexes] for column in data],
+                                   partition_name=partition_name)
 
     # === DUPLICATE CHECK METHODS ===
     def check_ids_exist_batch(self, id_list: List[str]) -> Dict[str, bool]:
-        """Kiểm tra nhiều ID cùng lúc"""
-        try:
-            if not id_list:
-                return {}
-
-            batch_size = 100
-            all_results = {}
-
-            for i in range(0, len(id_list), batch_size):
-                batch_ids = id_list[i:i + batch_size]
-                id_conditions = [f'id_sanpham == "{id_val}"' for id_val in batch_ids]
-                expr = " or ".join(id_conditions)
-
-                results = self.collection.query(
-                    expr=expr,
-                    output_fields=["id_sanpham"],
-                    limit=len(batch_ids)
-                )
-
-                existing_ids = {result["id_sanpham"] for result in results}
-                batch_results = {id_val: id_val in existing_ids for id_val in batch_ids}
-                all_results.update(batch_results)
-
-            return all_results
-
-        except Exception as e:
-            print(f"⚠️  Lỗi kiểm tra batch IDs: {str(e)}")
-            return {id_val: False for id_val in id_list}
+        """Kiểm tra nhiều ID cùng lúc qua dedup index (chỉ query Milvus cho ID chưa có local)"""
+        if not id_list:
+            return {}
+        return self.dedup_index.check_ids(self.collection, id_list)
 
     def filter_existing_records(self, raw_data_list: List[Dict[str, Any]]) -> tuple:
         """Lọc bỏ các record đã tồn tại"""
@@ -291,20 +389,12 @@ class StreamingProductPipeline:
             return new_records, existing_records, duplicate_count
 
         except Exception as e:
-            print(f"❌ Lỗi khi lọc records: {str(e)}")
-            return raw_data_list, [], 0
+            # Không coi tất cả là record mới: label lại record đã có rất tốn thời gian VLM
+            raise Exception(f"Lỗi khi lọc records: {str(e)}")
 
     # === CRAWL DATA METHODS ===
-    def crawl_data_by_date_range(self, start_date: str, end_date: str, limit: int = 1000) -> List[Dict[str, Any]]:
-        """Crawl data từ database theo khoảng thời gian"""
-        if not self.db_connection:
-            if not self._connect_db():
-                return []
-
-        try:
-            cursor = self.db_connection.cursor()
-
-            query = """
+    # Các cột crawl từ bảng nguồn, dùng chung cho crawl theo ngày và incremental sync
+    CRAWL_SELECT = """
             SELECT 
                 COALESCE(product_id::text, CONCAT('SP_', SUBSTRING(MD5(RANDOM()::text), 1, 8))) as id_sanpham,
                 COALESCE(image, '') as image,
@@ -324,6 +414,40 @@ class StreamingProductPipeline:
                 COALESCE(reach::text, '0') as reach,
                 COALESCE(quantity::text, '0') as quantity
             FROM ai_craw.product_marketing_summary
+    """
+
+    def _iter_query(self, query: str, params: tuple) -> Iterator[Dict[str, Any]]:
+        """
+        Chạy query bằng server-side (named) cursor và yield từng row dạng dict
+
+        Rows được fetch từng đợt self.crawl_itersize, nên pipeline có thể xử lý
+        những rows đầu tiên trong khi các rows sau vẫn đang được tải.
+        """
+        if not self.db_connection:
+            if not self._connect_db():
+                raise Exception("Không kết nối được PostgreSQL")
+
+        # Named cursor => PostgreSQL giữ kết quả phía server, client chỉ nhận từng đợt
+        cursor = self.db_connection.cursor(name=f"crawl_{uuid.uuid4().hex[:8]}")
+        cursor.itersize = self.crawl_itersize
+
+        try:
+            cursor.execute(query, params)
+            columns = None
+
+            for row in cursor:
+                if columns is None:
+                    columns = [desc[0] for desc in cursor.description]
+                yield dict(zip(columns, row))
+
+        finally:
+            cursor.close()
+            # Kết thúc transaction của named cursor
+            self.db_connection.rollback()
+
+    def iter_data_by_date_range(self, start_date: str, end_date: str, limit: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Crawl data theo khoảng thời gian dạng generator (server-side cursor)"""
+        query = self.CRAWL_SELECT + """
             WHERE published_at BETWEEN %s AND %s
             AND image IS NOT NULL 
             AND image != ''
@@ -331,19 +455,56 @@ class StreamingProductPipeline:
             LIMIT %s
             """
 
+        count = 0
+        for row in self._iter_query(query, (start_date, end_date, limit)):
+            count += 1
+            yield row
+
+        print(f"✅ Crawl được {count} records từ {start_date} đến {end_date}")
 
-            cursor.execute(query, (start_date, end_date, limit))
-            columns = [desc[0] for desc in cursor.description]
-            results = []
+    def iter_data_after_watermark(self, watermark: Optional[tuple], page_size: int = 500,
+                                  initial_start: str = "1970-01-01") -> Iterator[Dict[str, Any]]:
+        """
+        Keyset pagination: lấy page tiếp theo sau high-water mark (published_at, product_id)
 
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                results.append(row_dict)
+        Không dùng OFFSET và không quét lại các rows đã sync, chỉ cần index
+        trên (published_at, product_id) của bảng nguồn.
 
-            cursor.close()
-            print(f"✅ Crawl được {len(results)} records từ {start_date} đến {end_date}")
-            return results
+        Args:
+            watermark: (published_at, product_id) của row cuối đã xử lý, None nếu sync lần đầu
+            page_size: Số rows tối đa của page
+            initial_start: Mốc published_at bắt đầu khi chưa có watermark
+        """
+        if watermark:
+            condition = "(published_at, product_id) > (%s, %s)"
+            params = (watermark[0], watermark[1], page_size)
+        else:
+            condition = "published_at >= %s"
+            params = (initial_start, page_size)
+
+        query = self.CRAWL_SELECT + f"""
+            WHERE {condition}
+            AND published_at IS NOT NULL
+            AND product_id IS NOT NULL
+            AND image IS NOT NULL 
+            AND image != ''
+            ORDER BY published_at ASC, product_id ASC
+            LIMIT %s
+            """
+        return self._iter_query(query, params)
 
+    def iter_data_by_ids(self, id_list: List[str]) -> Iterator[Dict[str, Any]]:
+        """Lấy lại rows nguồn theo product_id (cho các record lỗi cần thử lại của incremental sync)"""
+        query = self.CRAWL_SELECT + """
+            WHERE product_id::text = ANY(%s)
+            ORDER BY published_at ASC, product_id ASC
+            """
+        return self._iter_query(query, (list(id_list),))
+
+    def crawl_data_by_date_range(self, start_date: str, end_date: str, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Crawl data từ database theo khoảng thời gian"""
+        try:
+            return list(self.iter_data_by_date_range(start_date, end_date, limit))
         except Exception as e:
             print(f"❌ Lỗi khi crawl data: {e}")
             return []
@@ -588,23 +749,16 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
 
 
     def _download_image_cached(self, url: str) -> bytes:
-        """Download image với caching"""
-        with self.cache_lock:
-            if url in self.image_cache:
-                return self.image_cache[url]
-
+        """Download image với caching (cache trên đĩa, giữ lại giữa các lần chạy)"""
         try:
-            response = requests.get(url, timeout=15)
-            response.raise_for_status()
-            image_bytes = response.content
-
-            with self.cache_lock:
-                self.image_cache[url] = image_bytes
-
-            return image_bytes
+            return self.image_cache.get_or_fetch(url, self._fetch_image)
         except Exception as e:
             raise Exception(f"Lỗi download ảnh: {str(e)}")
 
+    def _fetch_image(self, url: str) -> bytes:
+        """Tải ảnh khi cache miss"""
+        return self.http_fetcher.fetch(url, timeout=15)
+
     def _extract_json_from_qwen_response(self, content: str) -> Dict:
         """Extract JSON từ Qwen2.5-VL response"""
         try:
@@ -696,22 +850,26 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
             # Nếu có lỗi, trả về ảnh gốc
             return image_bytes
 
-    def _analyze_with_qwen_vl(self, image_url: str) -> Dict:
+    def _analyze_with_qwen_vl(self, image_url: str, image_bytes: Optional[bytes] = None) -> Dict:
         """Phân tích với Qwen2.5-VL model với Smart Resize"""
         try:
             print(f"🔍 Đang phân tích: {image_url}")
             
-            # Download ảnh
-            image_bytes = self._download_image_cached(image_url)
+            # Download ảnh (bỏ qua nếu stage download đã tải sẵn)
+            if image_bytes is None:
+                image_bytes = self._download_image_cached(image_url)
             print(f"📥 Tải ảnh thành công: {len(image_bytes)/1024:.1f} KB")
             
-            # Smart resize để tối ưu hóa
-            optimized_image_bytes = self._smart_resize_image(
-                image_bytes, 
-                max_width=512,    # Kích thước phù hợp cho vision model
-                max_height=512, 
-                quality=90         # Chất lượng cao cho AI analysis
-            )
+            # Smart resize để tối ưu hóa (dùng lại bản 512px đã cache nếu có)
+            optimized_image_bytes = self.image_cache.get(image_url, 'vlm')
+            if optimized_image_bytes is None:
+                optimized_image_bytes = self._smart_resize_image(
+                    image_bytes,
+                    max_width=512,    # Kích thước phù hợp cho vision model
+                    max_height=512,
+                    quality=90         # Chất lượng cao cho AI analysis
+                )
+                self.image_cache.put(image_url, optimized_image_bytes, 'vlm')
             
             # Encode base64
             image_base64 = base64.b64encode(optimized_image_bytes).decode('utf-8')
@@ -753,10 +911,10 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
             print(f"❌ Qwen2.5-VL error for {image_url}: {str(e)}")
             raise Exception(f"Qwen2.5-VL analysis failed: {str(e)}")
 
-    def label_image_with_qwen(self, image_url: str) -> ProductLabel:
+    def label_image_with_qwen(self, image_url: str, image_bytes: Optional[bytes] = None) -> ProductLabel:
         """Đánh label cho 1 ảnh sản phẩm với Qwen2.5-VL"""
         try:
-            result = self._analyze_with_qwen_vl(image_url)
+            result = self._analyze_with_qwen_vl(image_url, image_bytes)
 
             return ProductLabel(
                 image_url=image_url,
@@ -789,6 +947,14 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
         )
         return image_vector, text_vector
 
+    def _generate_vectors_batch(self, texts: List[str], image_sources: List[Any]) -> tuple:
+        """Tạo embedding vectors cho cả batch (image_sources là URL hoặc bytes ảnh)"""
+        image_vectors, text_vectors = self.embedding_service._generate_vectors_batch(
+            descriptions=texts,
+            image_urls=image_sources
+        )
+        return image_vectors, text_vectors
+
     def _create_description(self, label: ProductLabel) -> str:
         """Tạo description markdown"""
         def format_list(items: List[str]) -> str:
@@ -830,26 +996,30 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
     def _streaming_insert_worker(self):
         """Background worker để insert records liên tục"""
         batch_buffer = []
-        
+        batch_started = None
+
         while True:
             try:
-                # Lấy record từ queue (timeout 5s)
+                # Chờ tới khi đủ batch hoặc record đầu tiên trong batch đã chờ quá insert_max_wait
+                timeout = 5 if batch_started is None else max(
+                    self.insert_max_wait - (time.time() - batch_started), 0.01
+                )
                 try:
-                    record = self.ready_records_queue.get(timeout=5)
+                    record = self.ready_records_queue.get(timeout=timeout)
                     if record is None:  # Signal để kết thúc
                         break
+                    if not batch_buffer:
+                        batch_started = time.time()
                     batch_buffer.append(record)
                 except queue.Empty:
-                    # Timeout - insert batch hiện tại nếu có
-                    if batch_buffer:
-                        self._insert_batch_immediate(batch_buffer)
-                        batch_buffer = []
-                    continue
+                    pass
 
-                # Insert khi đủ batch size hoặc khi receive None signal
-                if len(batch_buffer) >= self.insert_batch_size:
+                batch_full = len(batch_buffer) >= self.insert_batch_size
+                batch_due = batch_started is not None and time.time() - batch_started >= self.insert_max_wait
+                if batch_buffer and (batch_full or batch_due):
                     self._insert_batch_immediate(batch_buffer)
                     batch_buffer = []
+                    batch_started = None
 
             except Exception as e:
                 print(f"❌ Lỗi trong streaming insert worker: {e}")
@@ -866,8 +1036,9 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
 
             # Chuẩn bị data cho batch insert
             ids = [record.id_sanpham for record in records]
-            image_vectors = [record.image_vector for record in records]
-            description_vectors = [record.description_vector for record in records]
+            image_vectors = to_milvus_vectors([record.image_vector for record in records], self.vector_dtype)
+            description_vectors = to_milvus_vectors([record.description_vector for record in records],
+                                                    self.vector_dtype)
             images = [record.image for record in records]
             descriptions = [record.description for record in records]
             metadatas = [record.metadata for record in records]
@@ -883,16 +1054,24 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
                 ids, image_vectors, description_vectors, images, descriptions, metadatas,
                 dates, likes, comments, shares, link_redirects, platforms, name_stores
             ]
+            if self.has_date_ts:
+                data.append([parse_date_ts(date) for date in dates])
+            if self.has_embedding_model:
+                # Vectors lấy lại từ run journal giữ phiên bản model đã tạo ra chúng
+                data.append([self.embedding_model_version if record.embedding_model is None
+                             else record.embedding_model for record in records])
 
             # Insert vào Milvus
-            mr = self.collection.insert(data)
-            self.collection.flush()
+            self._insert_columns(data, dates)
+            self._maybe_flush()
 
             # Update statistics thread-safe
             with self.insert_stats_lock:
                 self.stats['inserted_count'] += len(records)
                 self.stats['insert_batches'] += 1
                 self.stats['inserted_ids'].extend(ids)
+            self.dedup_index.add_many(ids)
+            self.run_journal.mark_inserted(ids)
 
             print(f"💾 ✅ Inserted batch: {len(records)} records (Total: {self.stats['inserted_count']})")
 
@@ -903,76 +1082,14 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
                 for record in records:
                     self.stats['failed_records'].append(record.id_sanpham)
     def save_product_to_db(self, record):
-        """Save ProductRecord to ai_craw.data_label table in database"""
+        """Đưa ProductRecord vào buffer của Postgres sink (ai_craw.data_label)"""
         try:
-            # Kết nối DB
-            remote_db_connection = psycopg2.connect(
-                host='45.79.189.110',
-                database='ai_db',
-                user='ai_engineer',
-                password='StrongPassword123',
-                port=5432
-            )
-            cursor = remote_db_connection.cursor()
-
-            # Tạo schema nếu chưa có
-            cursor.execute("CREATE SCHEMA IF NOT EXISTS ai_craw;")
-
-            # Tạo bảng nếu chưa có (bổ sung date_created để khớp với insert)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS ai_craw.data_label (
-                    id SERIAL PRIMARY KEY,
-                    id_sanpham VARCHAR(100) UNIQUE NOT NULL,
-                    description TEXT,
-                    date_created TIMESTAMP,
-                    platform VARCHAR(200),
-                    name_store VARCHAR(500),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-            # Tạo index
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_data_label_id_sanpham 
-                ON ai_craw.data_label(id_sanpham);
-            """)
-
-            # Insert/Update record
-            cursor.execute("""
-                INSERT INTO ai_craw.data_label (
-                    id_sanpham, description, date_created, platform, name_store
-                ) VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (id_sanpham) DO UPDATE SET
-                    description = EXCLUDED.description,
-                    date_created = EXCLUDED.date_created,
-                    platform = EXCLUDED.platform,
-                    name_store = EXCLUDED.name_store,
-                    updated_at = CURRENT_TIMESTAMP;
-            """, (
-                record.id_sanpham,
-                record.description,
-                record.date,
-                record.platform,
-                record.name_store
-            ))
-
-            remote_db_connection.commit()
-            cursor.close()
-            remote_db_connection.close()
-
-            print(f"✅ Database saved: {record.id_sanpham}")
+            self.postgres_sink.add(record)
             return True
-
         except Exception as e:
             print(f"❌ Error saving to remote database: {e}")
-            try:
-                if 'remote_db_connection' in locals():
-                    remote_db_connection.rollback()
-                    remote_db_connection.close()
-            except:
-                pass
             return False
+
     def _process_and_queue_record(self, raw_data: Dict[str, Any]) -> bool:
         """Xử lý record và đưa vào queue để insert"""
         try:
@@ -981,35 +1098,33 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
             if not image_url:
                 return False
 
-            # 1. Label với Qwen2.5-VL
-            label = self.label_image_with_qwen(image_url)
-            metadata = asdict(label)
+            state = self.journal_states.get(raw_data.get('id_sanpham'), {})
 
-            # 2. Tạo description
-            description = self._create_description(label)
+            if 'description' in state:
+                # Resume: đã label ở lần chạy trước
+                metadata, description = state['metadata'], state['description']
+            else:
+                # 1. Label với Qwen2.5-VL
+                label = self.label_image_with_qwen(image_url)
+                metadata = asdict(label)
 
+                # 2. Tạo description
+                description = self._create_description(label)
+                self._journal_labeled(raw_data, metadata, description)
 
             # 3. Generate vectors
-            image_vector, description_vector = self._generate_vectors(description, image_url)
+            if 'image_vector' in state:
+                image_vector, description_vector = state['image_vector'], state['description_vector']
+            else:
+                image_vector, description_vector = self._generate_vectors(description, image_url)
 
             # 4. Tạo ProductRecord
-            record = ProductRecord(
-                id_sanpham=raw_data.get('id_sanpham', f"SP_{uuid.uuid4().hex[:8]}"),
-                image_vector=image_vector,
-                description_vector=description_vector,
-                image=image_url,
-                description=description,
-                metadata=metadata,
-                date=raw_data.get('date', ''),
-                like=raw_data.get('like', '0'),
-                comment=raw_data.get('comment', '0'),
-                share=raw_data.get('share', '0'),
-                link_redirect=raw_data.get('link_redirect', ''),
-                platform=raw_data.get('platform', ''),
-                name_store=raw_data.get('name_store', '')
-            )
+            record = self._build_record(raw_data, metadata, description, image_vector, description_vector,
+                                        state.get('embedding_model'))
+            if 'image_vector' not in state:
+                self._journal_embedded(record)
             # đẩy dữ liệu lên database
-            self.save_product_to_db(record)
+            self._save_to_postgres(record)
             # 5. Đưa record vào queue để insert
             self.ready_records_queue.put(record)
             
@@ -1022,36 +1137,233 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
             return True
 
         except Exception as e:
-            print(f"❌ Lỗi xử lý record {raw_data.get('id_sanpham', 'unknown')}: {str(e)}")
-            with self.insert_stats_lock:
-                self.stats['failed_count'] += 1
-                self.stats['failed_records'].append(raw_data.get('id_sanpham', 'unknown'))
+            self._record_failure(raw_data, e)
             return False
 
-    # === STREAMING PIPELINE METHODS ===
-    def run_streaming_pipeline(self, start_date: str, end_date: str, limit: int = 1000) -> Dict[str, Any]:
-        """
-        Chạy streaming pipeline: Process + Insert liên tục
+    def _build_record(self, raw_data: Dict[str, Any], metadata: dict, description: str,
+                      image_vector, description_vector, embedding_model: Optional[str] = None) -> ProductRecord:
+        """Tạo ProductRecord từ raw data và kết quả label/embedding"""
+        return ProductRecord(
+            id_sanpham=raw_data.get('id_sanpham', f"SP_{uuid.uuid4().hex[:8]}"),
+            image_vector=image_vector,
+            description_vector=description_vector,
+            image=raw_data.get('image', ''),
+            description=description,
+            metadata=metadata,
+            date=raw_data.get('date', ''),
+            like=raw_data.get('like', '0'),
+            comment=raw_data.get('comment', '0'),
+            share=raw_data.get('share', '0'),
+            link_redirect=raw_data.get('link_redirect', ''),
+            platform=raw_data.get('platform', ''),
+            name_store=raw_data.get('name_store', ''),
+            embedding_model=embedding_model
+        )
 
-        Args:
-            start_date: Ngày bắt đầu (YYYY-MM-DD)
-            end_date: Ngày kết thúc (YYYY-MM-DD)
-            limit: Số lượng record tối đa
+    def _record_failure(self, raw_data: Dict[str, Any], error: Exception, stage: str = None):
+        """Ghi nhận record xử lý thất bại (thread-safe)"""
+        id_sanpham = raw_data.get('id_sanpham', 'unknown')
+        stage_info = f" [{stage}]" if stage else ""
+        print(f"❌ Lỗi xử lý record {id_sanpham}{stage_info}: {str(error)}")
+        with self.insert_stats_lock:
+            self.stats['failed_count'] += 1
+            self.stats['failed_records'].append(id_sanpham)
+
+    # === STAGED PIPELINE METHODS ===
+    def _stage_download(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Stage 1 (I/O-bound): tải ảnh sản phẩm"""
+        raw_data = item['raw']
+        if 'description' in item:
+            # Resume: đã label ở lần chạy trước, không cần tải ảnh cho Qwen
+            return item
+        try:
+            image_url = raw_data.get('image', '')
+            if not image_url:
+                raise Exception("Không có URL ảnh")
+            item['image_bytes'] = self._download_image_cached(image_url)
+            return item
+        except Exception as e:
+            self._record_failure(raw_data, e, 'download')
+            return None
+
+    def _stage_label(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Stage 2 (VLM): label với Qwen2.5-VL và tạo description"""
+        raw_data = item['raw']
+        if 'description' in item:
+            return item
+        try:
+            label = self.label_image_with_qwen(raw_data['image'], item.get('image_bytes'))
+            item['metadata'] = asdict(label)
+            item['description'] = self._create_description(label)
+            self._journal_labeled(raw_data, item['metadata'], item['description'])
+            return item
+        except Exception as e:
+            self._record_failure(raw_data, e, 'label')
+            return None
+
+    def _stage_embed(self, items: List[Dict[str, Any]]) -> List[ProductRecord]:
+        """Stage 3 (GPU-bound): embedding theo micro-batch, 1 forward pass cho mỗi modality"""
+        # Record đã có vectors trong journal thì không cần embed lại
+        records = [self._build_record(item['raw'], item['metadata'], item['description'],
+                                      item['image_vector'], item['description_vector'], item['embedding_model'])
+                   for item in items if 'image_vector' in item]
+        items = [item for item in items if 'image_vector' not in item]
+
+        if items:
+            try:
+                descriptions = [item['description'] for item in items]
+                # Dùng lại ảnh đã tải ở stage download, tránh tải lại
+                image_sources = [self._clip_input(item) for item in items]
+                image_vectors, description_vectors = self._generate_vectors_batch(descriptions, image_sources)
+            except Exception as e:
+                for item in items:
+                    self._record_failure(item['raw'], e, 'embed')
+                items, image_vectors, description_vectors = [], [], []
 
-        Returns:
-            Dictionary chứa thống kê kết quả
-        """
-        print("🚀 BẮT ĐẦU STREAMING PIPELINE VỚI QWEN2.5-VL")
-        print(f"📅 Thời gian: {start_date} → {end_date}")
-        print(f"📊 Giới hạn: {limit} records")
-        print(f"🤖 Model: {self.qwen_model}")
-        print(f"⚡ Workers: {self.max_workers}")
-        print(f"📦 Insert batch size: {self.insert_batch_size}")
-        print("-" * 80)
+            for item, image_vector, description_vector in zip(items, image_vectors, description_vectors):
+                record = self._build_record(item['raw'], item['metadata'], item['description'],
+                                            image_vector, description_vector)
+                self._journal_embedded(record)
+                records.append(record)
 
-        start_time = time.time()
+        with self.insert_stats_lock:
+            self.stats['processed_count'] += len(records)
+        return records
 
-        # Reset statistics
+    def _clip_input(self, item: Dict[str, Any]) -> Union[str, bytes]:
+        """Ảnh đầu vào cho CLIP: bản resize đã cache, fallback về bytes gốc hoặc URL"""
+        image_url = item['raw']['image']
+        image_bytes = item.pop('image_bytes', None)
+        try:
+            return self.image_cache.get_variant(image_url, 'clip', raw_bytes=image_bytes)
+        except Exception:
+            return image_bytes or image_url
+
+    def _maybe_flush(self):
+        """Flush Milvus nếu đã quá flush_interval kể từ lần flush trước"""
+        with self._flush_lock:
+            if time.time() - self._last_flush_time < self.flush_interval:
+                return
+            self.collection.flush()
+            self._last_flush_time = time.time()
+        with self.insert_stats_lock:
+            self.stats['flush_count'] = self.stats.get('flush_count', 0) + 1
+
+    def _finalize_collection(self):
+        """Cuối run: flush phần còn lại, trigger compaction và ghi số segment vào stats"""
+        try:
+            with self._flush_lock:
+                self.collection.flush()
+                self._last_flush_time = time.time()
+            with self.insert_stats_lock:
+                self.stats['flush_count'] = self.stats.get('flush_count', 0) + 1
+
+            if self.compact_on_finish and self.stats.get('inserted_count'):
+                # Compaction chạy bất đồng bộ phía Milvus, không chờ ở đây
+                self.collection.compact()
+                print("🧱 Đã trigger Milvus compaction")
+
+            segments = utility.get_query_segment_info(self.collection_name)
+            self.stats['segment_count'] = len(segments)
+        except Exception as e:
+            print(f"⚠️  Không finalize được collection: {str(e)}")
+
+    def _stage_postgres_sink(self, record: ProductRecord) -> None:
+        """Sink: lưu record vào ai_craw.data_label"""
+        self._save_to_postgres(record)
+        return None
+
+    def _stage_milvus_sink(self, records: List[ProductRecord]) -> List:
+        """Sink: insert batch records vào Milvus"""
+        self._insert_batch_immediate(records)
+        return []
+
+    def _build_stages(self) -> List[PipelineStage]:
+        """Tạo các stage và nối chúng bằng bounded queues"""
+        conf = self.stage_config
+
+        download = PipelineStage('download', self._stage_download, **conf['download'])
+        label = PipelineStage('label', self._stage_label, **conf['label'])
+        embed = PipelineStage('embed', self._stage_embed, **conf['embed'])
+        postgres = PipelineStage('postgres', self._stage_postgres_sink, **conf['postgres'])
+        milvus_conf = {'batch_size': self.insert_batch_size, 'max_wait': self.insert_max_wait}
+        milvus_conf.update(conf['milvus'])
+        milvus = PipelineStage('milvus', self._stage_milvus_sink, **milvus_conf)
+
+        download.connect(label)
+        label.connect(embed)
+        embed.connect(postgres, milvus)
+
+        return [download, label, embed, postgres, milvus]
+
+    # === RUN JOURNAL ===
+    def _journal_labeled(self, raw_data: Dict[str, Any], metadata: dict, description: str):
+        """Ghi kết quả label vào journal"""
+        if raw_data.get('id_sanpham'):
+            self.run_journal.mark_labeled(raw_data['id_sanpham'], metadata, description)
+
+    def _journal_embedded(self, record: ProductRecord):
+        """Ghi vectors vào journal"""
+        self.run_journal.mark_embedded(record.id_sanpham, record.image_vector, record.description_vector,
+                                       self.embedding_model_version)
+
+    def _save_to_postgres(self, record: ProductRecord):
+        """Lưu Postgres nếu lần chạy trước chưa lưu (journal được ghi khi sink flush xong)"""
+        if self.journal_states.get(record.id_sanpham, {}).get('postgres_saved'):
+            return
+        self.save_product_to_db(record)
+
+    def _start_journal_run(self, start_date: str, end_date: str, limit: int) -> str:
+        """Đăng ký run trong journal, báo nếu đang resume run bị dừng trước đó"""
+        run_key = RunJournal.make_run_key(self.collection_name, start_date, end_date, limit)
+        previous_status = self.run_journal.start_run(run_key, {
+            'start_date': start_date, 'end_date': end_date, 'limit': limit
+        })
+        if previous_status and previous_status != 'completed':
+            print(f"🔁 Resume run '{run_key}' (trạng thái trước: {previous_status})")
+        self.journal_states = {}
+        return run_key
+
+    def _load_journal_states(self, new_records: List[Dict[str, Any]]):
+        """Đọc tiến độ đã lưu cho các record sắp xử lý"""
+        id_list = [record['id_sanpham'] for record in new_records if record.get('id_sanpham')]
+        states = self.run_journal.get_states(id_list)
+        self.journal_states.update(states)
+        labeled = sum(1 for state in states.values() if 'description' in state)
+        embedded = sum(1 for state in states.values() if 'image_vector' in state)
+        if labeled:
+            print(f"🔁 Journal: {labeled} records đã label, {embedded} records đã có vectors - bỏ qua các bước này")
+
+    def _finish_journal_run(self, run_key: str, status: str):
+        """Đánh dấu kết thúc run và dọn vectors không cần nữa"""
+        try:
+            self.run_journal.finish_run(run_key, self.stats, status)
+            self.run_journal.compact()
+        except Exception as e:
+            print(f"⚠️  Không cập nhật được run journal: {str(e)}")
+        self.journal_states = {}
+
+    def _flush_postgres(self):
+        """Flush Postgres sink và ghi các record chưa lưu được vào stats"""
+        self.postgres_sink.flush()
+        unflushed = self.postgres_sink.get_unflushed_ids()
+        self.stats['postgres_unflushed'] = len(unflushed)
+        self.stats['postgres_unflushed_ids'] = unflushed
+        if unflushed:
+            print(f"⚠️  {len(unflushed)} records chưa lưu được vào Postgres (sẽ thử lại ở lần flush sau)")
+
+    def _save_dedup_index(self):
+        """Lưu dedup index xuống đĩa sau mỗi lần chạy"""
+        try:
+            self.dedup_index.save()
+            index_stats = self.dedup_index.get_stats()
+            print(f"🗂️  Dedup index: {index_stats['size']} IDs, {index_stats['local_hits']} local hits, "
+                  f"{index_stats['milvus_queries']} Milvus queries")
+        except Exception as e:
+            print(f"⚠️  Không lưu được dedup index: {str(e)}")
+
+    def _reset_stats(self):
+        """Reset statistics cho 1 lần chạy mới"""
         with self.insert_stats_lock:
             self.stats = {
                 'start_time': datetime.now().isoformat(),
@@ -1061,121 +1373,401 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
                 'inserted_count': 0,
                 'failed_count': 0,
                 'insert_batches': 0,
+                'flush_count': 0,
+                'segment_count': None,
                 'skipped_duplicates': [],
                 'inserted_ids': [],
                 'failed_records': [],
                 'total_time_seconds': 0
             }
 
+    def _print_final_summary(self, start_time: float, new_records_count: Optional[int]):
+        """Tính toán và in thống kê cuối cùng của 1 lần chạy"""
+        end_time = time.time()
+        self.stats['total_time_seconds'] = round(end_time - start_time, 2)
+        self.stats['end_time'] = datetime.now().isoformat()
+
+        # Log kết quả cuối cùng
+        print("=" * 80)
+        print("🎊 STREAMING PIPELINE HOÀN THÀNH!")
+        print(f"📊 THỐNG KÊ TỔNG KẾT:")
+        print(f"   📥 Crawl: {self.stats['crawled_count']} records")
+        print(f"   🔄 Trùng lặp (bỏ qua): {self.stats['duplicate_count']} records")
+        print(f"   🆕 Records mới: {new_records_count or 0} records")
+        print(f"   🤖 Xử lý thành công: {self.stats['processed_count']} records")
+        print(f"   💾 Insert thành công: {self.stats['inserted_count']} records")
+        print(f"   📦 Số batch inserts: {self.stats['insert_batches']} batches")
+        print(f"   🚿 Số lần flush Milvus: {self.stats.get('flush_count', 0)}")
+        if self.stats.get('segment_count') is not None:
+            print(f"   🧱 Số segments (loaded): {self.stats['segment_count']}")
+        print(f"   ❌ Thất bại: {self.stats['failed_count']} records")
+        if self.stats.get('postgres_unflushed'):
+            print(f"   🐘 Chưa lưu Postgres: {self.stats['postgres_unflushed']} records")
+        print(f"   ⏱️  Tổng thời gian: {self.stats['total_time_seconds']}s")
+
+        # Tính tỉ lệ thành công
+        if new_records_count is None:
+            new_records_count = max(self.stats['crawled_count'] - self.stats['duplicate_count'], 1)
+        success_rate = self.stats['inserted_count'] / max(new_records_count, 1) * 100
+        print(f"   📈 Tỉ lệ thành công: {success_rate:.1f}%")
+
+        # Tính tốc độ xử lý
+        if self.stats['total_time_seconds'] > 0:
+            processing_rate = self.stats['inserted_count'] / self.stats['total_time_seconds']
+            print(f"   🚄 Tốc độ insert: {processing_rate:.2f} records/second")
+
+        # Thống kê theo stage (staged mode)
+        for name, stage_stats in self.stats.get('stage_stats', {}).items():
+            print(f"   🧩 Stage {name}: {stage_stats['emitted']}/{stage_stats['received']} ok, "
+                  f"{stage_stats['failed']} lỗi, {stage_stats['workers']} workers, "
+                  f"busy {stage_stats['busy_seconds']}s")
+
+        # Hiển thị collection stats
         try:
-            # STEP 1: Crawl data
-            print("📥 STEP 1: Crawl data từ database...")
-            raw_data_list = self.crawl_data_by_date_range(start_date, end_date, limit)
+            total_entities = self.collection.num_entities
+            print(f"   💾 Tổng entities trong Milvus: {total_entities}")
+        except:
+            pass
 
-            if not raw_data_list:
-                print("⚠️  Không có data để xử lý")
-                return self.stats
+        print("=" * 80)
 
-            self.stats['crawled_count'] = len(raw_data_list)
-            print(f"✅ Crawl được {len(raw_data_list)} records")
+    def run_staged_pipeline(self, start_date: str, end_date: str, limit: int = 1000) -> Dict[str, Any]:
+        """
+        Chạy staged pipeline: download → label → embed → (Postgres, Milvus)
 
-            # STEP 2: Filter duplicates
-            print("🔍 STEP 2: Kiểm tra và lọc bỏ records trùng lặp...")
+        Mỗi stage chạy với số worker riêng (self.stage_config) và được nối bằng
+        bounded queues, nên download/label/embed của các record khác nhau chạy chồng lên nhau.
 
-            new_records, existing_records, duplicate_count = self.filter_existing_records(raw_data_list)
+        Args:
+            start_date: Ngày bắt đầu (YYYY-MM-DD)
+            end_date: Ngày kết thúc (YYYY-MM-DD)
+            limit: Số lượng record tối đa
 
-            self.stats['duplicate_count'] = duplicate_count
-            self.stats['skipped_duplicates'] = [record.get('id_sanpham', 'unknown') for record in existing_records]
+        Returns:
+            Dictionary chứa thống kê kết quả
+        """
+        print("🚀 BẮT ĐẦU STAGED PIPELINE VỚI QWEN2.5-VL")
+        print(f"📅 Thời gian: {start_date} → {end_date}")
+        print(f"📊 Giới hạn: {limit} records")
+        for name, conf in self.stage_config.items():
+            print(f"🧩 Stage {name}: {conf}")
+        print("-" * 80)
 
-            if not new_records:
-                print("⚠️  Tất cả records đã tồn tại, không có gì để xử lý")
-                return self.stats
+        start_time = time.time()
+        self._reset_stats()
+        run_key = self._start_journal_run(start_date, end_date, limit)
+        run_status = 'interrupted'
+
+        try:
+            # Crawl (server-side cursor) → lọc trùng theo chunk → các stage,
+            # record đầu tiên được xử lý trong khi crawl vẫn đang chạy
+            print("📥 Stream crawl + lọc trùng lặp + staged processing...")
+            pipeline = StagedPipeline(self._build_stages())
+            run_stats = pipeline.run(
+                {'raw': raw_data, **self.journal_states.get(raw_data.get('id_sanpham'), {})}
+                for raw_data in self._iter_new_records(start_date, end_date, limit)
+            )
+            self.stats['stage_stats'] = run_stats['stages']
+
+            print("✅ Staged pipeline hoàn thành!")
+            run_status = 'completed'
+
+        except Exception as e:
+            print(f"❌ Lỗi nghiêm trọng trong staged pipeline: {str(e)}")
+            run_status = 'failed'
+
+        finally:
+            self._flush_postgres()
+            self._finalize_collection()
+            self._save_dedup_index()
+            self._finish_journal_run(run_key, run_status)
+            self._print_final_summary(start_time, self.stats['crawled_count'] - self.stats['duplicate_count'])
 
-            print(f"✅ Sẽ xử lý {len(new_records)} records mới")
+        return self.stats
 
-            # STEP 3: Start streaming insert worker
-            print("💾 STEP 3: Khởi động streaming insert worker...")
+    def _filter_chunk(self, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Lọc trùng lặp 1 chunk crawl, cập nhật stats và đọc journal cho các record mới"""
+        new_records, existing_records, duplicate_count = self.filter_existing_records(chunk)
+        with self.insert_stats_lock:
+            self.stats['crawled_count'] += len(chunk)
+            self.stats['duplicate_count'] += duplicate_count
+            self.stats['skipped_duplicates'].extend(
+                record.get('id_sanpham', 'unknown') for record in existing_records
+            )
+        self._load_journal_states(new_records)
+        return new_records
+
+    def _iter_new_records(self, start_date: str, end_date: str, limit: int) -> Iterator[Dict[str, Any]]:
+        """Crawl dạng stream, lọc trùng lặp và đọc journal theo từng chunk"""
+        chunk = []
+
+        for raw_data in self.iter_data_by_date_range(start_date, end_date, limit):
+            chunk.append(raw_data)
+            if len(chunk) >= self.CRAWL_CHUNK_SIZE:
+                yield from self._filter_chunk(chunk)
+                chunk = []
+
+        if chunk:
+            yield from self._filter_chunk(chunk)
+
+    # === INCREMENTAL SYNC ===
+    def run_incremental_sync(self,
+                             page_size: int = 500,
+                             poll_interval: float = 60,
+                             initial_start: str = "1970-01-01",
+                             max_pages: Optional[int] = None,
+                             max_retry_attempts: int = 5) -> Dict[str, Any]:
+        """
+        Incremental sync theo high-water mark (published_at, product_id)
+
+        Mỗi vòng lấy 1 page bằng keyset query sau watermark đã lưu trong run journal,
+        xử lý qua các stage rồi mới tiến watermark. Record lỗi trong page (chưa insert Milvus
+        hoặc chưa lưu Postgres) được ghi vào danh sách thử lại trong run journal trước khi
+        watermark vượt qua, và được thử lại ở các vòng sau (cách nhau ít nhất poll_interval giây).
+        Hết dữ liệu thì chờ poll_interval giây và poll tiếp, nên có thể chạy liên tục như daemon.
+
+        Args:
+            page_size: Số rows mỗi page
+            poll_interval: Số giây chờ khi không có row mới (<= 0 để dừng khi hết dữ liệu)
+            initial_start: Mốc published_at bắt đầu khi chưa có watermark
+            max_pages: Dừng sau số page này (None = chạy cho tới khi bị dừng)
+            max_retry_attempts: Số lần xử lý tối đa cho 1 record lỗi trước khi bỏ cuộc
+
+        Returns:
+            Dictionary chứa thống kê kết quả
+        """
+        watermark_name = f"{self.collection_name}:product_marketing_summary"
+
+        print("🚀 BẮT ĐẦU INCREMENTAL SYNC VỚI QWEN2.5-VL")
+        print(f"📌 Watermark hiện tại: {self.run_journal.get_watermark(watermark_name) or 'chưa có'}")
+        print(f"📊 Page size: {page_size} | Poll interval: {poll_interval}s")
+        print("-" * 80)
+
+        start_time = time.time()
+        self._reset_stats()
+        self._stop_event.clear()
+        pages = 0
+
+        try:
+            while not self._stop_event.is_set():
+                self._retry_sync_failures(watermark_name, max_retry_attempts, max(poll_interval, 0))
+
+                watermark = self.run_journal.get_watermark(watermark_name)
+                page = list(self.iter_data_after_watermark(watermark, page_size, initial_start))
+
+                if not page:
+                    if poll_interval <= 0:
+                        break
+                    print(f"💤 Chưa có record mới, chờ {poll_interval}s...")
+                    self._stop_event.wait(poll_interval)
+                    continue
+
+                failed_ids = set(self._process_sync_page(page))
+
+                # Chỉ tiến watermark khi page đã xử lý xong, record lỗi được lưu để thử lại trước
+                self.run_journal.add_retries(watermark_name, [(row['id_sanpham'], row['date'])
+                                                              for row in page if row['id_sanpham'] in failed_ids])
+                last = page[-1]
+                self.run_journal.set_watermark(watermark_name, last['date'], last['id_sanpham'])
+                self._save_dedup_index()
+                pages += 1
+                print(f"📌 Page {pages}: {len(page)} rows ({len(failed_ids)} lỗi, chờ thử lại) "
+                      f"→ watermark ({last['date']}, {last['id_sanpham']})")
+
+                if max_pages and pages >= max_pages:
+                    break
+
+        except KeyboardInterrupt:
+            print("🛑 Dừng incremental sync")
+
+        except Exception as e:
+            print(f"❌ Lỗi nghiêm trọng trong incremental sync: {str(e)}")
+
+        finally:
+            self._flush_postgres()
+            self._finalize_collection()
+            self._save_dedup_index()
+            self.stats['sync_retries'] = self.run_journal.count_retries(watermark_name, max_retry_attempts)
+            if self.stats['sync_retries']['exhausted']:
+                print(f"⚠️  {self.stats['sync_retries']['exhausted']} records lỗi quá {max_retry_attempts} lần, "
+                      f"không thử lại nữa (bảng retries trong run journal)")
+            self._print_final_summary(start_time, self.stats['crawled_count'] - self.stats['duplicate_count'])
+
+        return self.stats
+
+    def _retry_sync_failures(self, watermark_name: str, max_attempts: int, min_age: float) -> int:
+        """Thử lại các record lỗi ở những page trước (đã nằm sau watermark)"""
+        retries = self.run_journal.get_retries(watermark_name, max_attempts, min_age)
+        if not retries:
+            return 0
+
+        ids = [id_sanpham for id_sanpham, _, _ in retries]
+        rows = list(self.iter_data_by_ids(ids))
+        found = {row['id_sanpham'] for row in rows}
+        # Row đã bị xoá khỏi bảng nguồn thì không cần thử lại
+        self.run_journal.remove_retries(watermark_name, [id_sanpham for id_sanpham in ids if id_sanpham not in found])
+        if not rows:
+            return 0
+
+        print(f"🔁 Thử lại {len(rows)} records lỗi ở các page trước")
+        failed_ids = set(self._process_sync_page(rows))
+        self.run_journal.remove_retries(watermark_name, found - failed_ids)
+        self.run_journal.add_retries(watermark_name, [(row['id_sanpham'], row['date'])
+                                                      for row in rows if row['id_sanpham'] in failed_ids])
+        return len(rows)
+
+    def _pending_postgres_records(self, page: List[Dict[str, Any]],
+                                  new_records: List[Dict[str, Any]]) -> List[ProductRecord]:
+        """Record đã có trong Milvus (bị lọc trùng) nhưng journal ghi chưa lưu Postgres: dựng lại từ journal"""
+        new_ids = {raw_data['id_sanpham'] for raw_data in new_records}
+        duplicates = [raw_data for raw_data in page if raw_data['id_sanpham'] not in new_ids]
+        if not duplicates:
+            return []
+
+        states = self.run_journal.get_states([raw_data['id_sanpham'] for raw_data in duplicates])
+        records = []
+        for raw_data in duplicates:
+            state = states.get(raw_data['id_sanpham'])
+            if state and state['inserted'] and not state['postgres_saved'] and 'image_vector' in state:
+                records.append(self._build_record(raw_data, state['metadata'], state['description'],
+                                                  state['image_vector'], state['description_vector'],
+                                                  state['embedding_model']))
+        return records
+
+    def _process_sync_page(self, page: List[Dict[str, Any]]) -> List[str]:
+        """
+        Lọc trùng lặp và chạy các stage cho 1 page của incremental sync
+
+        Returns:
+            id_sanpham của các record chưa xong (chưa insert Milvus hoặc chưa lưu Postgres)
+        """
+        self.journal_states = {}
+        new_records = self._filter_chunk(page)
+        pending = self._pending_postgres_records(page, new_records)
+        for record in pending:
+            self.postgres_sink.add(record)
+
+        if new_records:
+            pipeline = StagedPipeline(self._build_stages())
+            run_stats = pipeline.run(
+                {'raw': raw_data, **self.journal_states.get(raw_data.get('id_sanpham'), {})}
+                for raw_data in new_records
+            )
+            self.stats['stage_stats'] = run_stats['stages']
+        self._flush_postgres()
+
+        ids = [raw_data['id_sanpham'] for raw_data in new_records] + [record.id_sanpham for record in pending]
+        states = self.run_journal.get_states(ids)
+        return [id_sanpham for id_sanpham in ids
+                if not (states.get(id_sanpham, {}).get('inserted') and states.get(id_sanpham, {}).get('postgres_saved'))]
+
+    def stop_incremental_sync(self):
+        """Yêu cầu vòng incremental sync dừng sau page hiện tại"""
+        self._stop_event.set()
+
+    # === STREAMING PIPELINE METHODS ===
+    def run_streaming_pipeline(self, start_date: str, end_date: str, limit: int = 1000) -> Dict[str, Any]:
+        """
+        Chạy streaming pipeline: Process + Insert liên tục
+
+        Args:
+            start_date: Ngày bắt đầu (YYYY-MM-DD)
+            end_date: Ngày kết thúc (YYYY-MM-DD)
+            limit: Số lượng record tối đa
+
+        Returns:
+            Dictionary chứa thống kê kết quả
+        """
+        print("🚀 BẮT ĐẦU STREAMING PIPELINE VỚI QWEN2.5-VL")
+        print(f"📅 Thời gian: {start_date} → {end_date}")
+        print(f"📊 Giới hạn: {limit} records")
+        print(f"🤖 Model: {self.qwen_model}")
+        print(f"⚡ Workers: {self.max_workers}")
+        print(f"📦 Insert batch size: {self.insert_batch_size}")
+        print("-" * 80)
+
+        start_time = time.time()
+
+        # Reset statistics
+        self._reset_stats()
+        run_key = self._start_journal_run(start_date, end_date, limit)
+        run_status = 'interrupted'
+
+        new_count = 0
+        try:
+            # STEP 1: Start streaming insert worker
+            print("💾 STEP 1: Khởi động streaming insert worker...")
             insert_thread = threading.Thread(target=self._streaming_insert_worker)
             insert_thread.daemon = True
             insert_thread.start()
 
-            # STEP 4: Parallel processing với streaming insert
-            print(f"🤖 STEP 4: Streaming processing với Qwen2.5-VL...")
+            # STEP 2: Crawl (server-side cursor) → lọc trùng theo chunk → streaming processing,
+            # record mới được submit ngay trong khi crawl vẫn đang chạy
+            print(f"🤖 STEP 2: Stream crawl + lọc trùng lặp + streaming processing với Qwen2.5-VL...")
 
             with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                # Submit tất cả tasks
-                future_to_data = {
-                    executor.submit(self._process_and_queue_record, raw_data): raw_data
-                    for raw_data in new_records
-                }
-
-                # Monitor progress
+                future_to_data = {}
                 completed_count = 0
-                for future in concurrent.futures.as_completed(future_to_data):
-                    completed_count += 1
-                    raw_data = future_to_data[future]
-                    
-                    try:
-                        success = future.result(timeout=180)
-                        if success:
-                            print(f"✅ [{completed_count}/{len(new_records)}] Processed & Queued: {raw_data.get('id_sanpham', 'unknown')}")
-                        else:
-                            print(f"❌ [{completed_count}/{len(new_records)}] Failed: {raw_data.get('id_sanpham', 'unknown')}")
-                    
-                    except concurrent.futures.TimeoutError:
-                        print(f"⏰ [{completed_count}/{len(new_records)}] Timeout: {raw_data.get('id_sanpham', 'unknown')}")
-                    except Exception as e:
-                        print(f"❌ [{completed_count}/{len(new_records)}] Error: {raw_data.get('id_sanpham', 'unknown')} - {str(e)}")
 
-            # STEP 5: Signal insert worker to finish và chờ
-            print("🏁 STEP 5: Hoàn tất xử lý, chờ insert các records còn lại...")
+                for raw_data in self._iter_new_records(start_date, end_date, limit):
+                    # Giới hạn số task đang chờ để không giữ toàn bộ kết quả crawl trong bộ nhớ
+                    if len(future_to_data) >= self.max_workers * 2:
+                        done, _ = concurrent.futures.wait(future_to_data, return_when=concurrent.futures.FIRST_COMPLETED)
+                        completed_count = self._report_streaming_results(done, future_to_data, completed_count, new_count)
+                    future_to_data[executor.submit(self._process_and_queue_record, raw_data)] = raw_data
+                    new_count += 1
+
+                completed_count = self._report_streaming_results(
+                    concurrent.futures.as_completed(list(future_to_data)), future_to_data, completed_count, new_count
+                )
+
+            if not self.stats['crawled_count']:
+                print("⚠️  Không có data để xử lý")
+            elif not new_count:
+                print("⚠️  Tất cả records đã tồn tại, không có gì để xử lý")
+
+            # STEP 3: Signal insert worker to finish và chờ
+            print("🏁 STEP 3: Hoàn tất xử lý, chờ insert các records còn lại...")
             self.ready_records_queue.put(None)  # Signal to stop
             insert_thread.join(timeout=60)  # Chờ tối đa 60s
 
             print("✅ Streaming pipeline hoàn thành!")
+            run_status = 'completed'
 
         except Exception as e:
             print(f"❌ Lỗi nghiêm trọng trong streaming pipeline: {str(e)}")
+            run_status = 'failed'
 
         finally:
             # Tính toán thống kê cuối cùng
-            end_time = time.time()
-            self.stats['total_time_seconds'] = round(end_time - start_time, 2)
-            self.stats['end_time'] = datetime.now().isoformat()
-
-            # Log kết quả cuối cùng
-            print("=" * 80)
-            print("🎊 STREAMING PIPELINE HOÀN THÀNH!")
-            print(f"📊 THỐNG KÊ TỔNG KẾT:")
-            print(f"   📥 Crawl: {self.stats['crawled_count']} records")
-            print(f"   🔄 Trùng lặp (bỏ qua): {self.stats['duplicate_count']} records")
-            print(f"   🆕 Records mới: {len(new_records) if 'new_records' in locals() else 0} records")
-            print(f"   🤖 Xử lý thành công: {self.stats['processed_count']} records")
-            print(f"   💾 Insert thành công: {self.stats['inserted_count']} records")
-            print(f"   📦 Số batch inserts: {self.stats['insert_batches']} batches")
-            print(f"   ❌ Thất bại: {self.stats['failed_count']} records")
-            print(f"   ⏱️  Tổng thời gian: {self.stats['total_time_seconds']}s")
-
-            # Tính tỉ lệ thành công
-            new_records_count = len(new_records) if 'new_records' in locals() else max(
-                self.stats['crawled_count'] - self.stats['duplicate_count'], 1)
-            success_rate = self.stats['inserted_count'] / max(new_records_count, 1) * 100
-            print(f"   📈 Tỉ lệ thành công: {success_rate:.1f}%")
-
-            # Tính tốc độ xử lý
-            if self.stats['total_time_seconds'] > 0:
-                processing_rate = self.stats['inserted_count'] / self.stats['total_time_seconds']
-                print(f"   🚄 Tốc độ insert: {processing_rate:.2f} records/second")
-
-            # Hiển thị collection stats
+            self._flush_postgres()
+            self._finalize_collection()
+            self._save_dedup_index()
+            self._finish_journal_run(run_key, run_status)
+            self._print_final_summary(start_time, new_count)
+
+        return self.stats
+
+    def _report_streaming_results(self, futures, future_to_data: Dict[Any, Dict[str, Any]],
+                                  completed_count: int, total: int) -> int:
+        """Log kết quả các task đã xong (và bỏ khỏi future_to_data), trả về completed_count mới"""
+        for future in futures:
+            completed_count += 1
+            raw_data = future_to_data.pop(future)
+
             try:
-                total_entities = self.collection.num_entities
-                print(f"   💾 Tổng entities trong Milvus: {total_entities}")
-            except:
-                pass
+                success = future.result(timeout=180)
+                if success:
+                    print(f"✅ [{completed_count}/{total}] Processed & Queued: {raw_data.get('id_sanpham', 'unknown')}")
+                else:
+                    print(f"❌ [{completed_count}/{total}] Failed: {raw_data.get('id_sanpham', 'unknown')}")
 
-            print("=" * 80)
-            return self.stats
+            except concurrent.futures.TimeoutError:
+                print(f"⏰ [{completed_count}/{total}] Timeout: {raw_data.get('id_sanpham', 'unknown')}")
+            except Exception as e:
+                print(f"❌ [{completed_count}/{total}] Error: {raw_data.get('id_sanpham', 'unknown')} - {str(e)}")
+
+        return completed_count
 
     # === SINGLE RECORD PROCESSING ===
     def process_single_record_streaming(self, raw_data: Dict[str, Any]) -> bool:
@@ -1212,11 +1804,21 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
         with self.insert_stats_lock:
             return self.stats.copy()
 
-    def clear_cache(self):
-        """Clear image cache"""
-        with self.cache_lock:
+    def clear_cache(self, persistent: bool = False):
+        """
+        Clear image cache
+
+        Args:
+            persistent: Xoá cả cache trên đĩa. Mặc định chỉ in thống kê,
+                        vì cache được giữ lại cho các lần chạy sau
+        """
+        cache_stats = self.image_cache.get_stats()
+        print(f"🗂️  Image cache: {cache_stats['entries']} files, "
+              f"{cache_stats['total_bytes'] / 1024 ** 2:.1f} MB, "
+              f"{cache_stats['hits']} hits / {cache_stats['misses']} misses")
+        if persistent:
             self.image_cache.clear()
-        print("🧹 Đã clear image cache")
+            print("🧹 Đã clear image cache")
 
     def close_connections(self):
         """Đóng tất cả kết nối"""
@@ -1226,6 +1828,14 @@ Remember: The goal is sophisticated market intelligence, not just visual descrip
                 print("✅ Đã đóng kết nối PostgreSQL")
         except:
             pass
+        try:
+            self.postgres_sink.close()
+        except:
+            pass
+        try:
+            self.run_journal.close()
+        except:
+            pass
 
     # === MONITORING METHODS ===
     def start_progress_monitor(self, total_records: int, interval: int = 10):
@@ -1275,7 +1885,19 @@ def main_streaming_pipeline():
 
     # Streaming config
     max_workers = 1  # Số workers xử lý song song
-    insert_batch_size = 5  # Batch size nhỏ để insert nhanh hơn
+    insert_batch_size = 100  # Batch lớn + flush theo thời gian để tránh nhiều segment nhỏ
+
+    # "staged": download/label/embed/save chạy chồng lên nhau qua bounded queues
+    # "streaming": mỗi worker xử lý tuần tự toàn bộ các bước cho 1 record
+    # "incremental": daemon sync liên tục theo watermark, không cần khoảng thời gian
+    pipeline_mode = "staged"
+    sync_page_size = 500
+    sync_poll_interval = 60  # giây
+    stage_config = {
+        'download': {'workers': 8, 'queue_size': 64},
+        'label': {'workers': 1, 'queue_size': 16},
+        'embed': {'workers': 1, 'queue_size': 32},
+    }
 
     # Milvus config
     milvus_host = "10.10.4.25"
@@ -1297,7 +1919,8 @@ def main_streaming_pipeline():
             milvus_host=milvus_host,
             milvus_port=milvus_port,
             max_workers=max_workers,
-            insert_batch_size=insert_batch_size
+            insert_batch_size=insert_batch_size,
+            stage_config=stage_config
         )
 
         print("✅ Streaming Pipeline khởi tạo thành công!")
@@ -1320,11 +1943,19 @@ def main_streaming_pipeline():
         print(f"🎯 Bắt đầu streaming processing từ {start_date} đến {end_date}")
         print("💡 Records sẽ được insert ngay sau khi embedding xong!")
 
-        stats = pipeline.run_streaming_pipeline(
-            start_date=start_date,
-            end_date=end_date,
-            limit=limit
-        )
+        if pipeline_mode == "incremental":
+            stats = pipeline.run_incremental_sync(
+                page_size=sync_page_size,
+                poll_interval=sync_poll_interval
+            )
+        else:
+            run_pipeline = (pipeline.run_staged_pipeline if pipeline_mode == "staged"
+                            else pipeline.run_streaming_pipeline)
+            stats = run_pipeline(
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit
+            )
 
         # Lưu thống kê
         pipeline.save_stats_to_json(stats)
@@ -0,0 +1,197 @@
+"""
+Migrate collection cũ sang schema có date_ts (INT64), embedding_model + scalar indexes (+ partition key tuỳ chọn)
+
+Milvus không thêm field vào collection đã có nên script tạo collection mới cùng schema
+cộng thêm date_ts, copy toàn bộ rows (giữ nguyên vectors, không embedding lại), build
+vector index giống collection nguồn và scalar index cho date_ts / platform / name_store.
+
+--vector-dtype FLOAT16 / BFLOAT16 đổi kiểu lưu vector (giảm một nửa RAM), --profile build
+vector index theo index profile khác (ví dụ IVF_SQ8) thay vì copy index nguồn.
+So sánh recall sau khi migrate bằng compare_vector_dtype.py.
+--monthly-partitions chia rows vào partition theo tháng ('p_YYYYMM') cho RAG load theo khoảng ngày.
+Rows từ collection chưa có embedding_model được tag rỗng (chưa rõ model), reembed_collection.py sẽ tính lại.
+
+Ví dụ:
+    python migrate_scalar_fields.py --source product_collection_v4 --target product_collection_v5
+    python migrate_scalar_fields.py --source product_collection_v4 --target product_collection_v5 \\
+        --partition-key platform --alias product_collection
+    python migrate_scalar_fields.py --source product_collection_v4 --target product_collection_v4_fp16 \\
+        --vector-dtype FLOAT16
+
+Sau khi chạy xong, trỏ COLLECTION_NAME (RAG) sang collection mới hoặc dùng --alias.
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, Optional
+
+from pymilvus import Collection, CollectionSchema, FieldSchema, connections, utility
+
+from index_profiles import INDEX_PROFILES, VECTOR_FIELDS, build_index_params
+from scalar_fields import (
+    DATE_TS_FIELD, DEFAULT_NUM_PARTITIONS, EMBEDDING_MODEL_FIELD, PARTITION_KEY_FIELDS, collection_partition_key,
+    create_scalar_indexes, date_ts_field, embedding_model_field, parse_date_ts
+)
+from time_partitions import ensure_partitions, month_partition_name
+from vector_dtypes import (
+    VECTOR_DTYPES, detect_vector_dtype, from_milvus_vector, get_vector_dtype_name, to_milvus_vectors
+)
+
+
+def build_target_schema(source: Collection, partition_key: Optional[str] = None,
+                        vector_dtype: Optional[str] = None) -> CollectionSchema:
+    """Schema nguồn + date_ts + embedding_model, đánh dấu partition key và đổi kiểu vector nếu có"""
+    fields = []
+    for field in source.schema.fields:
+        if field.name in (DATE_TS_FIELD, EMBEDDING_MODEL_FIELD):
+            continue
+        kwargs = dict(field.params)
+        if field.name in PARTITION_KEY_FIELDS:
+            kwargs["is_partition_key"] = field.name == partition_key
+        dtype = field.dtype
+        if vector_dtype and field.name in VECTOR_FIELDS:
+            dtype = VECTOR_DTYPES[vector_dtype]
+        fields.append(FieldSchema(
+            name=field.name,
+            dtype=dtype,
+            is_primary=field.is_primary,
+            auto_id=field.auto_id,
+            description=field.description,
+            **kwargs
+        ))
+    fields.append(date_ts_field())
+    fields.append(embedding_model_field())
+    return CollectionSchema(fields=fields, description=source.schema.description)
+
+
+def copy_vector_indexes(source: Collection, target: Collection, profile: Optional[str] = None):
+    """Build vector index của target giống collection nguồn, hoặc theo index profile nếu có"""
+    for index in source.indexes:
+        if index.field_name not in VECTOR_FIELDS:
+            continue
+        index_params = build_index_params(profile, index.params.get("metric_type", "COSINE")) if profile \
+            else index.params
+        target.create_index(field_name=index.field_name, index_params=index_params,
+                            index_name=f"{index.field_name}_index")
+        print(f"✅ Index {index.field_name}: {index_params}")
+
+
+def migrate(source_name: str, target_name: str, partition_key: Optional[str] = None,
+            batch_size: int = 1000, vector_dtype: Optional[str] = None,
+            profile: Optional[str] = None, monthly_partitions: bool = False) -> Dict[str, Any]:
+    """
+    Copy toàn bộ rows từ source sang target (tạo mới) kèm date_ts
+
+    Returns:
+        Dictionary thống kê (số rows, số rows không parse được date, thời gian)
+    """
+    if utility.has_collection(target_name):
+        raise ValueError(f"Collection '{target_name}' đã tồn tại")
+
+    partition_key = collection_partition_key(partition_key)
+    if partition_key and monthly_partitions:
+        raise ValueError("--monthly-partitions không dùng chung được với --partition-key")
+    source = Collection(source_name)
+    source.load()
+
+    source_dtype = detect_vector_dtype(source)
+    target_dtype = get_vector_dtype_name(vector_dtype) if vector_dtype else source_dtype
+
+    schema = build_target_schema(source, partition_key, target_dtype)
+    if partition_key:
+        target = Collection(target_name, schema, num_partitions=DEFAULT_NUM_PARTITIONS)
+    else:
+        target = Collection(target_name, schema)
+    print(f"✅ Tạo collection '{target_name}' (partition key: {partition_key or 'không'}, "
+          f"vector: {source_dtype} → {target_dtype})")
+
+    output_fields = [field.name for field in source.schema.fields if field.name != DATE_TS_FIELD]
+    iterator = source.query_iterator(batch_size=batch_size, expr='id_sanpham != ""', output_fields=output_fields)
+
+    start = time.time()
+    copied = unparsed = 0
+    known_partitions = {partition.name for partition in target.partitions}
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            for row in rows:
+                row[DATE_TS_FIELD] = parse_date_ts(row.get("date"))
+                row.setdefault(EMBEDDING_MODEL_FIELD, "")
+                unparsed += row[DATE_TS_FIELD] == 0
+            # Luôn encode lại vectors: query trả FLOAT16 / BFLOAT16 dạng [bytes] mà insert theo row không nhận
+            for field_name in VECTOR_FIELDS:
+                vectors = [from_milvus_vector(row[field_name], source_dtype) for row in rows]
+                for row, vector in zip(rows, to_milvus_vectors(vectors, target_dtype)):
+                    row[field_name] = vector
+            if monthly_partitions:
+                groups: Dict[str, list] = {}
+                for row in rows:
+                    groups.setdefault(month_partition_name(row[DATE_TS_FIELD]), []).append(row)
+                ensure_partitions(target, groups, known_partitions)
+                for partition_name, partition_rows in groups.items():
+                    target.insert(partition_rows, partition_name=partition_name)
+            else:
+                target.insert(rows)
+            copied += len(rows)
+            print(f"📦 Đã copy {copied}/{source.num_entities} rows...", end="\r")
+    finally:
+        iterator.close()
+    print()
+
+    target.flush()
+    copy_vector_indexes(source, target, profile)
+    create_scalar_indexes(target)
+    target.load()
+
+    stats = {
+        'source': source_name,
+        'target': target_name,
+        'partition_key': partition_key,
+        'vector_dtype': target_dtype,
+        'partitions': len(known_partitions),
+        'copied': copied,
+        'unparsed_dates': unparsed,
+        'seconds': round(time.time() - start, 1),
+    }
+    if unparsed:
+        print(f"⚠️  {unparsed} rows có date không parse được (date_ts = 0)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate collection sang schema có date_ts + scalar indexes")
+    parser.add_argument("--host", default="10.10.4.25")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--source", required=True)
+    parser.add_argument("--target", required=True)
+    parser.add_argument("--partition-key", default=None, choices=list(PARTITION_KEY_FIELDS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--vector-dtype", default=None, choices=list(VECTOR_DTYPES),
+                        help="Kiểu lưu vector của collection mới (mặc định giữ như nguồn)")
+    parser.add_argument("--profile", default=None, choices=sorted(INDEX_PROFILES),
+                        help="Index profile cho vector fields (mặc định copy index nguồn)")
+    parser.add_argument("--monthly-partitions", action="store_true",
+                        help="Chia rows vào partition theo tháng của date")
+    parser.add_argument("--alias", default=None, help="Trỏ alias này sang collection mới sau khi migrate")
+    args = parser.parse_args()
+
+    connections.connect(alias="default", host=args.host, port=args.port)
+    try:
+        stats = migrate(args.source, args.target, args.partition_key, args.batch_size,
+                        args.vector_dtype, args.profile, args.monthly_partitions)
+        if args.alias:
+            if args.alias in utility.list_aliases(args.source):
+                utility.alter_alias(args.target, args.alias)
+            else:
+                utility.create_alias(args.target, args.alias)
+            print(f"🔀 Alias '{args.alias}' → '{args.target}'")
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+    except Exception as e:
+        print(f"❌ Lỗi migrate: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
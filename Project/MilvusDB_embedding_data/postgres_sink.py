@@ -0,0 +1,294 @@
+"""
+Postgres sink cho bảng ai_craw.data_label
+
+- Tạo schema/bảng/index một lần khi flush lần đầu
+- Giữ connection pool (ThreadedConnectionPool) thay vì mở kết nối mới cho mỗi record
+- Gom record vào buffer, upsert cả batch bằng execute_values khi đủ batch_size
+  hoặc khi record cũ nhất trong buffer đã chờ quá flush_interval giây
+- Batch lỗi được thử lại max_retries lần (backoff tăng dần); lỗi dữ liệu thì upsert lại từng row,
+  row vẫn lỗi được đưa lại vào buffer cho lần flush sau. Row lỗi quá max_row_attempts lần flush
+  (hoặc còn trong buffer lúc close) được giữ trong get_unflushed_ids() để pipeline báo cáo
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+BOOTSTRAP_SQL = """
+    CREATE SCHEMA IF NOT EXISTS ai_craw;
+
+    CREATE TABLE IF NOT EXISTS ai_craw.data_label (
+        id SERIAL PRIMARY KEY,
+        id_sanpham VARCHAR(100) UNIQUE NOT NULL,
+        description TEXT,
+        date_created TIMESTAMP,
+        platform VARCHAR(200),
+        name_store VARCHAR(500),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_data_label_id_sanpham
+    ON ai_craw.data_label(id_sanpham);
+"""
+
+UPSERT_SQL = """
+    INSERT INTO ai_craw.data_label (
+        id_sanpham, description, date_created, platform, name_store
+    ) VALUES %s
+    ON CONFLICT (id_sanpham) DO UPDATE SET
+        description = EXCLUDED.description,
+        date_created = EXCLUDED.date_created,
+        platform = EXCLUDED.platform,
+        name_store = EXCLUDED.name_store,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+class PostgresSink:
+    """Buffered writer cho ai_craw.data_label, thread-safe"""
+
+    def __init__(self,
+                 db_config: Dict[str, Any],
+                 batch_size: int = 200,
+                 flush_interval: float = 2.0,
+                 min_connections: int = 1,
+                 max_connections: int = 4,
+                 max_retries: int = 3,
+                 retry_backoff: float = 1.0,
+                 max_row_attempts: int = 5,
+                 on_flushed: Optional[Callable[[List[str]], None]] = None):
+        """
+        Args:
+            db_config: Tham số kết nối psycopg2 (host, database, user, password, port)
+            batch_size: Flush khi buffer đạt số record này
+            flush_interval: Flush khi record cũ nhất đã chờ quá số giây này
+            min_connections: Số connection tối thiểu của pool
+            max_connections: Số connection tối đa của pool
+            max_retries: Số lần thử lại 1 batch trong 1 lần flush
+            retry_backoff: Số giây chờ trước lần thử lại đầu tiên (nhân đôi sau mỗi lần)
+            max_row_attempts: Số lần flush tối đa cho 1 row trước khi bỏ khỏi buffer
+            on_flushed: Callback nhận danh sách id_sanpham đã lưu thành công
+        """
+        self.db_config = db_config
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_row_attempts = max_row_attempts
+        self.on_flushed = on_flushed
+
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._bootstrapped = False
+        self._pool_lock = threading.Lock()
+
+        self._buffer: Dict[str, tuple] = {}  # id_sanpham -> row, record sau ghi đè record trước
+        self._buffer_since: Optional[float] = None
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._attempts: Dict[str, int] = {}  # id_sanpham -> số lần flush lỗi
+        self._dropped: Dict[str, tuple] = {}  # row bị bỏ sau max_row_attempts lần lỗi
+        self._retry_at = 0.0  # add / thread nền không flush lại trước thời điểm này
+
+        self.stats = {'saved': 0, 'failed': 0, 'batches': 0, 'retries': 0, 'requeued': 0}
+
+        self._stop_event = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    # === CONNECTION ===
+    def _get_pool(self) -> ThreadedConnectionPool:
+        """Tạo pool và bootstrap schema ở lần dùng đầu tiên"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(self.min_connections, self.max_connections,
+                                                    **self.db_config)
+            if not self._bootstrapped:
+                conn = self._pool.getconn()
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(BOOTSTRAP_SQL)
+                    conn.commit()
+                    self._bootstrapped = True
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    self._pool.putconn(conn)
+            return self._pool
+
+    # === BUFFER ===
+    def add(self, record) -> None:
+        """Thêm ProductRecord vào buffer, flush ngay nếu đủ batch"""
+        row = (record.id_sanpham, record.description, record.date, record.platform, record.name_store)
+        with self._buffer_lock:
+            if not self._buffer:
+                self._buffer_since = time.time()
+            self._buffer[record.id_sanpham] = row
+            self._dropped.pop(record.id_sanpham, None)
+            full = len(self._buffer) >= self.batch_size
+
+        if full and time.time() >= self._retry_at:
+            self.flush()
+
+    def _take_buffer(self) -> List[tuple]:
+        with self._buffer_lock:
+            rows = list(self._buffer.values())
+            self._buffer = {}
+            self._buffer_since = None
+        return rows
+
+    def _requeue(self, rows: List[tuple]) -> int:
+        """
+        Đưa row lỗi lại vào buffer (record mới hơn cùng id đã add trong lúc flush thì giữ record mới)
+
+        Returns:
+            Số row đã đưa lại vào buffer
+        """
+        requeued = 0
+        with self._buffer_lock:
+            for row in rows:
+                if row[0] in self._buffer:
+                    continue
+                attempts = self._attempts.get(row[0], 0) + 1
+                if attempts >= self.max_row_attempts:
+                    self._attempts.pop(row[0], None)
+                    self._dropped[row[0]] = row
+                    continue
+                self._attempts[row[0]] = attempts
+                if not self._buffer:
+                    self._buffer_since = time.time()
+                self._buffer[row[0]] = row
+                requeued += 1
+        self.stats['requeued'] += requeued
+        return requeued
+
+    def _flush_loop(self):
+        """Thread nền: flush theo thời gian khi buffer không đủ batch"""
+        while not self._stop_event.wait(min(self.flush_interval, 1.0)):
+            with self._buffer_lock:
+                due = (self._buffer_since is not None
+                       and time.time() - self._buffer_since >= self.flush_interval)
+            if due and time.time() >= self._retry_at:
+                self.flush()
+
+    def _upsert(self, rows: List[tuple]) -> None:
+        """Upsert rows trong 1 transaction, raise nếu lỗi"""
+        pool = self._get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                execute_values(cursor, UPSERT_SQL, rows, page_size=len(rows))
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+    def _upsert_with_retry(self, rows: List[tuple]) -> Optional[Exception]:
+        """Thử upsert batch tối đa max_retries + 1 lần, trả về lỗi cuối cùng (None nếu thành công)"""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                self._upsert(rows)
+                return None
+            except Exception as e:
+                error = e
+                # Lỗi dữ liệu thì thử lại cả batch cũng không qua được
+                if not isinstance(e, (OperationalError, InterfaceError)):
+                    break
+        return error
+
+    def flush(self) -> int:
+        """
+        Upsert toàn bộ buffer trong 1 transaction (thử lại / upsert từng row nếu lỗi)
+
+        Returns:
+            Số record đã lưu (0 nếu buffer rỗng hoặc lỗi)
+        """
+        with self._flush_lock:
+            rows = self._take_buffer()
+            if not rows:
+                return 0
+
+            saved, failed = rows, []
+            error = self._upsert_with_retry(rows)
+            if error is not None:
+                print(f"❌ Error saving {len(rows)} records to remote database: {error}")
+                if isinstance(error, (OperationalError, InterfaceError)):
+                    saved, failed = [], rows
+                else:
+                    # Lỗi dữ liệu: upsert từng row để chỉ giữ lại row hỏng
+                    saved = []
+                    for row in rows:
+                        try:
+                            self._upsert([row])
+                            saved.append(row)
+                        except Exception as e:
+                            print(f"❌ Error saving record {row[0]}: {e}")
+                            failed.append(row)
+
+            if failed:
+                self.stats['failed'] += len(failed)
+                requeued = self._requeue(failed)
+                self._retry_at = time.time() + self.retry_backoff * 2 ** self.max_retries
+                if requeued:
+                    print(f"🔁 {requeued} records giữ lại trong buffer để thử lại lần flush sau")
+                if requeued < len(failed):
+                    print(f"⚠️  {len(failed) - requeued} records lỗi quá {self.max_row_attempts} lần, bỏ khỏi buffer")
+            else:
+                self._retry_at = 0.0
+
+            if not saved:
+                return 0
+            ids = [row[0] for row in saved]
+            with self._buffer_lock:
+                for id_sanpham in ids:
+                    self._attempts.pop(id_sanpham, None)
+            self.stats['saved'] += len(saved)
+            self.stats['batches'] += 1
+            print(f"✅ Database saved: {len(saved)} records")
+
+        if self.on_flushed:
+            try:
+                self.on_flushed(ids)
+            except Exception as e:
+                print(f"⚠️  Callback sau khi lưu Postgres lỗi: {e}")
+        return len(saved)
+
+    def get_unflushed_ids(self) -> List[str]:
+        """id_sanpham chưa lưu được: còn trong buffer hoặc đã bỏ sau max_row_attempts lần lỗi"""
+        with self._buffer_lock:
+            return list(self._buffer) + [id_sanpham for id_sanpham in self._dropped
+                                         if id_sanpham not in self._buffer]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._buffer_lock:
+            pending = len(self._buffer)
+            dropped = len(self._dropped)
+        return {**self.stats, 'pending': pending, 'dropped': dropped}
+
+    def close(self):
+        """Dừng thread flush, flush phần còn lại và đóng pool"""
+        self._stop_event.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        unflushed = self.get_unflushed_ids()
+        if unflushed:
+            print(f"⚠️  {len(unflushed)} records chưa lưu được vào Postgres: {unflushed[:20]}")
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
@@ -0,0 +1,79 @@
+"""
+Rebuild ANN index của image_vector / description_vector theo index profile
+
+Ví dụ:
+    python rebuild_indexes.py --collection product_collection_v4 --profile HNSW
+    python rebuild_indexes.py --collection product_collection_v4 --profile IVF_PQ --params '{"m": 64}'
+
+Collection bị release trong lúc build lại index nên search trên collection đó
+không dùng được cho tới khi chạy xong.
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from pymilvus import Collection, connections, utility
+
+from index_profiles import INDEX_PROFILES, VECTOR_FIELDS, build_index_params
+
+
+def rebuild_indexes(collection_name: str,
+                    profile: str,
+                    fields: Iterable[str] = VECTOR_FIELDS,
+                    overrides: Optional[Dict[str, Any]] = None,
+                    metric_type: str = "COSINE") -> Dict[str, Any]:
+    """
+    Drop index cũ và build index mới cho các vector fields
+
+    Returns:
+        Dictionary {field: thời gian build (giây)} kèm index_params đã dùng
+    """
+    collection = Collection(collection_name)
+    index_params = build_index_params(profile, metric_type, overrides)
+    print(f"🔧 Rebuild index '{collection_name}' → {index_params['index_type']} {index_params['params']}")
+
+    collection.release()
+    timings = {}
+
+    for field_name in fields:
+        index_name = f"{field_name}_index"
+        start = time.time()
+
+        for index in collection.indexes:
+            if index.field_name == field_name:
+                print(f"🗑️  Drop index cũ của {field_name}: {index.params}")
+                collection.drop_index(index_name=index.index_name)
+
+        collection.create_index(field_name=field_name, index_params=index_params, index_name=index_name)
+        utility.wait_for_index_building_complete(collection_name, index_name=index_name)
+
+        timings[field_name] = round(time.time() - start, 1)
+        print(f"✅ {field_name}: build xong trong {timings[field_name]}s")
+
+    collection.load()
+    print(f"✅ Đã load lại collection '{collection_name}'")
+    return {'index_params': index_params, 'build_seconds': timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild Milvus vector indexes theo index profile")
+    parser.add_argument("--host", default="10.10.4.25")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--profile", required=True, choices=sorted(INDEX_PROFILES))
+    parser.add_argument("--fields", nargs="+", default=list(VECTOR_FIELDS), choices=list(VECTOR_FIELDS))
+    parser.add_argument("--params", default="{}", help="JSON override tham số build, ví dụ '{\"M\": 32}'")
+    args = parser.parse_args()
+
+    connections.connect(alias="default", host=args.host, port=args.port)
+    try:
+        result = rebuild_indexes(args.collection, args.profile, args.fields, json.loads(args.params))
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    except Exception as e:
+        print(f"❌ Lỗi rebuild index: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Re-embedding / backfill vectors cho toàn bộ collection (không cần chạy lại Qwen2.5-VL)
+
+- Đọc rows bằng query_iterator theo thứ tự id_sanpham, tính lại image_vector / description_vector
+  từ cột image / description đã lưu (batch lớn: text gom theo độ dài, ảnh prefetch song song) rồi upsert
+- Ghi phiên bản model vào embedding_model; mode "all" bỏ qua row đã có đúng phiên bản
+- Mode "zeros": chỉ sửa vector toàn số 0 (ảnh / text lỗi lúc ingestion bị lưu thành zero vector)
+- Resume: id_sanpham cuối cùng đã upsert được lưu trong run journal, run bị dừng giữa chừng
+  chạy lại sẽ tiếp từ đó (--restart để quét lại từ đầu)
+
+Row mà model không tạo được vector (ảnh không tải được...) giữ nguyên vectors cũ, không upsert,
+và được liệt kê trong failed_ids của report để xử lý sau.
+
+Ví dụ:
+    python reembed_collection.py --collection product_collection_v5 --mode zeros --dry-run
+    python reembed_collection.py --collection product_collection_v5 --mode zeros
+    EMBEDDING_MODEL_VERSION=jina-clip-v2-r2 python reembed_collection.py --collection product_collection_v5
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pymilvus import Collection, connections
+
+from embedding_server import create_embedding_service
+from index_profiles import VECTOR_FIELDS
+from run_journal import RunJournal
+from scalar_fields import EMBEDDING_MODEL_FIELD, embedding_model_version, has_field, parse_date_ts
+from time_partitions import is_month_partition, month_partition_name
+from vector_dtypes import detect_vector_dtype, from_milvus_vector, to_milvus_vectors
+
+MODES = ("all", "zeros")
+
+# Vector field → cột nguồn dùng để tính lại
+SOURCE_FIELDS = {
+    "image_vector": "image",
+    "description_vector": "description",
+}
+
+
+def is_zero_vector(vector: np.ndarray) -> bool:
+    return not bool(np.any(vector))
+
+
+def build_expression(last_id: Optional[str] = None, skip_version: Optional[str] = None) -> str:
+    """Expression cho query_iterator: tiếp sau checkpoint, bỏ qua row đã có đúng phiên bản model"""
+    conditions = ['id_sanpham != ""']
+    if last_id:
+        conditions.append(f"id_sanpham > {json.dumps(last_id, ensure_ascii=False)}")
+    if skip_version is not None:
+        conditions.append(f"{EMBEDDING_MODEL_FIELD} != {json.dumps(skip_version, ensure_ascii=False)}")
+    return " and ".join(conditions)
+
+
+def plan_fields(row: Dict[str, Any], vectors: Dict[str, np.ndarray], mode: str) -> List[str]:
+    """Các vector field cần tính lại cho 1 row"""
+    if mode == "all":
+        return list(VECTOR_FIELDS)
+    return [field for field in VECTOR_FIELDS
+            if is_zero_vector(vectors[field]) and str(row.get(SOURCE_FIELDS[field]) or "").strip()]
+
+
+def recompute_vectors(embedding_service, rows: List[Dict[str, Any]], plans: List[List[str]],
+                      text_batch_size: int, image_batch_size: int) -> List[Dict[str, np.ndarray]]:
+    """Tính lại vectors theo plan của từng row (gom toàn bộ text / ảnh của batch vào 1 lần gọi model)"""
+    results: List[Dict[str, np.ndarray]] = [{} for _ in rows]
+    for field, source in SOURCE_FIELDS.items():
+        indexes = [i for i, fields in enumerate(plans) if field in fields]
+        if not indexes:
+            continue
+        values = [rows[i].get(source) or "" for i in indexes]
+        if field == "description_vector":
+            vectors = embedding_service.embed_texts_batch(values, normalize=True, batch_size=text_batch_size)
+        else:
+            vectors = embedding_service.embed_images_batch(values, normalize=True, batch_size=image_batch_size)
+        for i, vector in zip(indexes, vectors):
+            results[i][field] = np.asarray(vector, dtype=np.float32)
+    return results
+
+
+def upsert_rows(collection: Collection, rows: List[Dict[str, Any]], partition_by_month: bool):
+    """Upsert vào đúng partition tháng mà row đã được insert (tránh trùng primary key giữa partition)"""
+    if not partition_by_month:
+        collection.upsert(rows)
+        return
+
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(month_partition_name(parse_date_ts(row.get("date"))), []).append(row)
+    for partition_name, partition_rows in groups.items():
+        collection.upsert(partition_rows, partition_name=partition_name)
+
+
+def reembed(collection_name: str, mode: str = "all", batch_size: int = 512, text_batch_size: int = 64,
+            image_batch_size: int = 32, model_version: Optional[str] = None, dry_run: bool = False,
+            restart: bool = False, limit: Optional[int] = None, embedding_service=None) -> Dict[str, Any]:
+    """
+    Tính lại vectors và upsert theo batch, checkpoint sau mỗi batch
+
+    Returns:
+        Dictionary thống kê (số row đã quét / cập nhật, zero vectors phát hiện / đã sửa, failed_ids)
+    """
+    if mode not in MODES:
+        raise ValueError(f"Mode không hợp lệ: {mode} (chọn {', '.join(MODES)})")
+
+    collection = Collection(collection_name)
+    collection.load()
+
+    has_model_field = has_field(collection, EMBEDDING_MODEL_FIELD)
+    if not has_model_field:
+        print(f"⚠️  Collection chưa có field {EMBEDDING_MODEL_FIELD}, không ghi được phiên bản model "
+              f"(chạy migrate_scalar_fields.py để thêm); resume chỉ dựa vào checkpoint")
+    dtypes = {field: detect_vector_dtype(collection, field) for field in VECTOR_FIELDS}
+    partition_by_month = any(is_month_partition(partition.name) for partition in collection.partitions)
+
+    if embedding_service is None and not dry_run:
+        embedding_service = create_embedding_service()
+    if model_version is None:
+        model_version = embedding_model_version(
+            embedding_service.model_name if embedding_service else "jinaai/jina-clip-v2")
+
+    journal = RunJournal(collection_name)
+    checkpoint_name = f"reembed:{collection_name}:{mode}:{model_version}"
+    last_id = None
+    if not dry_run:
+        previous_status = journal.start_run(checkpoint_name, {'mode': mode, 'model_version': model_version,
+                                                              'batch_size': batch_size})
+        # Chỉ resume khi lần chạy trước bị dừng giữa chừng, run đã xong thì quét lại từ đầu
+        checkpoint = journal.get_watermark(checkpoint_name)
+        if checkpoint and previous_status not in (None, 'completed') and not restart:
+            last_id = checkpoint[1]
+            print(f"⏩ Tiếp tục sau id_sanpham {last_id} (checkpoint {checkpoint[0]})")
+
+    skip_version = model_version if mode == "all" and has_model_field else None
+    output_fields = [field.name for field in collection.schema.fields]
+    iterator = collection.query_iterator(batch_size=batch_size, expr=build_expression(last_id, skip_version),
+                                         output_fields=output_fields)
+
+    stats = {
+        'collection': collection_name,
+        'mode': mode,
+        'model_version': model_version,
+        'dry_run': dry_run,
+        'scanned': 0,
+        'zero_image_vectors': 0,
+        'zero_description_vectors': 0,
+        'planned': 0,
+        'upserted': 0,
+        'repaired_vectors': 0,
+        'failed_ids': [],
+    }
+    start = time.time()
+    try:
+        while limit is None or stats['scanned'] < limit:
+            rows = iterator.next()
+            if not rows:
+                break
+
+            plans, targets = [], []
+            for row in rows:
+                vectors = {field: from_milvus_vector(row[field], dtypes[field]) for field in VECTOR_FIELDS}
+                stats['zero_image_vectors'] += is_zero_vector(vectors["image_vector"])
+                stats['zero_description_vectors'] += is_zero_vector(vectors["description_vector"])
+                fields = plan_fields(row, vectors, mode)
+                if fields:
+                    plans.append(fields)
+                    targets.append((row, vectors))
+            stats['scanned'] += len(rows)
+            stats['planned'] += len(targets)
+
+            if targets and not dry_run:
+                recomputed = recompute_vectors(embedding_service, [row for row, _ in targets], plans,
+                                               text_batch_size, image_batch_size)
+                updated = []
+                for (row, old_vectors), fields, new_vectors in zip(targets, plans, recomputed):
+                    # Model không tạo được vector cho nguồn có dữ liệu → giữ nguyên row cũ
+                    failed = [field for field in fields if is_zero_vector(new_vectors[field])
+                              and str(row.get(SOURCE_FIELDS[field]) or "").strip()]
+                    if failed:
+                        stats['failed_ids'].append(row["id_sanpham"])
+                        continue
+                    for field in fields:
+                        stats['repaired_vectors'] += is_zero_vector(old_vectors[field])
+                    # Encode lại cả 2 vector field: query trả FLOAT16 / BFLOAT16 dạng [bytes] mà upsert không nhận
+                    for field in VECTOR_FIELDS:
+                        vector = new_vectors[field] if field in fields else old_vectors[field]
+                        row[field] = to_milvus_vectors([vector], dtypes[field])[0]
+                    if has_model_field:
+                        row[EMBEDDING_MODEL_FIELD] = model_version
+                    updated.append(row)
+
+                if updated:
+                    upsert_rows(collection, updated, partition_by_month)
+                    stats['upserted'] += len(updated)
+
+            if not dry_run:
+                journal.set_watermark(checkpoint_name, time.strftime('%Y-%m-%d %H:%M:%S'), rows[-1]["id_sanpham"])
+            elapsed = max(time.time() - start, 1e-6)
+            print(f"📦 Quét {stats['scanned']} rows, upsert {stats['upserted']}, "
+                  f"lỗi {len(stats['failed_ids'])} ({stats['scanned'] / elapsed:.0f} rows/s)...", end="\r")
+    except Exception:
+        if not dry_run:
+            journal.finish_run(checkpoint_name, stats, status='failed')
+        raise
+    finally:
+        iterator.close()
+    print()
+
+    if not dry_run:
+        collection.flush()
+        # Dừng vì --limit thì giữ checkpoint cho lần chạy sau tiếp tục
+        stopped_by_limit = limit is not None and stats['scanned'] >= limit
+        journal.finish_run(checkpoint_name, stats, status='partial' if stopped_by_limit else 'completed')
+    journal.close()
+
+    stats['seconds'] = round(time.time() - start, 1)
+    if stats['failed_ids']:
+        print(f"⚠️  {len(stats['failed_ids'])} rows không tạo được vector (giữ nguyên vectors cũ)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embedding / sửa zero vectors cho toàn bộ collection")
+    parser.add_argument("--host", default="10.10.4.25")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--mode", default="all", choices=list(MODES),
+                        help="all: tính lại mọi row chưa có phiên bản model này; zeros: chỉ sửa zero vectors")
+    parser.add_argument("--batch-size", type=int, default=512, help="Số rows mỗi lần đọc / upsert")
+    parser.add_argument("--text-batch-size", type=int, default=64)
+    parser.add_argument("--image-batch-size", type=int, default=32)
+    parser.add_argument("--model-version", default=None,
+                        help="Tag ghi vào embedding_model (mặc định EMBEDDING_MODEL_VERSION hoặc tên model)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm zero vectors / rows cần tính lại")
+    parser.add_argument("--restart", action="store_true", help="Bỏ qua checkpoint, quét lại từ đầu")
+    parser.add_argument("--limit", type=int, default=None, help="Dừng sau khoảng N rows (thử nghiệm)")
+    parser.add_argument("--output", default=None, help="File JSON lưu report")
+    args = parser.parse_args()
+
+    connections.connect(alias="default", host=args.host, port=args.port)
+    stats = reembed(args.collection, args.mode, args.batch_size, args.text_batch_size, args.image_batch_size,
+                    args.model_version, args.dry_run, args.restart, args.limit)
+
+    output = args.output or f"reembed_{args.collection}_{args.mode}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+    summary = {key: value for key, value in stats.items() if key != 'failed_ids'}
+    print(json.dumps({**summary, 'failed': len(stats['failed_ids'])}, indent=2, ensure_ascii=False))
+    print(f"💾 Đã lưu report: {output}")
+
+
+if __name__ == "__main__":
+    main()
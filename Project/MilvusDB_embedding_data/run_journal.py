@@ -0,0 +1,279 @@
+"""
+Run journal (SQLite) cho ingestion pipeline
+
+Ghi lại tiến độ từng record theo stage (labeled → embedded → postgres_saved / inserted),
+kèm label và vectors đã tính, để khi pipeline bị dừng giữa chừng thì lần chạy sau
+bỏ qua phần đã xong và tiếp tục từ stage còn dở (không phải gọi lại Qwen2.5-VL).
+Ngoài ra lưu high-water mark và danh sách record lỗi cần thử lại cho chế độ incremental sync.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+DEFAULT_JOURNAL_PATH = "run_journal.db"
+
+
+class RunJournal:
+    """Journal tiến độ ingestion, thread-safe (1 connection SQLite + lock)"""
+
+    def __init__(self, collection_name: str, path: Optional[str] = None):
+        """
+        Args:
+            collection_name: Tên Milvus collection, tiến độ record được tính theo collection
+            path: Đường dẫn file SQLite (mặc định RUN_JOURNAL_PATH hoặc ./run_journal.db)
+        """
+        self.collection_name = collection_name
+        self.path = path or os.getenv("RUN_JOURNAL_PATH", DEFAULT_JOURNAL_PATH)
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_key TEXT PRIMARY KEY,
+                    collection_name TEXT NOT NULL,
+                    params TEXT,
+                    status TEXT NOT NULL,
+                    stats TEXT,
+                    started_at REAL,
+                    updated_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS records (
+                    collection_name TEXT NOT NULL,
+                    id_sanpham TEXT NOT NULL,
+                    metadata TEXT,
+                    description TEXT,
+                    image_vector BLOB,
+                    description_vector BLOB,
+                    embedding_model TEXT,
+                    postgres_saved INTEGER DEFAULT 0,
+                    inserted INTEGER DEFAULT 0,
+                    updated_at REAL,
+                    PRIMARY KEY (collection_name, id_sanpham)
+                );
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    name TEXT PRIMARY KEY,
+                    published_at TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    updated_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS retries (
+                    name TEXT NOT NULL,
+                    id_sanpham TEXT NOT NULL,
+                    published_at TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    updated_at REAL,
+                    PRIMARY KEY (name, id_sanpham)
+                );
+            """)
+            # Journal tạo trước khi có cột embedding_model
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(records)")}
+            if 'embedding_model' not in columns:
+                self.conn.execute("ALTER TABLE records ADD COLUMN embedding_model TEXT")
+            self.conn.commit()
+
+    # === RUNS ===
+    @staticmethod
+    def make_run_key(collection_name: str, start_date: str, end_date: str, limit: int) -> str:
+        return f"{collection_name}:{start_date}:{end_date}:{limit}"
+
+    def start_run(self, run_key: str, params: Dict[str, Any]) -> Optional[str]:
+        """
+        Đánh dấu bắt đầu run
+
+        Returns:
+            Trạng thái của lần chạy trước với cùng run_key (None nếu chưa từng chạy)
+        """
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT status FROM runs WHERE run_key = ?", (run_key,)).fetchone()
+            self.conn.execute("""
+                INSERT INTO runs (run_key, collection_name, params, status, started_at, updated_at)
+                VALUES (?, ?, ?, 'running', ?, ?)
+                ON CONFLICT(run_key) DO UPDATE SET status = 'running', updated_at = excluded.updated_at
+            """, (run_key, self.collection_name, json.dumps(params), now, now))
+            self.conn.commit()
+        return row[0] if row else None
+
+    def finish_run(self, run_key: str, stats: Dict[str, Any], status: str = 'completed'):
+        """Đánh dấu kết thúc run và lưu thống kê"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE runs SET status = ?, stats = ?, updated_at = ? WHERE run_key = ?",
+                (status, json.dumps(stats, ensure_ascii=False, default=str), time.time(), run_key)
+            )
+            self.conn.commit()
+
+    # === WATERMARKS (incremental sync) ===
+    def get_watermark(self, name: str) -> Optional[tuple]:
+        """Lấy high-water mark (published_at, product_id) đã lưu, None nếu chưa có"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT published_at, product_id FROM watermarks WHERE name = ?", (name,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def set_watermark(self, name: str, published_at: str, product_id: str):
+        """Lưu high-water mark sau khi xử lý xong 1 page"""
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO watermarks (name, published_at, product_id, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    published_at = excluded.published_at,
+                    product_id = excluded.product_id,
+                    updated_at = excluded.updated_at
+            """, (name, published_at, product_id, time.time()))
+            self.conn.commit()
+
+    # === RETRIES (incremental sync) ===
+    def add_retries(self, name: str, items: Iterable[tuple]):
+        """Thêm / tăng số lần lỗi cho các record (id_sanpham, published_at) đã bị watermark vượt qua"""
+        now = time.time()
+        rows = [(name, id_sanpham, published_at, now) for id_sanpham, published_at in items]
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany("""
+                INSERT INTO retries (name, id_sanpham, published_at, attempts, updated_at) VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(name, id_sanpham) DO UPDATE SET
+                    attempts = attempts + 1,
+                    updated_at = excluded.updated_at
+            """, rows)
+            self.conn.commit()
+
+    def get_retries(self, name: str, max_attempts: int, min_age: float = 0, limit: int = 500) -> List[tuple]:
+        """
+        Các record cần thử lại: lỗi chưa quá max_attempts lần và lần lỗi cuối đã cách ít nhất min_age giây
+
+        Returns:
+            [(id_sanpham, published_at, attempts)] theo thứ tự published_at
+        """
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT id_sanpham, published_at, attempts FROM retries
+                WHERE name = ? AND attempts < ? AND updated_at <= ?
+                ORDER BY published_at, id_sanpham
+                LIMIT ?
+            """, (name, max_attempts, time.time() - min_age, limit)).fetchall()
+        return [tuple(row) for row in rows]
+
+    def remove_retries(self, name: str, ids: Iterable[str]):
+        """Xoá record đã xử lý thành công (hoặc không còn trong bảng nguồn) khỏi danh sách thử lại"""
+        rows = [(name, id_sanpham) for id_sanpham in ids]
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany("DELETE FROM retries WHERE name = ? AND id_sanpham = ?", rows)
+            self.conn.commit()
+
+    def count_retries(self, name: str, max_attempts: int) -> Dict[str, int]:
+        """Số record đang chờ thử lại và số record đã bỏ cuộc (lỗi >= max_attempts lần)"""
+        with self._lock:
+            pending, exhausted = self.conn.execute("""
+                SELECT COALESCE(SUM(attempts < ?), 0), COALESCE(SUM(attempts >= ?), 0)
+                FROM retries WHERE name = ?
+            """, (max_attempts, max_attempts, name)).fetchone()
+        return {'pending': int(pending), 'exhausted': int(exhausted)}
+
+    # === RECORDS ===
+    def mark_labeled(self, id_sanpham: str, metadata: Dict[str, Any], description: str):
+        """Lưu kết quả label (bước tốn kém nhất)"""
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO records (collection_name, id_sanpham, metadata, description, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(collection_name, id_sanpham) DO UPDATE SET
+                    metadata = excluded.metadata,
+                    description = excluded.description,
+                    updated_at = excluded.updated_at
+            """, (self.collection_name, id_sanpham, json.dumps(metadata, ensure_ascii=False),
+                  description, time.time()))
+            self.conn.commit()
+
+    def mark_embedded(self, id_sanpham: str, image_vector, description_vector,
+                      embedding_model: Optional[str] = None):
+        """Lưu vectors (float32 blobs) kèm phiên bản model đã tạo ra chúng"""
+        with self._lock:
+            self.conn.execute("""
+                UPDATE records SET image_vector = ?, description_vector = ?, embedding_model = ?, updated_at = ?
+                WHERE collection_name = ? AND id_sanpham = ?
+            """, (np.asarray(image_vector, dtype=np.float32).tobytes(),
+                  np.asarray(description_vector, dtype=np.float32).tobytes(),
+                  embedding_model, time.time(), self.collection_name, id_sanpham))
+            self.conn.commit()
+
+    def _mark_flag(self, column: str, ids: Iterable[str]):
+        rows = [(time.time(), self.collection_name, id_sanpham) for id_sanpham in ids]
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany(
+                f"UPDATE records SET {column} = 1, updated_at = ? WHERE collection_name = ? AND id_sanpham = ?",
+                rows
+            )
+            self.conn.commit()
+
+    def mark_postgres_saved(self, ids: Iterable[str]):
+        self._mark_flag('postgres_saved', ids)
+
+    def mark_inserted(self, ids: Iterable[str]):
+        self._mark_flag('inserted', ids)
+
+    def get_states(self, id_list: List[str], chunk_size: int = 500) -> Dict[str, Dict[str, Any]]:
+        """
+        Lấy tiến độ đã ghi của nhiều record
+
+        Returns:
+            {id_sanpham: {'metadata', 'description', 'image_vector', 'description_vector', 'embedding_model',
+                          'postgres_saved', 'inserted'}} cho các record đã có trong journal
+            (embedding_model = "" nếu vectors được lưu trước khi journal ghi phiên bản model)
+        """
+        states = {}
+        for i in range(0, len(id_list), chunk_size):
+            chunk = id_list[i:i + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self.conn.execute(f"""
+                    SELECT id_sanpham, metadata, description, image_vector, description_vector,
+                           embedding_model, postgres_saved, inserted
+                    FROM records
+                    WHERE collection_name = ? AND id_sanpham IN ({placeholders})
+                """, [self.collection_name, *chunk]).fetchall()
+
+            for (id_sanpham, metadata, description, image_blob, description_blob, embedding_model,
+                 pg_saved, inserted) in rows:
+                state = {'postgres_saved': bool(pg_saved), 'inserted': bool(inserted)}
+                if metadata is not None:
+                    state['metadata'] = json.loads(metadata)
+                    state['description'] = description
+                if image_blob is not None and description_blob is not None:
+                    state['image_vector'] = np.frombuffer(image_blob, dtype=np.float32).copy()
+                    state['description_vector'] = np.frombuffer(description_blob, dtype=np.float32).copy()
+                    state['embedding_model'] = embedding_model or ""
+                states[id_sanpham] = state
+        return states
+
+    def compact(self):
+        """Xoá vectors của record đã insert + lưu Postgres xong (không cần resume nữa)"""
+        with self._lock:
+            cursor = self.conn.execute("""
+                UPDATE records SET image_vector = NULL, description_vector = NULL
+                WHERE collection_name = ? AND inserted = 1 AND postgres_saved = 1
+                  AND image_vector IS NOT NULL
+            """, (self.collection_name,))
+            self.conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,220 @@
+"""
+Staged pipeline: chạy các bước ingestion song song, nối với nhau bằng bounded queues
+
+Mỗi stage có queue đầu vào giới hạn kích thước (backpressure) và số worker riêng,
+nên stage I/O-bound (download) và stage GPU-bound (embedding) chạy chồng lên nhau
+thay vì chờ nhau tuần tự trong cùng một thread.
+"""
+import queue
+import threading
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Tín hiệu kết thúc cho worker
+_STOP = object()
+
+
+class PipelineStage:
+    """Một stage trong pipeline: N worker threads cùng đọc từ 1 bounded queue"""
+
+    def __init__(self,
+                 name: str,
+                 handler: Callable[[Any], Any],
+                 workers: int = 1,
+                 queue_size: int = 64,
+                 batch_size: int = 1,
+                 max_wait: float = 0.5):
+        """
+        Khởi tạo stage
+
+        Args:
+            name: Tên stage (dùng cho log và thống kê)
+            handler: Hàm xử lý. Với batch_size == 1 nhận 1 item và trả về item mới
+                     (None để bỏ qua); với batch_size > 1 nhận list item và trả về list
+            workers: Số thread xử lý song song của stage
+            queue_size: Kích thước tối đa queue đầu vào
+            batch_size: Số item tối đa gom lại cho mỗi lần gọi handler
+            max_wait: Thời gian chờ tối đa (giây) để gom đủ batch
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.input_queue = queue.Queue(maxsize=max(1, queue_size))
+        self.downstream: List['PipelineStage'] = []
+
+        self._lock = Lock()
+        self._threads: List[threading.Thread] = []
+        self._alive_workers = 0
+        self._upstream_count = 0
+        self._closed_upstreams = 0
+
+        self.stats = {
+            'received': 0,
+            'emitted': 0,
+            'failed': 0,
+            'batches': 0,
+            'busy_seconds': 0.0
+        }
+
+    def connect(self, *stages: 'PipelineStage') -> 'PipelineStage':
+        """Nối output của stage này vào input của các stage phía sau (fan-out)"""
+        for stage in stages:
+            self.downstream.append(stage)
+            stage._upstream_count += 1
+        return self
+
+    def put(self, item: Any):
+        """Đưa item vào queue (block khi queue đầy)"""
+        self.input_queue.put(item)
+
+    def close(self):
+        """Báo 1 upstream đã kết thúc; khi tất cả upstream xong thì dừng workers"""
+        with self._lock:
+            self._closed_upstreams += 1
+            if self._closed_upstreams < max(self._upstream_count, 1):
+                return
+        for _ in range(self.workers):
+            self.input_queue.put(_STOP)
+
+    def start(self):
+        """Khởi động worker threads"""
+        self._alive_workers = self.workers
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self, timeout: Optional[float] = None):
+        """Chờ tất cả worker kết thúc"""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def queue_depth(self) -> int:
+        """Số item đang chờ trong queue"""
+        return self.input_queue.qsize()
+
+    def _next_batch(self) -> tuple:
+        """Lấy batch tiếp theo: flush khi đủ batch_size hoặc hết max_wait"""
+        item = self.input_queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        if self.batch_size > 1:
+            deadline = time.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.input_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    return batch, True
+                batch.append(item)
+
+        return batch, False
+
+    def _run(self):
+        """Vòng lặp worker"""
+        stopped = False
+        while not stopped:
+            batch, stopped = self._next_batch()
+            if batch:
+                self._handle(batch)
+
+        with self._lock:
+            self._alive_workers -= 1
+            last_worker = self._alive_workers == 0
+
+        # Worker cuối cùng báo cho các stage phía sau
+        if last_worker:
+            for stage in self.downstream:
+                stage.close()
+
+    def _handle(self, batch: List[Any]):
+        """Gọi handler và chuyển output xuống các stage phía sau"""
+        start = time.time()
+        outputs = []
+        failed = 0
+
+        try:
+            if self.batch_size > 1:
+                outputs = [out for out in (self.handler(batch) or []) if out is not None]
+            else:
+                out = self.handler(batch[0])
+                if out is not None:
+                    outputs = [out]
+        except Exception as e:
+            print(f"❌ Stage '{self.name}' lỗi: {e}")
+            failed = len(batch)
+
+        with self._lock:
+            self.stats['received'] += len(batch)
+            self.stats['emitted'] += len(outputs)
+            self.stats['failed'] += failed
+            self.stats['batches'] += 1
+            self.stats['busy_seconds'] += time.time() - start
+
+        for out in outputs:
+            for stage in self.downstream:
+                stage.put(out)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê của stage"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['workers'] = self.workers
+        stats['queue_depth'] = self.queue_depth()
+        stats['busy_seconds'] = round(stats['busy_seconds'], 2)
+        return stats
+
+
+class StagedPipeline:
+    """Chạy một chuỗi PipelineStage đã được nối với nhau"""
+
+    def __init__(self, stages: List[PipelineStage]):
+        """
+        Args:
+            stages: Danh sách stage, stage đầu tiên nhận item từ source
+        """
+        if not stages:
+            raise ValueError("StagedPipeline cần ít nhất 1 stage")
+        self.stages = stages
+
+    def run(self, source: Iterable[Any]) -> Dict[str, Any]:
+        """
+        Đẩy toàn bộ item từ source vào stage đầu và chờ pipeline chạy xong
+
+        Args:
+            source: Iterable/generator sinh item đầu vào
+
+        Returns:
+            Dictionary thống kê theo từng stage
+        """
+        for stage in self.stages:
+            stage.start()
+
+        head = self.stages[0]
+        fed = 0
+        try:
+            for item in source:
+                head.put(item)
+                fed += 1
+        finally:
+            head.close()
+            for stage in self.stages:
+                stage.join()
+
+        return {
+            'fed_count': fed,
+            'stages': {stage.name: stage.get_stats() for stage in self.stages}
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Thống kê hiện tại (dùng cho progress monitor)"""
+        return {stage.name: stage.get_stats() for stage in self.stages}
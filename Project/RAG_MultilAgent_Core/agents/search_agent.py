@@ -1,12 +1,13 @@
 """
 Search agent for Enhanced RnD Assistant
 """
+import asyncio
 from typing import Dict, Any, List
 
 from langchain_core.messages import AIMessage
 
 from agents.base_agent import BaseAgent
-from tools.search_tools import search_by_description_tool, search_products_with_filters_tool
+from tools.search_tools import batch_search_descriptions_tool
 
 
 class EnhancedSearchAgent(BaseAgent):
@@ -23,19 +24,19 @@ class EnhancedSearchAgent(BaseAgent):
         # Generate optimized search queries based on query type
         search_queries = self._generate_search_queries(original_query, query_type)
 
-        all_results = []
-        for search_query in search_queries:
-            # Use appropriate filters based on query type
-            filters = self._get_filters_for_query_type(query_type)
-
-            if filters:
-                results = search_products_with_filters_tool.invoke({
-                    "query": search_query,
-                    "filters": filters
-                })
-            else:
-                results = search_by_description_tool.invoke({"description": search_query})
+        # Use appropriate filters based on query type
+        filters = self._get_filters_for_query_type(query_type)
+
+        # Embed tất cả query 1 batch + 1 multi-vector search, chạy ngoài event loop
+        # để các phiên chat đồng thời không bị chặn
+        batch_results = await asyncio.to_thread(batch_search_descriptions_tool.invoke, {
+            "descriptions": search_queries,
+            "filters": filters or None,
+            "rerank": not filters
+        })
 
+        all_results = []
+        for results in batch_results:
             all_results.extend(results)
 
         # Remove duplicates and limit results
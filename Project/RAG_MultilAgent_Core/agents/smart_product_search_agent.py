@@ -2,6 +2,7 @@
 Enhanced Smart product search agent với flexible filter recognition
 Không có narrow mapping - sử dụng AI để nhận diện filters linh hoạt
 """
+import asyncio
 import re
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -16,6 +17,7 @@ from tools.search_tools import (
     search_multimodal_tool
 )
 from config.settings import Config
+from utils.http_fetcher import get_default_fetcher
 
 
 class SmartProductSearchAgent(BaseAgent):
@@ -491,10 +493,9 @@ class SmartProductSearchAgent(BaseAgent):
         elif search_type == "url_to_image":
             if state.get("image_url"):
                 try:
-                    import requests
                     import base64
 
-                    response = requests.get(state["image_url"])
+                    response = await self._fetch_image_url(state["image_url"])
                     if response.status_code == 200:
                         image_base64 = base64.b64encode(response.content).decode('utf-8')
                         results = search_by_image_tool.invoke({
@@ -526,10 +527,9 @@ class SmartProductSearchAgent(BaseAgent):
         elif search_type == "url_to_text":
             if state.get("image_url"):
                 try:
-                    import requests
                     import base64
 
-                    response = requests.get(state["image_url"])
+                    response = await self._fetch_image_url(state["image_url"])
                     if response.status_code == 200:
                         image_base64 = base64.b64encode(response.content).decode('utf-8')
                         description = await self._image_to_text_description(image_base64)
@@ -570,10 +570,9 @@ class SmartProductSearchAgent(BaseAgent):
         elif search_type == "multimodal_url_search":
             if state.get("image_url"):
                 try:
-                    import requests
                     import base64
 
-                    response = requests.get(state["image_url"])
+                    response = await self._fetch_image_url(state["image_url"])
                     if response.status_code == 200:
                         image_base64 = base64.b64encode(response.content).decode('utf-8')
                         search_text = state["query"]
@@ -612,6 +611,16 @@ class SmartProductSearchAgent(BaseAgent):
             AIMessage(content=f"Hoàn thành {search_type} search với {len(state.get('search_results', []))} kết quả{metadata_info}{filter_info}"))
         return state
 
+    @staticmethod
+    async def _fetch_image_url(image_url: str):
+        """
+        Tải ảnh qua HttpFetcher dùng chung (chạy trong thread)
+
+        Mỗi lượt chat chạy trong 1 asyncio.run() mới, nên session pool đồng bộ giữ được
+        keep-alive và giới hạn theo host giữa các lượt / các session Streamlit.
+        """
+        return await asyncio.to_thread(get_default_fetcher().get, image_url)
+
     async def _image_to_text_description(self, image_base64: str) -> str:
         """Convert image to text description using vision model"""
         try:
@@ -2,10 +2,25 @@
 Configuration settings for Enhanced RnD Assistant
 Updated for Jina v4 integration
 """
+import json
 import os
 from typing import Dict, Any
 
 
+def _load_json_env(name: str) -> Dict[str, Any]:
+    """Đọc env var dạng JSON object, giá trị lỗi thì cảnh báo và dùng {}"""
+    raw = os.getenv(name, "{}")
+    try:
+        value = json.loads(raw)
+    except ValueError as e:
+        print(f"⚠️ {name} không phải JSON hợp lệ ({e}), bỏ qua: {raw!r}")
+        return {}
+    if not isinstance(value, dict):
+        print(f"⚠️ {name} phải là JSON object, bỏ qua: {raw!r}")
+        return {}
+    return value
+
+
 class Config:
     """Main configuration class"""
 
@@ -22,9 +37,40 @@ class Config:
     # Jina v4 Configuration
     JINA_MODEL = os.getenv("JINA_MODEL", "jinaai/jina-clip-v2")
     JINA_DEVICE = os.getenv("JINA_DEVICE", None)  # None for auto-detect, "cuda" or "cpu"
+    # Backend inference: "torch", hoặc "onnx" / "openvino" (ONNX Runtime trên CPU, xem database/onnx_backend.py;
+    # model export vào JINA_ONNX_DIR, mặc định ~/.cache/jina_clip_v2_onnx)
+    JINA_BACKEND = os.getenv("JINA_BACKEND", "torch")
+    JINA_ONNX_QUANTIZE = os.getenv("JINA_ONNX_QUANTIZE", "false").lower() == "true"  # int8 dynamic quantization
+    # Embedding dùng chung 1 model: EMBEDDING_SERVER_URL trỏ tới database/embedding_server.py,
+    # hoặc EMBEDDING_BATCHING=true để gom request đồng thời trong process thành dynamic batch
+    EMBEDDING_SERVER_URL = os.getenv("EMBEDDING_SERVER_URL", "")
+    EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "false").lower() == "true"
+    EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+    EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
     # Search Configuration - Updated for Jina v4
     TOP_K = int(os.getenv("TOP_K", "12"))
 
+    # ANN index profile fallback khi vector field chưa có index: IVF_FLAT, HNSW, IVF_PQ, DISKANN, SCANN
+    # (lúc connect profile được đọc từ index thật của collection, xem database/index_profiles.py)
+    # SEARCH_PARAMS_OVERRIDE dạng JSON, ví dụ '{"ef": 128}'
+    INDEX_PROFILE = os.getenv("MILVUS_INDEX_PROFILE", "IVF_FLAT")
+    SEARCH_PARAMS_OVERRIDE = _load_json_env("SEARCH_PARAMS_OVERRIDE")
+
+    # Adaptive search params theo top_k / filter selectivity / latency budget
+    # Calibration table tạo bằng benchmark_index.py --calibration (ingestion project)
+    ADAPTIVE_SEARCH_PARAMS = os.getenv("ADAPTIVE_SEARCH_PARAMS", "true").lower() == "true"
+    SEARCH_CALIBRATION_PATH = os.getenv("SEARCH_CALIBRATION_PATH", "config/search_calibration.json")
+    SEARCH_TARGET_RECALL = float(os.getenv("SEARCH_TARGET_RECALL", "0.95"))
+    SEARCH_LATENCY_BUDGET_MS = float(os.getenv("SEARCH_LATENCY_BUDGET_MS", "0"))  # 0 = không giới hạn
+
+    # Partition theo tháng ('p_YYYYMM'): "all" load cả collection, "hot" chỉ load HOT_PARTITION_MONTHS
+    # tháng gần nhất và load tháng cũ khi filter ngày cần (giữ tối đa MAX_COLD_PARTITIONS tháng cũ)
+    # Load / release áp dụng phía server cho mọi client: chỉ dùng "hot" trên collection / replica riêng cho search
+    PARTITION_LOAD_MODE = os.getenv("PARTITION_LOAD_MODE", "all")
+    HOT_PARTITION_MONTHS = int(os.getenv("HOT_PARTITION_MONTHS", "3"))
+    MAX_COLD_PARTITIONS = int(os.getenv("MAX_COLD_PARTITIONS", "6"))
+    PARTITION_REFRESH_SECONDS = float(os.getenv("PARTITION_REFRESH_SECONDS", "300"))
+
     # Jina CLIP v2 produces 1024-dimensional embeddings
     # Update these values to match your actual Jina model dimensions
     VECTOR_DIM = int(os.getenv("VECTOR_DIM", "1024"))  # Updated for Jina v4
@@ -32,7 +78,17 @@ class Config:
 
     # Batch processing configuration
     TEXT_BATCH_SIZE = int(os.getenv("TEXT_BATCH_SIZE", "32"))
+    # Token budget mỗi batch text (texts sắp theo độ dài, số text x độ dài dài nhất <= budget)
+    TEXT_BATCH_MAX_TOKENS = int(os.getenv("TEXT_BATCH_MAX_TOKENS", "8192"))
     IMAGE_BATCH_SIZE = int(os.getenv("IMAGE_BATCH_SIZE", "16"))
+    # Số thread tải + decode + resize ảnh song song, batch kế tiếp được chuẩn bị trong lúc batch hiện tại chạy model
+    IMAGE_LOADER_WORKERS = int(os.getenv("IMAGE_LOADER_WORKERS", "8"))
+    # Số query vectors tối đa trong 1 request search (multi-vector search)
+    SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", "16"))
+
+    # Query embedding cache (LRU + TTL)
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))  # giây
 
     # Analysis Configuration
     HIGH_ENGAGEMENT_THRESHOLD = int(os.getenv("HIGH_ENGAGEMENT_THRESHOLD", "500"))
@@ -65,6 +121,10 @@ class Config:
     # Multimodal search weights
     DEFAULT_TEXT_WEIGHT = float(os.getenv("DEFAULT_TEXT_WEIGHT", "0.6"))
     DEFAULT_IMAGE_WEIGHT = float(os.getenv("DEFAULT_IMAGE_WEIGHT", "0.4"))
+    # "hybrid": fuse image_vector + description_vector trong 1 lượt, "sequential": image → text rerank
+    MULTIMODAL_SEARCH_MODE = os.getenv("MULTIMODAL_SEARCH_MODE", "hybrid")
+    HYBRID_RANKER = os.getenv("HYBRID_RANKER", "weighted")  # "weighted" hoặc "rrf"
+    RRF_K = int(os.getenv("RRF_K", "60"))
 
     @classmethod
     def get_milvus_config(cls) -> Dict[str, str]:
@@ -92,6 +152,7 @@ class Config:
             "device": cls.JINA_DEVICE,
             "vector_dim": cls.VECTOR_DIM,
             "text_batch_size": cls.TEXT_BATCH_SIZE,
+            "text_batch_max_tokens": cls.TEXT_BATCH_MAX_TOKENS,
             "image_batch_size": cls.IMAGE_BATCH_SIZE
         }
 
@@ -102,11 +163,21 @@ class Config:
             "top_k": cls.TOP_K,
             "vector_dim": cls.VECTOR_DIM,
             "image_vector_dim": cls.IMAGE_VECTOR_DIM,
+            "index_profile": cls.INDEX_PROFILE,
+            "search_params_override": cls.SEARCH_PARAMS_OVERRIDE,
+            "adaptive_search_params": cls.ADAPTIVE_SEARCH_PARAMS,
+            "search_target_recall": cls.SEARCH_TARGET_RECALL,
+            "search_latency_budget_ms": cls.SEARCH_LATENCY_BUDGET_MS,
+            "partition_load_mode": cls.PARTITION_LOAD_MODE,
+            "hot_partition_months": cls.HOT_PARTITION_MONTHS,
             "similarity_thresholds": cls.SIMILARITY_THRESHOLDS,
             "default_weights": {
                 "text": cls.DEFAULT_TEXT_WEIGHT,
                 "image": cls.DEFAULT_IMAGE_WEIGHT
-            }
+            },
+            "multimodal_mode": cls.MULTIMODAL_SEARCH_MODE,
+            "hybrid_ranker": cls.HYBRID_RANKER,
+            "rrf_k": cls.RRF_K
         }
 
     @classmethod
@@ -122,9 +193,20 @@ class Config:
         """Get performance-related configuration"""
         return {
             "text_batch_size": cls.TEXT_BATCH_SIZE,
+            "text_batch_max_tokens": cls.TEXT_BATCH_MAX_TOKENS,
             "image_batch_size": cls.IMAGE_BATCH_SIZE,
+            "image_loader_workers": cls.IMAGE_LOADER_WORKERS,
+            "search_batch_size": cls.SEARCH_BATCH_SIZE,
             "device": cls.JINA_DEVICE,
-            "enable_gpu": cls.JINA_DEVICE != "cpu"
+            "backend": cls.JINA_BACKEND,
+            "onnx_quantize": cls.JINA_ONNX_QUANTIZE,
+            "enable_gpu": cls.JINA_DEVICE != "cpu" and cls.JINA_BACKEND == "torch",
+            "query_cache_size": cls.QUERY_CACHE_SIZE,
+            "query_cache_ttl": cls.QUERY_CACHE_TTL,
+            "embedding_server_url": cls.EMBEDDING_SERVER_URL,
+            "embedding_batching": cls.EMBEDDING_BATCHING,
+            "embedding_max_batch": cls.EMBEDDING_MAX_BATCH,
+            "embedding_max_wait_ms": cls.EMBEDDING_MAX_WAIT_MS
         }
 
     @classmethod
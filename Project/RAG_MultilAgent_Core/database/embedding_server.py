@@ -0,0 +1,448 @@
+"""
+Embedding service dùng chung 1 model jina-clip-v2 với dynamic batching
+
+- EmbeddingBatcher: worker thread sở hữu model, gom các request đồng thời (text / image)
+  thành batch, chờ tối đa max_wait_ms sau request đầu tiên hoặc tới khi đủ max_batch_size
+- Server HTTP local (ThreadingHTTPServer) để nhiều process (Streamlit, pipelines) dùng chung model:
+    python -m database.embedding_server --host 127.0.0.1 --port 8765 --max-batch 32 --max-wait-ms 10
+- Client mỏng giữ nguyên interface của EmbeddingService:
+    RemoteEmbeddingService (qua HTTP) và BatchedEmbeddingService (batcher trong cùng process)
+- create_embedding_service(): chọn theo EMBEDDING_SERVER_URL / EMBEDDING_BATCHING
+
+Ảnh dạng URL / đường dẫn được gửi nguyên chuỗi nên đường dẫn local phải đọc được từ
+máy chạy server; bytes / PIL Image được gửi kèm (base64).
+"""
+import abc
+import argparse
+import base64
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_IMAGE_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 10.0
+
+
+@dataclass
+class _EmbedRequest:
+    kind: str  # "text" | "image"
+    items: List[Any]
+    normalize: bool
+    future: Future
+
+
+class EmbeddingBatcher:
+    """Worker thread sở hữu 1 model, gom request đồng thời thành batch động"""
+
+    def __init__(self, service, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_image_batch_size: int = DEFAULT_MAX_IMAGE_BATCH_SIZE):
+        """
+        Args:
+            service: JinaV4EmbeddingService đã load model
+            max_batch_size: Số items tối đa gom vào 1 batch
+            max_wait_ms: Thời gian chờ tối đa sau request đầu tiên trước khi chạy batch
+            max_image_batch_size: Kích thước batch khi chạy model cho images
+        """
+        self.service = service
+        self.embedding_dim = service.embedding_dim
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_image_batch_size = max_image_batch_size
+
+        self._queue: "queue.Queue[Optional[_EmbedRequest]]" = queue.Queue()
+        self._closing = False
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'items': 0, 'batches': 0}
+
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, items: List[Any], normalize: bool = True) -> Future:
+        """Đưa request vào queue, trả về Future chứa list vectors cùng thứ tự items"""
+        if kind not in ("text", "image"):
+            raise ValueError(f"Loại embedding không hợp lệ: {kind}")
+        future = Future()
+        if not items:
+            future.set_result([])
+            return future
+        self._queue.put(_EmbedRequest(kind, list(items), normalize, future))
+        return future
+
+    def embed(self, kind: str, items: List[Any], normalize: bool = True,
+              timeout: Optional[float] = None) -> List[np.ndarray]:
+        return self.submit(kind, items, normalize).result(timeout)
+
+    def _collect(self) -> Optional[List[_EmbedRequest]]:
+        """Lấy request đầu tiên rồi gom thêm tới khi đủ batch hoặc hết max_wait"""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch, size = [first], len(first.items)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._closing = True
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            groups: Dict[tuple, List[_EmbedRequest]] = {}
+            for request in batch:
+                groups.setdefault((request.kind, request.normalize), []).append(request)
+            for (kind, normalize), requests_ in groups.items():
+                self._execute(kind, normalize, requests_)
+
+            if self._closing:
+                return
+
+    def _execute(self, kind: str, normalize: bool, requests_: List[_EmbedRequest]):
+        items = [item for request in requests_ for item in request.items]
+        try:
+            if kind == "text":
+                vectors = self.service.embed_texts_batch(items, normalize=normalize, batch_size=self.max_batch_size)
+            else:
+                vectors = self.service.embed_images_batch(items, normalize=normalize,
+                                                          batch_size=self.max_image_batch_size)
+        except Exception as e:
+            for request in requests_:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in requests_:
+            request.future.set_result(vectors[offset:offset + len(request.items)])
+            offset += len(request.items)
+
+        with self._stats_lock:
+            self.stats['requests'] += len(requests_)
+            self.stats['items'] += len(items)
+            self.stats['batches'] += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['avg_batch_items'] = round(stats['items'] / stats['batches'], 2) if stats['batches'] else 0.0
+        stats['queue_size'] = self._queue.qsize()
+        return stats
+
+    def close(self, timeout: float = 30):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+# === SERIALIZATION ===
+def _encode_vectors(vectors: List[np.ndarray]) -> str:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return base64.b64encode(matrix.tobytes()).decode("ascii")
+
+
+def _decode_vectors(payload: str, dim: int) -> List[np.ndarray]:
+    matrix = np.frombuffer(base64.b64decode(payload), dtype=np.float32).reshape(-1, dim)
+    return [row.copy() for row in matrix]
+
+
+def _encode_image_item(item: Union[str, bytes, Image.Image, None]) -> Any:
+    """URL / đường dẫn giữ nguyên, bytes và PIL Image gửi dạng base64"""
+    if item is None or isinstance(item, str):
+        return item
+    if isinstance(item, Image.Image):
+        buffer = BytesIO()
+        item.convert("RGB").save(buffer, format="PNG")
+        item = buffer.getvalue()
+    return {"b64": base64.b64encode(bytes(item)).decode("ascii")}
+
+
+def _decode_image_item(item: Any) -> Union[str, bytes, None]:
+    if isinstance(item, dict):
+        return base64.b64decode(item["b64"])
+    return item
+
+
+# === HTTP SERVER ===
+class _EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive: client giữ connection trong pool thay vì mở TCP mới cho mỗi request
+    protocol_version = "HTTP/1.1"
+    batcher: EmbeddingBatcher = None
+    model_info: Dict[str, Any] = {}
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/info":
+            self._send_json(200, {**self.model_info, "batcher": self.batcher.get_stats()})
+        else:
+            self._send_json(404, {"error": f"Không có endpoint {self.path}"})
+
+    def do_POST(self):
+        # Luôn đọc hết body để connection keep-alive dùng lại được cho request sau
+        raw_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/embed":
+            self._send_json(404, {"error": f"Không có endpoint {self.path}"})
+            return
+        try:
+            body = json.loads(raw_body)
+            kind = body["kind"]
+            items = body.get("items", [])
+            if kind == "image":
+                items = [_decode_image_item(item) for item in items]
+            vectors = self.batcher.embed(kind, items, bool(body.get("normalize", True)))
+            self._send_json(200, {"dim": self.batcher.embedding_dim, "count": len(vectors),
+                                  "vectors": _encode_vectors(vectors)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, device: Optional[str] = None,
+          max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+          backend: Optional[str] = None):
+    """Load model 1 lần và phục vụ embedding qua HTTP cho mọi process trên máy"""
+    from database.embedding_service import JinaV4EmbeddingService
+
+    service = JinaV4EmbeddingService(device=device, backend=backend)
+    batcher = EmbeddingBatcher(service, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    _EmbeddingRequestHandler.batcher = batcher
+    _EmbeddingRequestHandler.model_info = service.get_model_info()
+    server = ThreadingHTTPServer((host, port), _EmbeddingRequestHandler)
+    server.daemon_threads = True
+    print(f"🚀 Embedding server tại http://{host}:{port} (max_batch={max_batch_size}, max_wait={max_wait_ms}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("⏹️ Dừng embedding server")
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+# === CLIENTS ===
+class _EmbeddingClient(abc.ABC):
+    """Interface giống EmbeddingService, embedding thực hiện qua _embed()"""
+
+    model_name = "jinaai/jina-clip-v2"
+    embedding_dim: int
+    device: str
+
+    @abc.abstractmethod
+    def _embed(self, kind: str, items: List[Any], normalize: bool) -> List[np.ndarray]:
+        """
+        Embed 1 list text / image, trả về vectors cùng thứ tự
+
+        Lỗi kết nối / lỗi server được raise (không đổi thành zero vectors) để pipeline
+        đánh dấu record lỗi và thử lại; zero vector chỉ dành cho item rỗng hoặc ảnh không load được.
+        """
+
+    def _zeros(self) -> np.ndarray:
+        return np.zeros(self.embedding_dim, dtype=np.float32)
+
+    def embed_text(self, text: str, normalize_output: bool = True) -> np.ndarray:
+        if not text or not text.strip():
+            return self._zeros()
+        return self._embed("text", [text], normalize_output)[0]
+
+    def embed_image(self, image_url: str, normalize_output: bool = True) -> np.ndarray:
+        # Giống EmbeddingService: raise khi không load được image (batch trả zero vector)
+        vector = self._embed("image", [image_url], normalize_output)[0]
+        if not vector.any():
+            raise ValueError(f"Không thể load image từ {image_url}")
+        return vector
+
+    def embed_multimodal(self, text: str, image_url: str = None, normalize: bool = True) -> tuple:
+        text_vector = self.embed_text(text, normalize_output=normalize)
+        if image_url and image_url.strip():
+            image_vector = self.embed_image(image_url, normalize_output=normalize)
+        else:
+            image_vector = self._zeros()
+        return image_vector, text_vector
+
+    def embed_texts_batch(self, texts: List[str], normalize: bool = True, batch_size: int = 32) -> List[np.ndarray]:
+        return self._embed("text", texts, normalize)
+
+    def embed_images_batch(self, image_urls: List[Union[str, bytes, Image.Image]], normalize: bool = True,
+                           batch_size: int = 16) -> List[np.ndarray]:
+        return self._embed("image", image_urls, normalize)
+
+    def get_model_info(self) -> dict:
+        return {
+            'model_name': self.model_name,
+            'embedding_dimension': self.embedding_dim,
+            'device': self.device,
+            'torch_dtype': 'remote',
+        }
+
+    def similarity_search(self, query_vector: np.ndarray, candidate_vectors: List[np.ndarray],
+                          top_k: int = 10) -> List[tuple]:
+        if not candidate_vectors:
+            return []
+        matrix = np.asarray(candidate_vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+        scores = matrix @ np.asarray(query_vector, dtype=np.float32) / np.maximum(norms, 1e-12)
+        order = np.argsort(-scores)[:top_k]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def _generate_vectors(self, text: str, image_url: str = None) -> tuple:
+        image_vector, text_vector = self.embed_multimodal(text=text, image_url=image_url, normalize=True)
+        print(f"✅ Tạo embedding thành công - Text: {len(text_vector)}D, Image: {len(image_vector)}D")
+        return image_vector, text_vector
+
+    def _generate_vectors_batch(self, descriptions: List[str],
+                                image_urls: List[Union[str, bytes]] = None) -> tuple:
+        text_vectors = self.embed_texts_batch(descriptions, normalize=True)
+        if image_urls:
+            image_vectors = self.embed_images_batch(image_urls, normalize=True)
+        else:
+            image_vectors = [self._zeros() for _ in descriptions]
+        print(f"✅ Tạo batch embedding thành công - {len(descriptions)} records")
+        return image_vectors, text_vectors
+
+
+class RemoteEmbeddingService(_EmbeddingClient):
+    """Client HTTP tới embedding_server.py (model nằm ở process server)"""
+
+    def __init__(self, server_url: str, timeout: float = 120, pool_size: int = 16):
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        info = self.session.get(f"{self.server_url}/info", timeout=timeout).json()
+        self.model_name = info.get("model_name", self.model_name)
+        self.embedding_dim = int(info["embedding_dimension"])
+        self.device = f"remote:{info.get('device', 'unknown')}"
+        print(f"🔌 Dùng embedding server {self.server_url} ({self.model_name}, {self.embedding_dim}D)")
+
+    def _embed(self, kind: str, items: List[Any], normalize: bool) -> List[np.ndarray]:
+        if not items:
+            return []
+        if kind == "image":
+            items = [_encode_image_item(item) for item in items]
+        response = self.session.post(
+            f"{self.server_url}/embed",
+            json={"kind": kind, "items": items, "normalize": normalize},
+            timeout=self.timeout
+        )
+        body = response.json()
+        if response.status_code != 200:
+            raise RuntimeError(body.get("error", f"HTTP {response.status_code}"))
+        return _decode_vectors(body["vectors"], body["dim"])
+
+    def get_server_stats(self) -> Dict[str, Any]:
+        return self.session.get(f"{self.server_url}/info", timeout=self.timeout).json().get("batcher", {})
+
+
+class BatchedEmbeddingService(_EmbeddingClient):
+    """Client dùng EmbeddingBatcher trong cùng process (nhiều pipeline / thread chung 1 model)"""
+
+    def __init__(self, batcher: EmbeddingBatcher):
+        self.batcher = batcher
+        self.embedding_dim = batcher.embedding_dim
+        self.model_name = batcher.service.model_name
+        self.device = batcher.service.device
+
+    def _embed(self, kind: str, items: List[Any], normalize: bool) -> List[np.ndarray]:
+        return self.batcher.embed(kind, items, normalize)
+
+    def get_model_info(self) -> dict:
+        return self.batcher.service.get_model_info()
+
+
+_shared_batcher: Optional[EmbeddingBatcher] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_batcher(device: Optional[str] = None, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                       max_wait_ms: float = DEFAULT_MAX_WAIT_MS, backend: Optional[str] = None) -> EmbeddingBatcher:
+    """Batcher dùng chung trong process (load model lần đầu gọi)"""
+    global _shared_batcher
+    with _shared_lock:
+        if _shared_batcher is None:
+            from database.embedding_service import JinaV4EmbeddingService
+
+            _shared_batcher = EmbeddingBatcher(JinaV4EmbeddingService(device=device, backend=backend),
+                                               max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        return _shared_batcher
+
+
+def create_embedding_service(server_url: Optional[str] = None, batching: Optional[bool] = None,
+                             device: Optional[str] = None,
+                             max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None,
+                             backend: Optional[str] = None):
+    """
+    Chọn embedding service:
+    - EMBEDDING_SERVER_URL → RemoteEmbeddingService
+    - EMBEDDING_BATCHING=true → BatchedEmbeddingService (model dùng chung trong process)
+    - mặc định → EmbeddingService load model riêng như trước
+    """
+    server_url = server_url if server_url is not None else os.getenv("EMBEDDING_SERVER_URL", "")
+    if batching is None:
+        batching = os.getenv("EMBEDDING_BATCHING", "false").lower() == "true"
+    max_batch_size = max_batch_size or int(os.getenv("EMBEDDING_MAX_BATCH", DEFAULT_MAX_BATCH_SIZE))
+    max_wait_ms = max_wait_ms if max_wait_ms is not None else float(
+        os.getenv("EMBEDDING_MAX_WAIT_MS", DEFAULT_MAX_WAIT_MS))
+
+    if server_url:
+        return RemoteEmbeddingService(server_url)
+    if batching:
+        return BatchedEmbeddingService(get_shared_batcher(device, max_batch_size, max_wait_ms, backend))
+
+    from database.embedding_service import EmbeddingService
+    return EmbeddingService(device, backend=backend)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding server dùng chung jina-clip-v2 với dynamic batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--device", default=None, help="cuda / cpu (mặc định auto-detect)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--backend", default=None, choices=["torch", "onnx", "openvino"],
+                        help="Backend inference (mặc định env JINA_BACKEND)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.device, args.max_batch, args.max_wait_ms, args.backend)
+
+
+if __name__ == "__main__":
+    main()
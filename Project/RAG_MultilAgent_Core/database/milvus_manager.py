@@ -3,22 +3,61 @@ Enhanced Milvus database manager với filter linh hoạt
 Updated để hỗ trợ flexible filtering cho date, name_store, platform
 """
 from typing import List, Dict, Any, Union, Optional
+from contextlib import contextmanager
 import json
 from datetime import datetime
 
 from pymilvus import connections, Collection, utility
+try:
+    from pymilvus import AnnSearchRequest, RRFRanker, WeightedRanker
+    HYBRID_SEARCH_AVAILABLE = True
+except ImportError:  # pymilvus < 2.4
+    HYBRID_SEARCH_AVAILABLE = False
 from PIL import Image
 import numpy as np
 
 from config.settings import Config
-from database.embedding_service import EmbeddingService
+from database.embedding_server import create_embedding_service
+from database.query_cache import QueryEmbeddingCache
+from database.index_profiles import VECTOR_FIELDS, build_search_params, detect_index_profile
+from database.search_tuning import SearchParamTuner
+from database.scalar_fields import DATE_TS_FIELD, has_field, parse_date_ts
+from database.partition_manager import PartitionLoadManager
+from database.vector_dtypes import DEFAULT_VECTOR_DTYPE, detect_vector_dtype, from_milvus_vector, to_milvus_vectors
+
+SECONDS_PER_DAY = 86400
 
 class SingleCollectionMilvusManager:
     """Manages single collection Milvus operations with flexible filtering"""
 
+    OUTPUT_FIELDS = [
+        "id_sanpham", "description", "metadata", "date", "image",
+        "like", "comment", "share", "platform", "name_store"
+    ]
+
     def __init__(self):
         self.collection = None
-        self.embedding_service = EmbeddingService()
+        # Collection có date_ts (INT64 + STL_SORT) thì filter ngày theo số thay vì so chuỗi
+        self.has_date_ts = False
+        # Kiểu lưu vector của collection (FLOAT / FLOAT16 / BFLOAT16), query vector được convert theo
+        self.vector_dtype = DEFAULT_VECTOR_DTYPE
+        self.partition_manager = None
+        # Index profile / search params / tuner theo từng vector field, đọc từ index của collection lúc connect
+        self.index_profiles: Dict[str, str] = {}
+        self.search_params: Dict[str, Dict[str, Any]] = {}
+        self.search_tuners: Dict[str, SearchParamTuner] = {}
+        self.embedding_service = create_embedding_service(
+            server_url=Config.EMBEDDING_SERVER_URL,
+            batching=Config.EMBEDDING_BATCHING,
+            device=Config.JINA_DEVICE,
+            backend=Config.JINA_BACKEND,
+            max_batch_size=Config.EMBEDDING_MAX_BATCH,
+            max_wait_ms=Config.EMBEDDING_MAX_WAIT_MS
+        )
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=Config.QUERY_CACHE_SIZE,
+            ttl_seconds=Config.QUERY_CACHE_TTL
+        )
         print(f"🔧 Initialized MilvusManager with Jina v4")
         print(f"📊 Embedding dimensions: {self.embedding_service.embedding_dim}")
 
@@ -32,11 +71,47 @@ class SingleCollectionMilvusManager:
 
         if utility.has_collection(Config.COLLECTION_NAME):
             self.collection = Collection(Config.COLLECTION_NAME)
-            self.collection.load()
-            print(f"✅ Collection {Config.COLLECTION_NAME} loaded successfully!")
+            # Partition theo tháng: load cả collection hoặc chỉ hot partitions (PARTITION_LOAD_MODE)
+            self.partition_manager = PartitionLoadManager(
+                self.collection,
+                mode=Config.PARTITION_LOAD_MODE,
+                hot_months=Config.HOT_PARTITION_MONTHS,
+                max_cold_partitions=Config.MAX_COLD_PARTITIONS,
+                refresh_seconds=Config.PARTITION_REFRESH_SECONDS
+            )
+            self.partition_manager.load_initial()
+            self.has_date_ts = has_field(self.collection, DATE_TS_FIELD)
+            self.vector_dtype = detect_vector_dtype(self.collection)
+            self._init_search_params()
+            print(f"✅ Collection {Config.COLLECTION_NAME} loaded successfully! (vectors: {self.vector_dtype})")
+            if not self.has_date_ts:
+                print(f"⚠️ Collection chưa có {DATE_TS_FIELD}, filter ngày dùng so sánh chuỗi")
         else:
             raise Exception(f"Collection {Config.COLLECTION_NAME} not found!")
 
+    def _init_search_params(self):
+        """
+        Search params theo index thật trên từng vector field (Config.INDEX_PROFILE chỉ là fallback
+        khi field chưa có index), adaptive theo top_k / filter / latency budget nếu bật tuner
+        """
+        tuners: Dict[str, SearchParamTuner] = {}
+        for field in VECTOR_FIELDS:
+            profile = detect_index_profile(self.collection, field, default=Config.INDEX_PROFILE)
+            self.index_profiles[field] = profile
+            self.search_params[field] = build_search_params(profile, overrides=Config.SEARCH_PARAMS_OVERRIDE)
+            # Tuner tắt khi có SEARCH_PARAMS_OVERRIDE
+            if Config.ADAPTIVE_SEARCH_PARAMS and not Config.SEARCH_PARAMS_OVERRIDE:
+                if profile not in tuners:
+                    tuners[profile] = SearchParamTuner(
+                        profile=profile,
+                        calibration_path=Config.SEARCH_CALIBRATION_PATH,
+                        target_recall=Config.SEARCH_TARGET_RECALL,
+                        latency_budget_ms=Config.SEARCH_LATENCY_BUDGET_MS or None,
+                        selectivity_fn=self._estimate_selectivity
+                    )
+                self.search_tuners[field] = tuners[profile]
+        print(f"🔎 Index profiles: {', '.join(f'{field}={profile}' for field, profile in self.index_profiles.items())}")
+
     def _build_filter_expression(self, filters: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """
         Build filter expression từ dictionary filters
@@ -57,53 +132,22 @@ class SingleCollectionMilvusManager:
 
         conditions = []
 
-        # Name Store Filter
-        if 'name_store' in filters and filters['name_store']:
-            name_stores = filters['name_store']
-            if isinstance(name_stores, str):
-                name_stores = [name_stores]
-
-            # Tạo conditions cho từng store
-            store_conditions = []
-            for store in name_stores:
-                store_conditions.append(f'name_store == "{store}"')
-
-            if store_conditions:
-                if len(store_conditions) == 1:
-                    conditions.append(store_conditions[0])
-                else:
-                    conditions.append(f"({' or '.join(store_conditions)})")
-
-        # Platform Filter
-        if 'platform' in filters and filters['platform']:
-            platforms = filters['platform']
-            if isinstance(platforms, str):
-                platforms = [platforms]
-
-            platform_conditions = []
-            for platform in platforms:
-                platform_conditions.append(f'platform == "{platform}"')
-
-            if platform_conditions:
-                if len(platform_conditions) == 1:
-                    conditions.append(platform_conditions[0])
-                else:
-                    conditions.append(f"({' or '.join(platform_conditions)})")
+        # Name Store / Platform: 'in [...]' dùng được INVERTED index và partition key pruning
+        for field in ('name_store', 'platform'):
+            condition = self._in_expression(field, filters.get(field))
+            if condition:
+                conditions.append(condition)
 
         # Date Filters
         if 'date_range' in filters and filters['date_range']:
             start_date, end_date = filters['date_range']
-            start_formatted = self._format_date_for_milvus(start_date)
-            end_formatted = self._format_date_for_milvus(end_date)
-            conditions.append(f'date >= "{start_formatted}" and date <= "{end_formatted}"')
+            conditions.append(self._date_expression(start_date, end_date))
 
         elif 'date_after' in filters and filters['date_after']:
-            start_formatted = self._format_date_for_milvus(filters['date_after'])
-            conditions.append(f'date >= "{start_formatted}"')
+            conditions.append(self._date_expression(filters['date_after'], None))
 
         elif 'date_before' in filters and filters['date_before']:
-            end_formatted = self._format_date_for_milvus(filters['date_before'])
-            conditions.append(f'date <= "{end_formatted}"')
+            conditions.append(self._date_expression(None, filters['date_before']))
 
         # Combine all conditions
         if conditions:
@@ -111,6 +155,95 @@ class SingleCollectionMilvusManager:
 
         return None
 
+    @staticmethod
+    def _in_expression(field: str, values: Union[str, List[str], None]) -> Optional[str]:
+        """field == "x" cho 1 giá trị, field in ["x", "y"] cho nhiều giá trị (escape bằng JSON)"""
+        if not values:
+            return None
+        if isinstance(values, str):
+            values = [values]
+        values = list(dict.fromkeys(str(value) for value in values if value))
+        if not values:
+            return None
+        if len(values) == 1:
+            return f'{field} == {json.dumps(values[0], ensure_ascii=False)}'
+        return f'{field} in {json.dumps(values, ensure_ascii=False)}'
+
+    def _date_expression(self, start_date: Optional[str], end_date: Optional[str]) -> str:
+        """
+        Filter khoảng ngày (bao gồm cả ngày cuối)
+
+        Dùng date_ts khi collection có field này, ngược lại so sánh chuỗi trên `date`
+        """
+        start_ts = parse_date_ts(start_date) if start_date else None
+        end_ts = parse_date_ts(end_date) if end_date else None
+        if self.has_date_ts and start_ts != 0 and end_ts != 0:
+            conditions = []
+            if start_ts is not None:
+                conditions.append(f'{DATE_TS_FIELD} >= {start_ts}')
+            if end_ts is not None:
+                conditions.append(f'{DATE_TS_FIELD} < {end_ts + SECONDS_PER_DAY}')
+            return ' and '.join(conditions)
+
+        conditions = []
+        if start_date:
+            conditions.append(f'date >= "{self._format_date_for_milvus(start_date)}"')
+        if end_date:
+            conditions.append(f'date <= "{self._format_date_for_milvus(end_date)}"')
+        return ' and '.join(conditions)
+
+    @staticmethod
+    def _filter_time_range(filters: Optional[Dict[str, Any]]) -> tuple:
+        """(start_ts, end_ts) của filter ngày, end_ts không bao gồm; None nếu không giới hạn"""
+        if not filters:
+            return None, None
+        # Cùng thứ tự ưu tiên với _build_filter_expression
+        if filters.get('date_range'):
+            start_date, end_date = filters['date_range']
+        elif filters.get('date_after'):
+            start_date, end_date = filters['date_after'], None
+        else:
+            start_date, end_date = None, filters.get('date_before')
+        start_ts = parse_date_ts(start_date) if start_date else 0
+        end_ts = parse_date_ts(end_date) if end_date else 0
+        return (start_ts or None), (end_ts + SECONDS_PER_DAY if end_ts else None)
+
+    def _route_partitions(self, filters: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+        """Partition cần search theo filter ngày (None = không giới hạn, [] = không có dữ liệu)"""
+        if self.partition_manager is None:
+            return None
+        return self.partition_manager.route(*self._filter_time_range(filters))
+
+    @contextmanager
+    def _routed_partitions(self, filters: Optional[Dict[str, Any]]):
+        """Route partitions và giữ chúng (không bị release ở hot mode) cho tới khi search xong"""
+        partitions = self._route_partitions(filters)
+        try:
+            yield partitions
+        finally:
+            if self.partition_manager is not None:
+                self.partition_manager.release(partitions)
+
+    def _estimate_selectivity(self, filter_expr: str) -> Optional[float]:
+        """Tỉ lệ entities khớp filter (count(*) / num_entities)"""
+        total = self.collection.num_entities
+        if not total:
+            return None
+        rows = self.collection.query(expr=filter_expr, output_fields=["count(*)"])
+        return rows[0]["count(*)"] / total if rows else None
+
+    def _search_data(self, vectors: List[Any]) -> List[Any]:
+        """Convert query vectors (float32) theo kiểu vector của collection"""
+        return to_milvus_vectors(vectors, self.vector_dtype)
+
+    def _search_params(self, top_k: int, filter_expr: Optional[str] = None,
+                       field: str = "description_vector") -> Dict[str, Any]:
+        """Search params cho 1 request: adaptive nếu bật tuner, ngược lại dùng params cố định"""
+        tuner = self.search_tuners.get(field)
+        if tuner is None:
+            return self.search_params[field]
+        return tuner.get_search_params(top_k, filter_expr, field)
+
     def _format_date_for_milvus(self, date_str: str) -> str:
         """
         Convert date từ DD/MM/YYYY sang format phù hợp với Milvus
@@ -140,11 +273,6 @@ class SingleCollectionMilvusManager:
         """
         Universal search function với flexible filtering
         """
-        search_params = {
-            "metric_type": "COSINE",
-            "params": {"nprobe": 12}
-        }
-
         output_fields = [
             "id_sanpham", "description", "metadata", "date", "image",
             "like", "comment", "share", "platform", "name_store"
@@ -152,15 +280,20 @@ class SingleCollectionMilvusManager:
 
         # Build filter expression
         filter_expr = self._build_filter_expression(filters)
+        search_params = self._search_params(top_k, filter_expr, "description_vector")
 
-        results = self.collection.search(
-            data=[query_vector],
-            anns_field="description_vector",
-            param=search_params,
-            limit=top_k,
-            output_fields=output_fields,
-            expr=filter_expr
-        )
+        with self._routed_partitions(filters) as partitions:
+            if partitions == []:
+                return []
+            results = self.collection.search(
+                data=self._search_data([query_vector]),
+                anns_field="description_vector",
+                param=search_params,
+                limit=top_k,
+                output_fields=output_fields,
+                expr=filter_expr,
+                partition_names=partitions
+            )
 
         return self._format_search_results(results)
 
@@ -174,26 +307,26 @@ class SingleCollectionMilvusManager:
                                filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
         """Search by image vector với filtering"""
         try:
-            search_params = {
-                "metric_type": "COSINE",
-                "params": {"nprobe": 12}
-            }
-
             output_fields = [
                 "id_sanpham", "description", "metadata", "date", "image",
                 "like", "comment", "share", "platform", "name_store"
             ]
 
             filter_expr = self._build_filter_expression(filters)
-
-            results = self.collection.search(
-                data=[image_vector],
-                anns_field="image_vector",
-                param=search_params,
-                limit=top_k,
-                output_fields=output_fields,
-                expr=filter_expr
-            )
+            search_params = self._search_params(top_k, filter_expr, "image_vector")
+
+            with self._routed_partitions(filters) as partitions:
+                if partitions == []:
+                    return []
+                results = self.collection.search(
+                    data=self._search_data([image_vector]),
+                    anns_field="image_vector",
+                    param=search_params,
+                    limit=top_k,
+                    output_fields=output_fields,
+                    expr=filter_expr,
+                    partition_names=partitions
+                )
 
             return self._format_search_results(results)
 
@@ -213,21 +346,28 @@ class SingleCollectionMilvusManager:
 
     def search_multimodal(self, text: str = "", image_url: str = "",
                           top_k: int = Config.TOP_K,
-                          filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
-        """Sequential multimodal search với filtering"""
+                          filters: Optional[Dict[str, Any]] = None,
+                          text_weight: Optional[float] = None,
+                          image_weight: Optional[float] = None) -> List[Dict]:
+        """Multimodal search với filtering: hybrid (mặc định) hoặc sequential image → text rerank"""
         try:
+            if image_url and text and Config.MULTIMODAL_SEARCH_MODE == "hybrid":
+                return self.search_hybrid(text=text, image_url=image_url, top_k=top_k, filters=filters,
+                                          text_weight=text_weight, image_weight=image_weight)
+
             if image_url:
                 image_candidates = self.search_by_image_url(image_url, top_k * 2, filters)
 
                 if text and image_candidates:
-                    text_vector = self.embedding_service.embed_text(text, normalize_output=True)
+                    text_vector = np.asarray(self.get_query_vector(text), dtype=np.float32)
+                    desc_matrix = self._candidate_description_matrix(image_candidates)
+
+                    # Cosine similarity cho toàn bộ candidates trong 1 phép nhân ma trận
+                    norms = np.linalg.norm(desc_matrix, axis=1) * np.linalg.norm(text_vector)
+                    text_sims = desc_matrix @ text_vector / np.maximum(norms, 1e-12)
 
-                    for candidate in image_candidates:
-                        desc_vector = self.get_query_vector(candidate['description'])
-                        text_sim = np.dot(text_vector, desc_vector) / (
-                                np.linalg.norm(text_vector) * np.linalg.norm(desc_vector)
-                        )
-                        candidate['text_similarity'] = text_sim
+                    for candidate, text_sim in zip(image_candidates, text_sims):
+                        candidate['text_similarity'] = float(text_sim)
 
                     image_candidates.sort(key=lambda x: x['text_similarity'], reverse=True)
                     return image_candidates[:top_k]
@@ -243,23 +383,193 @@ class SingleCollectionMilvusManager:
             print(f"Error in multimodal search: {e}")
             return []
 
+    def search_hybrid(self, text: str = "", image_url: str = "",
+                      image_vector: Optional[List[float]] = None,
+                      top_k: int = Config.TOP_K,
+                      filters: Optional[Dict[str, Any]] = None,
+                      text_weight: Optional[float] = None,
+                      image_weight: Optional[float] = None,
+                      ranker: Optional[str] = None) -> List[Dict]:
+        """
+        Hybrid search trên image_vector + description_vector, fuse kết quả trong 1 lượt
+
+        Args:
+            text: Text query (embed vào description_vector space)
+            image_url: URL/đường dẫn ảnh query
+            image_vector: Image vector có sẵn (bỏ qua image_url)
+            top_k: Số kết quả trả về
+            filters: Dict filters cho date, name_store, platform
+            text_weight: Trọng số text (mặc định Config.DEFAULT_TEXT_WEIGHT)
+            image_weight: Trọng số image (mặc định Config.DEFAULT_IMAGE_WEIGHT)
+            ranker: "weighted" hoặc "rrf" (mặc định Config.HYBRID_RANKER)
+
+        Returns:
+            List products, similarity_score là điểm sau khi fuse
+        """
+        text_weight = Config.DEFAULT_TEXT_WEIGHT if text_weight is None else text_weight
+        image_weight = Config.DEFAULT_IMAGE_WEIGHT if image_weight is None else image_weight
+        ranker = ranker or Config.HYBRID_RANKER
+
+        text_vector = self.get_query_vector(text) if text else None
+        if image_vector is None and image_url:
+            try:
+                image_vector = self.embedding_service.embed_image(image_url, normalize_output=True).tolist()
+            except Exception as e:
+                print(f"Error embedding query image: {e}")
+
+        # Chỉ có 1 modality → search thường
+        if image_vector is None:
+            return self.search_products(text_vector, top_k, filters) if text_vector is not None else []
+        if text_vector is None:
+            return self.search_by_image_vector(image_vector, top_k, filters)
+
+        filter_expr = self._build_filter_expression(filters)
+        candidate_limit = top_k * 2
+        requests = [("image_vector", image_vector, image_weight),
+                    ("description_vector", text_vector, text_weight)]
+
+        with self._routed_partitions(filters) as partitions:
+            if partitions == []:
+                return []
+            if HYBRID_SEARCH_AVAILABLE and hasattr(self.collection, "hybrid_search"):
+                try:
+                    reqs = [
+                        AnnSearchRequest(data=self._search_data([vector]), anns_field=field,
+                                         param=self._search_params(candidate_limit, filter_expr, field),
+                                         limit=candidate_limit, expr=filter_expr)
+                        for field, vector, _ in requests
+                    ]
+                    rerank = (RRFRanker(Config.RRF_K) if ranker == "rrf"
+                              else WeightedRanker(*[weight for _, _, weight in requests]))
+                    results = self.collection.hybrid_search(
+                        reqs, rerank, limit=top_k, partition_names=partitions, output_fields=self.OUTPUT_FIELDS
+                    )
+                    return self._format_search_results(results)
+                except Exception as e:
+                    print(f"Native hybrid search failed, fusing locally: {e}")
+
+            # Fallback: 2 ANN search rồi fuse phía client
+            ranked_lists = []
+            for field, vector, weight in requests:
+                results = self.collection.search(
+                    data=self._search_data([vector]),
+                    anns_field=field,
+                    param=self._search_params(candidate_limit, filter_expr, field),
+                    limit=candidate_limit,
+                    output_fields=self.OUTPUT_FIELDS,
+                    expr=filter_expr,
+                    partition_names=partitions
+                )
+                ranked_lists.append((self._format_search_results(results), weight))
+
+        return self._fuse_ranked_results(ranked_lists, top_k, ranker)
+
+    @staticmethod
+    def _fuse_ranked_results(ranked_lists: List[tuple], top_k: int, ranker: str = "weighted") -> List[Dict]:
+        """
+        Fuse nhiều danh sách kết quả theo id
+
+        - "weighted": tổng weight * similarity_score
+        - "rrf": tổng weight / (RRF_K + rank), rank bắt đầu từ 1
+        """
+        fused: Dict[str, Dict] = {}
+        scores: Dict[str, float] = {}
+
+        for products, weight in ranked_lists:
+            for rank, product in enumerate(products, 1):
+                product_id = product["id"]
+                if ranker == "rrf":
+                    score = weight / (Config.RRF_K + rank)
+                else:
+                    score = weight * float(product["similarity_score"])
+                scores[product_id] = scores.get(product_id, 0.0) + score
+                fused.setdefault(product_id, product)
+
+        ranked_ids = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        results = []
+        for product_id in ranked_ids:
+            product = dict(fused[product_id])
+            product["similarity_score"] = scores[product_id]
+            results.append(product)
+        return results
+
+    def fetch_description_vectors(self, ids: List[str], chunk_size: int = 500) -> Dict[str, np.ndarray]:
+        """Lấy description_vector đã lưu trong Milvus theo primary key (query theo chunk)"""
+        vectors = {}
+        unique_ids = list(dict.fromkeys(id_val for id_val in ids if id_val))
+        for i in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[i:i + chunk_size]
+            rows = self.collection.query(
+                expr=f"id_sanpham in {json.dumps(chunk, ensure_ascii=False)}",
+                output_fields=["id_sanpham", "description_vector"],
+                limit=len(chunk)
+            )
+            for row in rows:
+                vectors[row["id_sanpham"]] = from_milvus_vector(row["description_vector"], self.vector_dtype)
+        return vectors
+
+    def _candidate_description_matrix(self, candidates: List[Dict]) -> np.ndarray:
+        """
+        Ma trận description vectors của candidates (n x dim): dùng vector lưu sẵn
+        trong Milvus, chỉ embed lại những candidate không lấy được vector
+        """
+        try:
+            stored = self.fetch_description_vectors([candidate['id'] for candidate in candidates])
+        except Exception as e:
+            print(f"Error fetching stored description vectors: {e}")
+            stored = {}
+
+        missing = [candidate['description'] or "" for candidate in candidates if candidate['id'] not in stored]
+        embedded = iter(self.get_query_vectors(missing)) if missing else iter(())
+
+        return np.vstack([
+            stored[candidate['id']] if candidate['id'] in stored else next(embedded)
+            for candidate in candidates
+        ]).astype(np.float32, copy=False)
+
     def search_with_filters(self, query_vector: List[float], filters: Dict[str, Any],
                             top_k: int = Config.TOP_K) -> List[Dict]:
         """Legacy method - redirect to new search_products"""
         return self.search_products(query_vector, top_k, filters)
 
+    def search_vectors_batch(self, vectors: List[List[float]], anns_field: str = "description_vector",
+                             top_k: int = Config.TOP_K,
+                             filters: Optional[Dict[str, Any]] = None,
+                             chunk_size: int = Config.SEARCH_BATCH_SIZE) -> List[List[Dict]]:
+        """
+        Multi-vector ANN search: gửi nhiều query vectors trong 1 request (theo chunk)
+        rồi tách kết quả lại theo từng query
+
+        Returns:
+            List kết quả, cùng thứ tự với vectors
+        """
+        filter_expr = self._build_filter_expression(filters)
+        search_params = self._search_params(top_k, filter_expr, anns_field)
+        all_results = []
+
+        with self._routed_partitions(filters) as partitions:
+            if partitions == []:
+                return [[] for _ in vectors]
+            for i in range(0, len(vectors), chunk_size):
+                results = self.collection.search(
+                    data=self._search_data(vectors[i:i + chunk_size]),
+                    anns_field=anns_field,
+                    param=search_params,
+                    limit=top_k,
+                    output_fields=self.OUTPUT_FIELDS,
+                    expr=filter_expr,
+                    partition_names=partitions
+                )
+                all_results.extend(self._format_hits(hits) for hits in results)
+
+        return all_results
+
     def batch_search_texts(self, texts: List[str], top_k: int = Config.TOP_K,
                            filters: Optional[Dict[str, Any]] = None) -> List[List[Dict]]:
         """Batch search với filtering"""
         try:
-            text_vectors = self.embedding_service.embed_texts_batch(texts, normalize=True)
-
-            results = []
-            for vector in text_vectors:
-                search_result = self.search_products(vector.tolist(), top_k, filters)
-                results.append(search_result)
-
-            return results
+            text_vectors = self.get_query_vectors(texts)
+            return self.search_vectors_batch(text_vectors, "description_vector", top_k, filters)
 
         except Exception as e:
             print(f"Error in batch text search: {e}")
@@ -271,12 +581,11 @@ class SingleCollectionMilvusManager:
         try:
             image_vectors = self.embedding_service.embed_images_batch(image_urls, normalize=True)
 
-            results = []
-            for vector in image_vectors:
-                search_result = self.search_by_image_vector(vector.tolist(), top_k, filters)
-                results.append(search_result)
-
-            return results
+            try:
+                return self.search_vectors_batch(image_vectors, "image_vector", top_k, filters)
+            except Exception as e:
+                print(f"Image vector search failed, falling back to description vector: {e}")
+                return self.search_vectors_batch(image_vectors, "description_vector", top_k, filters)
 
         except Exception as e:
             print(f"Error in batch image search: {e}")
@@ -286,34 +595,68 @@ class SingleCollectionMilvusManager:
         """Format search results to include image URLs and all necessary data"""
         products = []
         for hits in results:
-            for hit in hits:
-                product_data = {
-                    "id": hit.entity.get("id_sanpham"),
-                    "description": hit.entity.get("description"),
-                    "image_url": hit.entity.get("image"),
-                    "metadata": hit.entity.get("metadata"),
-                    "engagement": {
-                        "like": hit.entity.get("like"),
-                        "comment": hit.entity.get("comment"),
-                        "share": hit.entity.get("share")
-                    },
-                    "platform": hit.entity.get("platform"),
-                    "store": hit.entity.get("name_store"),
-                    "date": hit.entity.get("date"),
-                    "similarity_score": hit.score
-                }
-                products.append(product_data)
+            products.extend(self._format_hits(hits))
+        return products
+
+    def _format_hits(self, hits) -> List[Dict]:
+        """Format hits của 1 query vector"""
+        products = []
+        for hit in hits:
+            product_data = {
+                "id": hit.entity.get("id_sanpham"),
+                "description": hit.entity.get("description"),
+                "image_url": hit.entity.get("image"),
+                "metadata": hit.entity.get("metadata"),
+                "engagement": {
+                    "like": hit.entity.get("like"),
+                    "comment": hit.entity.get("comment"),
+                    "share": hit.entity.get("share")
+                },
+                "platform": hit.entity.get("platform"),
+                "store": hit.entity.get("name_store"),
+                "date": hit.entity.get("date"),
+                "similarity_score": hit.score
+            }
+            products.append(product_data)
         return products
 
     def get_query_vector(self, text: str) -> List[float]:
-        """Convert text to vector embedding using Jina v4"""
+        """Convert text to vector embedding using Jina v4 (cached)"""
         try:
-            text_vector = self.embedding_service.embed_text(text, normalize_output=True)
-            return text_vector.tolist()
+            return self.get_query_vectors([text])[0].tolist()
         except Exception as e:
             print(f"Error generating text vector: {e}")
             return [0.0] * self.embedding_service.embedding_dim
 
+    def get_query_vectors(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embed nhiều text qua query cache, chỉ chạy model cho các text chưa có
+        trong cache (1 batch duy nhất)
+        """
+        model_name = self.embedding_service.model_name
+        normalized = [self.query_cache.normalize_text(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self.query_cache.get(model_name, text) for text in normalized]
+
+        missing = list(dict.fromkeys(text for text, vector in zip(normalized, vectors) if vector is None))
+        if missing:
+            embedded = dict(zip(missing, self.embedding_service.embed_texts_batch(missing, normalize=True)))
+            for text, vector in embedded.items():
+                # Zero vector = text rỗng hoặc lỗi embedding, không cache
+                if np.any(vector):
+                    self.query_cache.put(model_name, text, vector)
+            vectors = [vector if vector is not None else embedded[text]
+                       for text, vector in zip(normalized, vectors)]
+
+        return vectors
+
+    def get_query_cache_stats(self) -> Dict[str, float]:
+        """Hit/miss metrics của query embedding cache"""
+        return self.query_cache.get_stats()
+
+    def get_partition_stats(self) -> Dict[str, Any]:
+        """Partition đang load và số lần load / release partition cũ"""
+        return self.partition_manager.get_stats() if self.partition_manager else {}
+
     def get_image_vector(self, image_data: Union[str, bytes, Image.Image]) -> List[float]:
         """Convert image to vector embedding using Jina v4"""
         try:
@@ -357,7 +700,8 @@ class SingleCollectionMilvusManager:
         return {
             "embedding_service": self.embedding_service.get_model_info(),
             "milvus_collection": Config.COLLECTION_NAME,
-            "vector_dimensions": self.embedding_service.embedding_dim
+            "vector_dimensions": self.embedding_service.embedding_dim,
+            "query_cache": self.get_query_cache_stats()
         }
 
 # Global instance
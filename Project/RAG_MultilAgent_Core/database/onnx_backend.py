@@ -0,0 +1,238 @@
+"""
+Backend ONNX Runtime cho jina-clip-v2 trên CPU (node không có GPU)
+
+- export_onnx(): export text tower và vision tower sang ONNX (fp32, dynamic batch / sequence)
+- quantize_onnx(): int8 dynamic quantization (weights int8, activations quantize lúc chạy)
+- OnnxClipModel: chạy 2 tower bằng ONNX Runtime (CPUExecutionProvider hoặc OpenVINOExecutionProvider),
+  có get_text_features / get_image_features giống model PyTorch nên JinaV4EmbeddingService dùng thay thế được
+
+Cấu hình (env): JINA_BACKEND=torch | onnx | openvino, JINA_ONNX_DIR, JINA_ONNX_QUANTIZE, JINA_NUM_THREADS
+Export trước (khuyến nghị, tránh export lúc khởi động service):
+    python -m database.onnx_backend --output ~/.cache/jina_clip_v2_onnx --quantize
+Cần cài thêm: pip install onnx onnxruntime (hoặc onnxruntime-openvino)
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+
+BACKENDS = ("torch", "onnx", "openvino")
+DEFAULT_MODEL_NAME = "jinaai/jina-clip-v2"
+DEFAULT_OPSET = 17
+
+TEXT_MODEL_FILE = "text_model.onnx"
+VISION_MODEL_FILE = "vision_model.onnx"
+EXPORT_INFO_FILE = "export_info.json"
+
+
+def get_backend_name(backend: Optional[str] = None) -> str:
+    """Tên backend hợp lệ, mặc định đọc env JINA_BACKEND"""
+    name = (backend or os.getenv("JINA_BACKEND", "torch")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"JINA_BACKEND không hợp lệ: {name} (chọn {', '.join(BACKENDS)})")
+    return name
+
+
+def get_onnx_dir(model_dir: Optional[str] = None) -> str:
+    return os.path.expanduser(model_dir or os.getenv("JINA_ONNX_DIR", "~/.cache/jina_clip_v2_onnx"))
+
+
+def _model_file(filename: str, quantized: bool) -> str:
+    return filename.replace(".onnx", ".int8.onnx") if quantized else filename
+
+
+class _TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+
+class _VisionTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model.get_image_features(pixel_values=pixel_values)
+
+
+def export_onnx(output_dir: Optional[str] = None, model_name: str = DEFAULT_MODEL_NAME,
+                opset: int = DEFAULT_OPSET) -> str:
+    """
+    Export 2 tower của jina-clip-v2 (float32) sang ONNX
+
+    Returns:
+        Thư mục chứa text_model.onnx / vision_model.onnx
+    """
+    from transformers import AutoModel, AutoProcessor
+
+    output_dir = get_onnx_dir(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"📦 Export {model_name} sang ONNX tại {output_dir}...")
+
+    model = AutoModel.from_pretrained(model_name, trust_remote_code=True, torch_dtype=torch.float32).eval()
+    processor = AutoProcessor.from_pretrained(model_name, trust_remote_code=True)
+
+    text_inputs = processor(text=["xin chào", "áo thun nam cotton in hình"], return_tensors="pt",
+                            padding=True, truncation=True)
+    image_inputs = processor(images=[Image.new("RGB", (512, 512), "white")] * 2, return_tensors="pt")
+
+    start = time.time()
+    with torch.no_grad():
+        # Model > 2GB: torch lưu weights ra external data cạnh file .onnx
+        torch.onnx.export(
+            _TextTower(model),
+            (text_inputs["input_ids"], text_inputs["attention_mask"]),
+            os.path.join(output_dir, TEXT_MODEL_FILE),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["embeddings"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                          "attention_mask": {0: "batch", 1: "sequence"},
+                          "embeddings": {0: "batch"}},
+            opset_version=opset
+        )
+        print("✅ Export text tower")
+        torch.onnx.export(
+            _VisionTower(model),
+            (image_inputs["pixel_values"],),
+            os.path.join(output_dir, VISION_MODEL_FILE),
+            input_names=["pixel_values"],
+            output_names=["embeddings"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "embeddings": {0: "batch"}},
+            opset_version=opset
+        )
+        print("✅ Export vision tower")
+        embedding_dim = int(model.get_text_features(input_ids=text_inputs["input_ids"]).shape[-1])
+
+    info = {
+        'model_name': model_name,
+        'opset': opset,
+        'embedding_dim': embedding_dim,
+        'exported_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'export_seconds': round(time.time() - start, 1),
+    }
+    with open(os.path.join(output_dir, EXPORT_INFO_FILE), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+
+    del model
+    return output_dir
+
+
+def quantize_onnx(model_dir: Optional[str] = None) -> str:
+    """Int8 dynamic quantization cho cả 2 tower (*.int8.onnx)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    model_dir = get_onnx_dir(model_dir)
+    for filename in (TEXT_MODEL_FILE, VISION_MODEL_FILE):
+        source = os.path.join(model_dir, filename)
+        target = os.path.join(model_dir, _model_file(filename, quantized=True))
+        quantize_dynamic(source, target, weight_type=QuantType.QInt8, use_external_data_format=True)
+        print(f"✅ Quantize int8: {target} ({os.path.getsize(target) / 2 ** 20:.0f} MB)")
+    return model_dir
+
+
+def _to_numpy(value) -> np.ndarray:
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu().numpy()
+    return np.asarray(value)
+
+
+class OnnxClipModel:
+    """Thay thế model PyTorch trong JinaV4EmbeddingService: get_text_features / get_image_features qua ONNX Runtime"""
+
+    def __init__(self, model_dir: Optional[str] = None, quantized: bool = False, backend: str = "onnx",
+                 num_threads: Optional[int] = None):
+        """
+        Args:
+            model_dir: Thư mục đã export (mặc định JINA_ONNX_DIR)
+            quantized: Dùng bản int8 (*.int8.onnx)
+            backend: "onnx" (CPUExecutionProvider) hoặc "openvino" (OpenVINOExecutionProvider)
+            num_threads: intra-op threads (0 / None = để ONNX Runtime tự chọn)
+        """
+        import onnxruntime as ort
+
+        self.model_dir = get_onnx_dir(model_dir)
+        self.quantized = quantized
+        self.dtype = "onnx-int8" if quantized else "onnx-fp32"
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        providers = ["CPUExecutionProvider"]
+        if backend == "openvino":
+            if "OpenVINOExecutionProvider" in ort.get_available_providers():
+                providers.insert(0, "OpenVINOExecutionProvider")
+            else:
+                print("⚠️ Không có OpenVINOExecutionProvider (cài onnxruntime-openvino), dùng CPUExecutionProvider")
+        self.providers = providers
+
+        self.text_session = ort.InferenceSession(
+            os.path.join(self.model_dir, _model_file(TEXT_MODEL_FILE, quantized)), options, providers=providers)
+        self.vision_session = ort.InferenceSession(
+            os.path.join(self.model_dir, _model_file(VISION_MODEL_FILE, quantized)), options, providers=providers)
+        print(f"⚡ ONNX Runtime {self.dtype} ({', '.join(self.text_session.get_providers())})")
+
+    @staticmethod
+    def _run(session, inputs: Dict) -> torch.Tensor:
+        # Chỉ đưa các input mà graph cần (exporter bỏ input không dùng, ví dụ attention_mask)
+        feeds = {node.name: _to_numpy(inputs[node.name]) for node in session.get_inputs()}
+        return torch.from_numpy(session.run(None, feeds)[0])
+
+    def get_text_features(self, **inputs) -> torch.Tensor:
+        return self._run(self.text_session, inputs)
+
+    def get_image_features(self, **inputs) -> torch.Tensor:
+        return self._run(self.vision_session, inputs)
+
+    def float(self):
+        return self
+
+    def eval(self):
+        return self
+
+
+def load_onnx_model(backend: str = "onnx", model_dir: Optional[str] = None, quantized: Optional[bool] = None,
+                    model_name: str = DEFAULT_MODEL_NAME, num_threads: Optional[int] = None) -> OnnxClipModel:
+    """Load model ONNX, export / quantize lần đầu nếu thư mục chưa có"""
+    model_dir = get_onnx_dir(model_dir)
+    if quantized is None:
+        quantized = os.getenv("JINA_ONNX_QUANTIZE", "false").lower() == "true"
+    if num_threads is None:
+        num_threads = int(os.getenv("JINA_NUM_THREADS", "0"))
+
+    if not all(os.path.exists(os.path.join(model_dir, name)) for name in (TEXT_MODEL_FILE, VISION_MODEL_FILE)):
+        export_onnx(model_dir, model_name)
+    if quantized and not all(os.path.exists(os.path.join(model_dir, _model_file(name, True)))
+                             for name in (TEXT_MODEL_FILE, VISION_MODEL_FILE)):
+        quantize_onnx(model_dir)
+    return OnnxClipModel(model_dir, quantized=quantized, backend=backend, num_threads=num_threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export jina-clip-v2 sang ONNX (+ int8 quantization)")
+    parser.add_argument("--output", default=None, help="Thư mục output (mặc định JINA_ONNX_DIR)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--opset", type=int, default=DEFAULT_OPSET)
+    parser.add_argument("--quantize", action="store_true", help="Tạo thêm bản int8 dynamic quantization")
+    parser.add_argument("--skip-export", action="store_true", help="Chỉ quantize thư mục đã export")
+    args = parser.parse_args()
+
+    model_dir = args.output
+    if not args.skip_export:
+        model_dir = export_onnx(args.output, args.model, args.opset)
+    if args.quantize:
+        quantize_onnx(model_dir)
+
+
+if __name__ == "__main__":
+    main()
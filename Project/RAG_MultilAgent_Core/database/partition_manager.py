@@ -0,0 +1,213 @@
+"""
+Load / release partition theo tháng cho search theo khoảng thời gian
+
+Mode "hot": chỉ giữ HOT_PARTITION_MONTHS tháng gần nhất (+ '_default') trong query node,
+tháng cũ được load khi filter ngày cần tới và release theo LRU khi vượt MAX_COLD_PARTITIONS.
+Mode "all": load cả collection như trước, vẫn route search tới đúng partition khi có filter ngày.
+
+route() giữ (ref-count) các partition trả về cho tới khi gọi release() sau khi search xong,
+partition đang được search không bị release. Load partition chạy ngoài lock nên request cần
+tháng đã load không phải chờ request đang load tháng cũ.
+
+Lưu ý: load / release là thao tác phía server, áp dụng cho mọi client của collection
+(ingestion gọi collection.load(), DedupIndex fallback query "id_sanpham in [...]" chỉ thấy
+partition đang load). Chỉ bật mode "hot" trên collection / replica dành riêng cho search.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from pymilvus import Collection
+
+from database.time_partitions import (
+    DEFAULT_PARTITION, is_month_partition, partitions_for_range, recent_month_partitions
+)
+
+
+class PartitionLoadManager:
+    """Quản lý partition đang load và chọn partition_names cho từng request, thread-safe"""
+
+    def __init__(self, collection: Collection, mode: str = "all", hot_months: int = 3,
+                 max_cold_partitions: int = 6, refresh_seconds: float = 300):
+        """
+        Args:
+            collection: Collection đã có partition 'p_YYYYMM'
+            mode: "all" (load cả collection) hoặc "hot" (chỉ load tháng gần nhất)
+            hot_months: Số tháng gần nhất luôn được load
+            max_cold_partitions: Số tháng cũ tối đa giữ load cùng lúc (LRU)
+            refresh_seconds: Chu kỳ đọc lại danh sách partition (tháng mới do ingestion tạo)
+        """
+        self.collection = collection
+        self.mode = mode
+        self.hot_months = hot_months
+        self.max_cold_partitions = max_cold_partitions
+        self.refresh_seconds = refresh_seconds
+
+        self.partition_names: List[str] = []
+        self._loaded = set()
+        self._cold: "OrderedDict[str, None]" = OrderedDict()
+        self._inflight: Dict[str, int] = {}  # partition -> số request đang search
+        self._loading: Dict[str, threading.Event] = {}  # partition đang được load (ngoài lock)
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+        self.stats = {'cold_loads': 0, 'releases': 0}
+
+    @property
+    def has_month_partitions(self) -> bool:
+        return bool(self.partition_names)
+
+    @property
+    def hot_mode(self) -> bool:
+        return self.mode == "hot" and self.has_month_partitions
+
+    def load_initial(self):
+        """Load collection lúc khởi động: cả collection hoặc chỉ hot partitions"""
+        with self._lock:
+            self._refresh(force=True)
+            if not self.hot_mode:
+                self.collection.load()
+                return
+
+            hot = self._hot_partitions()
+            self.collection.load(partition_names=hot)
+            self._loaded = set(hot)
+            print(f"🔥 Load hot partitions: {', '.join(hot)} ({len(self.partition_names)} tháng tổng cộng)")
+            print("⚠️ Hot mode release partition phía server, ảnh hưởng cả ingestion / client khác "
+                  "dùng chung collection này")
+
+    def _hot_partitions(self) -> List[str]:
+        # '_default' chứa record không có date hợp lệ, luôn tồn tại khi collection không dùng partition key
+        return recent_month_partitions(self.partition_names, self.hot_months) + [DEFAULT_PARTITION]
+
+    def _refresh(self, force: bool = False) -> List[str]:
+        """
+        Đọc lại danh sách partition; tháng mới thành hot, tháng hết hot chuyển sang LRU cold
+
+        Returns:
+            Hot partitions chưa load (caller load ngoài lock)
+        """
+        if not force and time.time() - self._last_refresh < self.refresh_seconds:
+            return []
+        self._last_refresh = time.time()
+        self.partition_names = sorted(
+            partition.name for partition in self.collection.partitions if is_month_partition(partition.name)
+        )
+        if not self.hot_mode or not self._loaded:
+            return []
+
+        hot = self._hot_partitions()
+        for name in self._loaded - set(hot):
+            if name not in self._cold:
+                self._cold[name] = None
+        for name in hot:
+            self._cold.pop(name, None)
+        return hot
+
+    def _claim_loads(self, names: List[str]) -> tuple:
+        """Chia partition chưa load thành phần request này tự load và phần đang được request khác load"""
+        mine, waits = [], []
+        for name in dict.fromkeys(names):
+            if name in self._loaded:
+                continue
+            if name in self._loading:
+                waits.append(self._loading[name])
+            else:
+                self._loading[name] = threading.Event()
+                mine.append(name)
+        return mine, waits
+
+    def _load(self, names: List[str], waits: List[threading.Event]):
+        """Load partitions đã claim (gọi ngoài lock), rồi chờ các partition request khác đang load"""
+        try:
+            if names:
+                self.collection.load(partition_names=names)
+                with self._lock:
+                    self._loaded.update(names)
+                print(f"📥 Load partitions: {', '.join(names)}")
+        finally:
+            with self._lock:
+                for name in names:
+                    self._loading.pop(name).set()
+        for event in waits:
+            event.wait()
+
+    def _trim_cold(self, keep: List[str]):
+        """Release tháng cũ ít dùng nhất khi vượt max_cold_partitions (bỏ qua partition đang cần / đang search)"""
+        keep = set(keep)
+        for name in list(self._cold):
+            if len(self._cold) <= self.max_cold_partitions:
+                break
+            if name in keep or self._inflight.get(name) or name in self._loading:
+                continue
+            self.collection.partition(name).release()
+            self._cold.pop(name)
+            self._loaded.discard(name)
+            self.stats['releases'] += 1
+            print(f"📤 Release partition {name}")
+
+    def route(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> Optional[List[str]]:
+        """
+        partition_names cho 1 request theo khoảng [start_ts, end_ts)
+
+        Ở mode "hot", partition trả về được giữ cho tới khi gọi release(partitions) sau khi search xong.
+
+        Returns:
+            None nếu không giới hạn partition, list rỗng nếu khoảng ngày không có partition nào
+        """
+        with self._lock:
+            hot_missing = self._refresh()
+            if not self.has_month_partitions:
+                return None
+            if start_ts is None and end_ts is None:
+                if not self.hot_mode:
+                    return None
+                targets = sorted(self._loaded | set(self._hot_partitions()))
+            else:
+                targets = partitions_for_range(self.partition_names, start_ts, end_ts)
+            if not self.hot_mode or not targets:
+                return targets
+
+            hot = set(self._hot_partitions())
+            cold = [name for name in targets if name not in hot]
+            if any(name not in self._loaded for name in cold):
+                self.stats['cold_loads'] += 1
+            for name in targets:
+                self._inflight[name] = self._inflight.get(name, 0) + 1
+            for name in cold:
+                self._cold[name] = None
+                self._cold.move_to_end(name)
+            mine, waits = self._claim_loads(hot_missing + targets)
+
+        try:
+            self._load(mine, waits)
+        except Exception:
+            self.release(targets)
+            raise
+
+        with self._lock:
+            self._trim_cold(keep=targets)
+        return targets
+
+    def release(self, names: Optional[List[str]]):
+        """Trả các partition route() đã giữ, release tháng cũ còn vượt giới hạn khi không còn ai search"""
+        if not names or not self.hot_mode:
+            return
+        with self._lock:
+            for name in names:
+                count = self._inflight.get(name, 0) - 1
+                if count > 0:
+                    self._inflight[name] = count
+                else:
+                    self._inflight.pop(name, None)
+            self._trim_cold(keep=[])
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'month_partitions': len(self.partition_names),
+                'loaded': sorted(self._loaded) if self.hot_mode else 'all',
+                'inflight': sum(self._inflight.values()),
+                **self.stats,
+            }
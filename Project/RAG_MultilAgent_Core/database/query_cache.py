@@ -0,0 +1,77 @@
+"""
+LRU + TTL cache cho text embedding của query
+Tránh chạy lại forward pass Jina CLIP v2 cho các query lặp lại trong cùng phiên chat
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class QueryEmbeddingCache:
+    """Cache (model_name, normalized text) -> vector, thread-safe"""
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 3600):
+        """
+        Args:
+            max_entries: Số vector tối đa giữ trong cache
+            ttl_seconds: Thời gian sống của mỗi entry (<= 0 để không hết hạn)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Chuẩn hoá whitespace để các query chỉ khác khoảng trắng dùng chung 1 entry"""
+        return re.sub(r'\s+', ' ', text or '').strip()
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Lấy vector đã cache, None nếu chưa có hoặc đã hết hạn"""
+        key = (model_name, self.normalize_text(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            created_at, vector = entry
+            if self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds:
+                del self._entries[key]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return vector
+
+    def put(self, model_name: str, text: str, vector: np.ndarray):
+        """Lưu vector (read-only) vào cache, evict entry ít dùng nhất nếu đầy"""
+        key = (model_name, self.normalize_text(text))
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.time(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Thống kê hit/miss của cache"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,108 @@
+"""
+Scalar fields và scalar index phục vụ filter (date / platform / name_store)
+
+- date_ts (INT64): thời điểm đăng dạng epoch giây, parse từ cột text `date`.
+  Giờ được giữ nguyên theo text gốc (không đổi timezone) để filter theo ngày
+  cho kết quả giống so sánh chuỗi 'YYYY-MM-DD' cũ.
+- STL_SORT cho date_ts, INVERTED cho platform / name_store
+- Tuỳ chọn partition key (platform hoặc name_store) để Milvus tự prune partition
+  khi filter theo field đó
+- embedding_model (VARCHAR): phiên bản model đã tạo vectors của record, dùng khi
+  re-embedding (reembed_collection.py) để biết record nào còn vectors của model cũ
+"""
+import calendar
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from pymilvus import Collection, DataType, FieldSchema
+
+DATE_TS_FIELD = "date_ts"
+EMBEDDING_MODEL_FIELD = "embedding_model"
+
+SCALAR_INDEXES: Dict[str, str] = {
+    DATE_TS_FIELD: "STL_SORT",
+    "platform": "INVERTED",
+    "name_store": "INVERTED",
+    EMBEDDING_MODEL_FIELD: "INVERTED",
+}
+
+PARTITION_KEY_FIELDS = ("platform", "name_store")
+DEFAULT_NUM_PARTITIONS = 16
+
+# 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM', 'YYYY-MM-DD HH:MM:SS(.ffffff)' (+ timezone bị bỏ qua)
+_DATE_PATTERN = re.compile(r"^(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?)?")
+
+
+def parse_date_ts(date_str: Any) -> int:
+    """Epoch giây của chuỗi date (giờ theo text gốc), 0 nếu không parse được"""
+    if isinstance(date_str, datetime):
+        return calendar.timegm(date_str.replace(tzinfo=None).timetuple())
+
+    text = str(date_str or "").strip()
+    match = _DATE_PATTERN.match(text)
+    if not match:
+        try:
+            dt = datetime.strptime(text, "%d/%m/%Y")
+        except ValueError:
+            return 0
+        return calendar.timegm(dt.timetuple())
+
+    year, month, day, hour, minute, second = (int(part or 0) for part in match.groups())
+    try:
+        return calendar.timegm(datetime(year, month, day, hour, minute, second).timetuple())
+    except ValueError:
+        return 0
+
+
+def date_ts_field() -> FieldSchema:
+    """FieldSchema của date_ts (thêm vào cuối schema)"""
+    return FieldSchema(name=DATE_TS_FIELD, dtype=DataType.INT64)
+
+
+def embedding_model_field() -> FieldSchema:
+    """FieldSchema của embedding_model (thêm sau date_ts)"""
+    return FieldSchema(name=EMBEDDING_MODEL_FIELD, dtype=DataType.VARCHAR, max_length=200)
+
+
+def embedding_model_version(model_name: str) -> str:
+    """Tag phiên bản model ghi vào embedding_model (EMBEDDING_MODEL_VERSION ghi đè tên model)"""
+    return os.getenv("EMBEDDING_MODEL_VERSION") or model_name
+
+
+def collection_partition_key(partition_key: Optional[str]) -> Optional[str]:
+    """Validate tên field dùng làm partition key"""
+    if partition_key and partition_key not in PARTITION_KEY_FIELDS:
+        raise ValueError(f"Partition key không hợp lệ: {partition_key} (có: {', '.join(PARTITION_KEY_FIELDS)})")
+    return partition_key or None
+
+
+def has_field(collection: Collection, field_name: str) -> bool:
+    """Collection có field này trong schema không (collection cũ chưa có date_ts)"""
+    return any(field.name == field_name for field in collection.schema.fields)
+
+
+def create_scalar_indexes(collection: Collection, fields: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """
+    Tạo scalar index cho các field có trong schema và chưa có index
+
+    Returns:
+        Dictionary {field: index_type} đã tạo
+    """
+    indexed = {index.field_name for index in collection.indexes}
+    created = {}
+    for field_name in fields or SCALAR_INDEXES:
+        if field_name in indexed or not has_field(collection, field_name):
+            continue
+        index_type = SCALAR_INDEXES[field_name]
+        collection.create_index(
+            field_name=field_name,
+            index_params={"index_type": index_type},
+            index_name=f"{field_name}_index"
+        )
+        created[field_name] = index_type
+
+    if created:
+        print(f"✅ Tạo scalar indexes: {', '.join(f'{k}={v}' for k, v in created.items())}")
+    return created
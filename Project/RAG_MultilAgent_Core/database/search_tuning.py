@@ -0,0 +1,146 @@
+"""
+Tự chọn tham số search (nprobe / ef / search_list) theo top_k, độ chọn lọc của filter
+và latency budget
+
+Bảng calibration được tạo offline bằng benchmark_index.py (ingestion) so với ground truth
+brute force. Khi chưa có bảng thì dùng heuristic theo top_k.
+"""
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from database.index_profiles import build_search_params, get_index_profile, get_profile_name
+
+# Filter càng chọn lọc thì IVF/graph càng phải duyệt rộng hơn mới đủ top_k kết quả
+MAX_FILTER_BOOST = 4.0
+
+
+class SearchParamTuner:
+    """Chọn search params cho mỗi request, thread-safe"""
+
+    def __init__(self,
+                 profile: Optional[str] = None,
+                 calibration_path: Optional[str] = None,
+                 target_recall: float = 0.95,
+                 latency_budget_ms: Optional[float] = None,
+                 selectivity_fn: Optional[Callable[[str], Optional[float]]] = None,
+                 selectivity_cache_size: int = 256):
+        """
+        Args:
+            profile: Index profile của collection
+            calibration_path: File JSON calibration (bỏ qua nếu không tồn tại)
+            target_recall: Recall@k mục tiêu khi chọn từ bảng calibration
+            latency_budget_ms: p99 tối đa cho phép (None = không giới hạn)
+            selectivity_fn: Hàm expr -> tỉ lệ rows khớp filter (0..1), None nếu không ước lượng được
+            selectivity_cache_size: Số filter expression giữ selectivity trong cache
+        """
+        self.profile = get_profile_name(profile)
+        self.target_recall = target_recall
+        self.latency_budget_ms = latency_budget_ms
+        self.selectivity_fn = selectivity_fn
+        self.selectivity_cache_size = selectivity_cache_size
+
+        profile_conf = get_index_profile(self.profile)
+        self.param_name, self.sweep = next(iter(profile_conf["sweep"].items()))
+        self.base_value = profile_conf["search_params"][self.param_name]
+
+        self.calibration = self._load_calibration(calibration_path)
+        self._selectivity_cache: "OrderedDict[str, Optional[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_calibration(self, path: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """{field: [rows]} của profile hiện tại, mỗi row có k, value, recall, p50_ms, p99_ms"""
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                table = json.load(f).get(self.profile, {})
+            calibration = {field: entry["rows"] for field, entry in table.items()
+                           if entry.get("param") == self.param_name}
+            print(f"📐 Load search calibration ({self.profile}): {', '.join(calibration) or 'trống'}")
+            return calibration
+        except Exception as e:
+            print(f"⚠️ Không đọc được search calibration {path}: {e}")
+            return {}
+
+    # === SELECTIVITY ===
+    def _selectivity(self, filter_expr: Optional[str]) -> Optional[float]:
+        if not filter_expr or self.selectivity_fn is None:
+            return None
+        with self._lock:
+            if filter_expr in self._selectivity_cache:
+                self._selectivity_cache.move_to_end(filter_expr)
+                return self._selectivity_cache[filter_expr]
+
+        try:
+            selectivity = self.selectivity_fn(filter_expr)
+        except Exception as e:
+            print(f"⚠️ Không ước lượng được selectivity của filter: {e}")
+            selectivity = None
+
+        with self._lock:
+            self._selectivity_cache[filter_expr] = selectivity
+            while len(self._selectivity_cache) > self.selectivity_cache_size:
+                self._selectivity_cache.popitem(last=False)
+        return selectivity
+
+    # === CHỌN THAM SỐ ===
+    def _from_calibration(self, rows: List[Dict[str, Any]], top_k: int,
+                          latency_budget_ms: Optional[float]) -> Optional[int]:
+        """Giá trị nhỏ nhất đạt target_recall trong budget, tại k calibrate gần nhất >= top_k"""
+        ks = sorted({row["k"] for row in rows})
+        if not ks:
+            return None
+        k = next((k for k in ks if k >= top_k), ks[-1])
+        candidates = sorted((row for row in rows if row["k"] == k), key=lambda row: row["value"])
+
+        if latency_budget_ms:
+            within_budget = [row for row in candidates if row["p99_ms"] <= latency_budget_ms]
+            candidates = within_budget or candidates[:1]
+
+        for row in candidates:
+            if row["recall"] >= self.target_recall:
+                return row["value"]
+        # Không có giá trị nào đạt recall → lấy recall cao nhất trong budget
+        return max(candidates, key=lambda row: row["recall"])["value"]
+
+    def _heuristic(self, top_k: int) -> int:
+        """Không có calibration: giữ giá trị mặc định cho top_k nhỏ, tăng dần theo top_k"""
+        if self.param_name == "ef":
+            # HNSW yêu cầu ef >= top_k
+            return max(self.base_value, top_k)
+        if self.param_name == "search_list":
+            return max(self.base_value, top_k)
+        # nprobe: mặc định cho top_k <= 20, gấp đôi mỗi khi top_k tăng 4 lần
+        scale = max(1.0, math.sqrt(top_k / 20))
+        return int(min(self.sweep[-1], round(self.base_value * scale)))
+
+    def get_search_params(self, top_k: int, filter_expr: Optional[str] = None,
+                          field: str = "description_vector",
+                          latency_budget_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Search params cho 1 request
+
+        Args:
+            top_k: Số kết quả cần lấy
+            filter_expr: Filter expression (dùng để ước lượng selectivity)
+            field: Vector field được search
+            latency_budget_ms: Override latency budget cho request này
+        """
+        budget = latency_budget_ms if latency_budget_ms is not None else self.latency_budget_ms
+        rows = self.calibration.get(field)
+        value = self._from_calibration(rows, top_k, budget) if rows else None
+        if value is None:
+            value = self._heuristic(top_k)
+
+        selectivity = self._selectivity(filter_expr)
+        if selectivity:
+            value = int(round(value * min(MAX_FILTER_BOOST, 1 / max(selectivity, 1e-6) ** 0.5)))
+
+        if self.param_name in ("ef", "search_list"):
+            value = max(value, top_k)
+
+        return build_search_params(self.profile, overrides={self.param_name: value})
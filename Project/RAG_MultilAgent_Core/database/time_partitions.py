@@ -0,0 +1,79 @@
+"""
+Partition theo tháng cho collection sản phẩm
+
+Mỗi tháng (theo date của sản phẩm) là một partition 'p_YYYYMM'; record không parse được
+date vào '_default'. Phía RAG chỉ load các tháng gần nhất (hot) và load tháng cũ khi filter
+cần, search chỉ gửi tới các partition khớp khoảng ngày.
+
+Partition theo tháng không dùng chung được với partition key (Milvus không cho tạo
+partition thủ công khi collection có partition key).
+"""
+import calendar
+import re
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+DEFAULT_PARTITION = "_default"
+PARTITION_PREFIX = "p_"
+
+_PARTITION_PATTERN = re.compile(r"^p_(\d{4})(\d{2})$")
+
+
+def month_partition_name(ts: int) -> str:
+    """Tên partition của epoch giây (date_ts), '_default' nếu ts không hợp lệ"""
+    if not ts or ts <= 0:
+        return DEFAULT_PARTITION
+    dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+    return f"{PARTITION_PREFIX}{dt.year:04d}{dt.month:02d}"
+
+
+def is_month_partition(name: str) -> bool:
+    return bool(_PARTITION_PATTERN.match(name))
+
+
+def partition_month_range(name: str) -> Optional[tuple]:
+    """(start_ts, end_ts) của partition tháng, end_ts không bao gồm"""
+    match = _PARTITION_PATTERN.match(name)
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    start = calendar.timegm((year, month, 1, 0, 0, 0))
+    end = calendar.timegm((year + month // 12, month % 12 + 1, 1, 0, 0, 0))
+    return start, end
+
+
+def partitions_for_range(partition_names: Iterable[str], start_ts: Optional[int] = None,
+                         end_ts: Optional[int] = None) -> List[str]:
+    """Các partition tháng giao với khoảng [start_ts, end_ts) (None = không giới hạn)"""
+    selected = []
+    for name in partition_names:
+        month_range = partition_month_range(name)
+        if month_range is None:
+            continue
+        month_start, month_end = month_range
+        if start_ts is not None and month_end <= start_ts:
+            continue
+        if end_ts is not None and month_start >= end_ts:
+            continue
+        selected.append(name)
+    return sorted(selected)
+
+
+def recent_month_partitions(partition_names: Iterable[str], months: int,
+                            now: Optional[datetime] = None) -> List[str]:
+    """Các partition của `months` tháng gần nhất (tính cả tháng hiện tại)"""
+    now = now or datetime.now(timezone.utc)
+    index = now.year * 12 + now.month - 1 - (months - 1)
+    start_ts = calendar.timegm((index // 12, index % 12 + 1, 1, 0, 0, 0))
+    return partitions_for_range(partition_names, start_ts, None)
+
+
+def ensure_partitions(collection, names: Iterable[str], known: set) -> None:
+    """Tạo partition chưa có (known là cache tên partition đã tồn tại, được cập nhật tại chỗ)"""
+    for name in names:
+        if name in known:
+            continue
+        if not collection.has_partition(name):
+            collection.create_partition(name)
+            print(f"🗂️  Tạo partition {name}")
+        known.add(name)
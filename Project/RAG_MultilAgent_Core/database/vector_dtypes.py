@@ -0,0 +1,77 @@
+"""
+Kiểu lưu vector trong Milvus: FLOAT (float32), FLOAT16, BFLOAT16
+
+FLOAT16 / BFLOAT16 giảm một nửa RAM của image_vector / description_vector
+(Milvus >= 2.4, index IVF_FLAT / IVF_SQ8 / IVF_PQ / HNSW). Kiểu được chọn qua biến
+môi trường MILVUS_VECTOR_DTYPE khi tạo collection mới; collection đã có thì đọc từ schema.
+Embedding vẫn tính và normalize ở float32, chỉ convert khi insert / search.
+BFLOAT16 gửi cho pymilvus dạng ndarray dtype ml_dtypes.bfloat16 (pymilvus không nhận bytes
+cho bfloat16: insert báo sai kiểu, search hiểu nhầm thành binary vector).
+"""
+import os
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+from pymilvus import Collection, DataType, FieldSchema
+
+DEFAULT_VECTOR_DTYPE = "FLOAT"
+
+VECTOR_DTYPES = {
+    "FLOAT": DataType.FLOAT_VECTOR,
+    "FLOAT16": getattr(DataType, "FLOAT16_VECTOR", None),
+    "BFLOAT16": getattr(DataType, "BFLOAT16_VECTOR", None),
+}
+
+BYTES_PER_DIM = {"FLOAT": 4, "FLOAT16": 2, "BFLOAT16": 2}
+
+
+def get_vector_dtype_name(name: Optional[str] = None) -> str:
+    """Tên kiểu vector đang dùng (tham số > MILVUS_VECTOR_DTYPE > FLOAT)"""
+    name = (name or os.getenv("MILVUS_VECTOR_DTYPE", DEFAULT_VECTOR_DTYPE)).upper()
+    if name not in VECTOR_DTYPES:
+        raise ValueError(f"Vector dtype không hợp lệ: {name} (có: {', '.join(VECTOR_DTYPES)})")
+    if VECTOR_DTYPES[name] is None:
+        raise ValueError(f"pymilvus hiện tại không hỗ trợ {name}_VECTOR (cần pymilvus >= 2.4)")
+    return name
+
+
+def vector_field(name: str, dim: int, dtype_name: Optional[str] = None) -> FieldSchema:
+    """FieldSchema cho vector field theo kiểu lưu"""
+    return FieldSchema(name=name, dtype=VECTOR_DTYPES[get_vector_dtype_name(dtype_name)], dim=dim)
+
+
+def detect_vector_dtype(collection: Collection, field_name: str = "description_vector") -> str:
+    """Kiểu vector của field trong collection đã có"""
+    for field in collection.schema.fields:
+        if field.name == field_name:
+            for name, dtype in VECTOR_DTYPES.items():
+                if dtype is not None and field.dtype == dtype:
+                    return name
+    return DEFAULT_VECTOR_DTYPE
+
+
+def to_bfloat16_array(vector: Any) -> np.ndarray:
+    """float32 → ndarray ml_dtypes.bfloat16 (round-to-nearest-even) cho pymilvus"""
+    import ml_dtypes
+
+    return np.asarray(vector, dtype=np.float32).astype(ml_dtypes.bfloat16)
+
+
+def to_milvus_vectors(vectors: Iterable[Any], dtype_name: str = DEFAULT_VECTOR_DTYPE) -> List[Any]:
+    """Convert list vectors (float32) sang dạng pymilvus nhận cho kiểu lưu tương ứng"""
+    if dtype_name == "FLOAT16":
+        return [np.asarray(vector, dtype=np.float16) for vector in vectors]
+    if dtype_name == "BFLOAT16":
+        return [to_bfloat16_array(vector) for vector in vectors]
+    return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+
+def from_milvus_vector(value: Any, dtype_name: str = DEFAULT_VECTOR_DTYPE) -> np.ndarray:
+    """Vector đọc từ query (list float / bytes / ndarray) → float32 ndarray"""
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], (bytes, bytearray)):
+        value = value[0]
+    if isinstance(value, (bytes, bytearray)):
+        if dtype_name == "BFLOAT16":
+            return (np.frombuffer(value, dtype=np.uint16).astype(np.uint32) << 16).view(np.float32)
+        return np.frombuffer(value, dtype=np.float16).astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
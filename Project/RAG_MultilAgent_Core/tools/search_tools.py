@@ -88,7 +88,7 @@ class SearchQueryProcessor:
                     related_terms = [k for k in keywords if k != keyword][:3]  # Limit to 3 related terms
                     expanded_terms.extend(related_terms)
 
-        return list(set(expanded_terms))  # Remove duplicates
+        return list(dict.fromkeys(expanded_terms))  # Remove duplicates, giữ thứ tự ổn định cho cache key
 
     @classmethod
     def create_structured_query(cls, query: str) -> str:
@@ -213,23 +213,26 @@ def multi_strategy_search_tool(query: str, strategies: List[str] = None, top_k:
     processor = SearchQueryProcessor()
 
     try:
+        strategy_queries = {}
         if 'exact' in strategies:
-            results['exact'] = milvus_manager.search_by_text_description(query, top_k, filters)
+            strategy_queries['exact'] = query
 
         if 'expanded' in strategies:
             expanded_terms = processor.expand_query_terms(query)
-            expanded_query = ' '.join(expanded_terms)
-            results['expanded'] = milvus_manager.search_by_text_description(expanded_query, top_k, filters)
+            strategy_queries['expanded'] = ' '.join(expanded_terms)
 
         if 'structured' in strategies:
-            structured_query = processor.create_structured_query(query)
-            results['structured'] = milvus_manager.search_by_text_description(structured_query, top_k, filters)
+            strategy_queries['structured'] = processor.create_structured_query(query)
 
         if 'fuzzy' in strategies:
             attributes = processor.extract_key_attributes(query)
             fuzzy_query = ' '.join([' '.join(values) for values in attributes.values()])
             if fuzzy_query:
-                results['fuzzy'] = milvus_manager.search_by_text_description(fuzzy_query, top_k, filters)
+                strategy_queries['fuzzy'] = fuzzy_query
+
+        # Embed 1 batch + 1 multi-vector search cho tất cả chiến lược
+        strategy_results = milvus_manager.batch_search_texts(list(strategy_queries.values()), top_k, filters)
+        results = dict(zip(strategy_queries.keys(), strategy_results))
 
         # Combine and deduplicate results
         all_results = []
@@ -355,15 +358,19 @@ def search_by_image_url_tool(image_url: str, top_k: int = 100,
 
 @tool
 def search_multimodal_tool(text: str = "", image_base64: str = "", top_k: int = 100,
-                           filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+                           filters: Optional[Dict[str, Any]] = None,
+                           text_weight: Optional[float] = None,
+                           image_weight: Optional[float] = None) -> List[Dict]:
     """
-    Tìm kiếm đa phương thức: tìm theo ảnh trước, sau đó lọc theo text với filtering
+    Tìm kiếm đa phương thức kết hợp ảnh và text (hybrid search) với filtering
 
     Args:
-        text: Mô tả text để lọc kết quả
-        image_base64: Hình ảnh dạng base64 để tìm kiếm chính
+        text: Mô tả text
+        image_base64: Hình ảnh dạng base64
         top_k: Số lượng kết quả trả về
         filters: Dict chứa filters cho date, name_store, platform
+        text_weight: Trọng số của text (mặc định theo config)
+        image_weight: Trọng số của ảnh (mặc định theo config)
     """
     try:
         image_url = None
@@ -383,7 +390,9 @@ def search_multimodal_tool(text: str = "", image_base64: str = "", top_k: int =
             text=processed_text,
             image_url=image_url,
             top_k=top_k,
-            filters=filters
+            filters=filters,
+            text_weight=text_weight,
+            image_weight=image_weight
         )
 
         if image_url and os.path.exists(image_url):
@@ -412,17 +421,32 @@ def search_products_with_filters_tool(query: str, filters: Dict[str, Any], top_k
 
 
 @tool
-def batch_search_descriptions_tool(descriptions: List[str], top_k: int = 100) -> List[List[Dict]]:
+def batch_search_descriptions_tool(descriptions: List[str], top_k: int = 100,
+                                   filters: Optional[Dict[str, Any]] = None,
+                                   rerank: bool = False) -> List[List[Dict]]:
     """
     Tìm kiếm batch cho nhiều mô tả text cùng lúc với xử lý nâng cao
 
+    Args:
+        descriptions: Danh sách mô tả sản phẩm
+        top_k: Số kết quả cho mỗi mô tả
+        filters: Dict chứa filters cho date, name_store, platform
+        rerank: Lấy top_k * 2 candidates rồi sắp xếp lại theo attribute matching
+                (giống search_by_description_tool)
+
     Returns:
         List các kết quả tìm kiếm cho từng mô tả
     """
     try:
         processor = SearchQueryProcessor()
         enhanced_descriptions = [processor.create_structured_query(desc) for desc in descriptions]
-        return milvus_manager.batch_search_texts(enhanced_descriptions, top_k)
+
+        if not rerank:
+            return milvus_manager.batch_search_texts(enhanced_descriptions, top_k, filters)
+
+        batch_results = milvus_manager.batch_search_texts(enhanced_descriptions, top_k * 2, filters)
+        return [processor.score_results(results, desc)[:top_k]
+                for results, desc in zip(batch_results, descriptions)]
     except Exception as e:
         return [[{"error": f"Error in batch search: {str(e)}"}] for _ in descriptions]
 
@@ -568,11 +592,10 @@ def find_trend_clusters_tool(descriptions: List[str], similarity_threshold: floa
     try:
         from collections import defaultdict
 
-        embedding_service = milvus_manager.embedding_service
         processor = SearchQueryProcessor()
 
         enhanced_descriptions = [processor.create_structured_query(desc) for desc in descriptions]
-        embeddings = embedding_service.embed_texts_batch(enhanced_descriptions, normalize=True)
+        embeddings = milvus_manager.get_query_vectors(enhanced_descriptions)
 
         import numpy as np
         clusters = []
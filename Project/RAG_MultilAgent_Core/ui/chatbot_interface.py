@@ -10,6 +10,8 @@ import xlsxwriter
 from PIL import Image
 from collections import Counter
 from data.data_processor import safe_int_convert, parse_engagement_string
+from utils.image_cache import get_default_cache
+from utils.http_fetcher import get_default_fetcher
 import time
 from datetime import datetime
 import uuid
@@ -72,18 +74,18 @@ def get_cached_products(search_id=None):
 
 @st.cache_data
 def download_image_from_url(url):
-    """Download image from URL and return as bytes - CACHED"""
+    """Download image from URL and return as bytes - CACHED (shared on-disk image cache)"""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.content
+        return get_default_cache().get_or_fetch(url, _fetch_image_bytes)
     except Exception as e:
         return None
 
 
+def _fetch_image_bytes(url):
+    """Fetch image bytes on image cache miss"""
+    return get_default_fetcher().fetch(url, timeout=10)
+
+
 @st.cache_data
 def create_excel_metadata(product_data, rank):
     """Create Excel metadata file - CACHED"""
@@ -11,6 +11,8 @@ from .helpers import (
     get_top_items_from_dict,
     format_list_for_display
 )
+from .http_fetcher import HttpFetcher, AsyncHttpFetcher, get_default_fetcher, get_default_async_fetcher
+from .image_cache import ImageCache, get_default_cache
 __all__ = [
     'AgentState',
     'safe_int_convert',
@@ -20,5 +22,11 @@ __all__ = [
     'deduplicate_products',
     'validate_image_base64',
     'get_top_items_from_dict',
-    'format_list_for_display'
+    'format_list_for_display',
+    'HttpFetcher',
+    'AsyncHttpFetcher',
+    'get_default_fetcher',
+    'get_default_async_fetcher',
+    'ImageCache',
+    'get_default_cache'
 ]
@@ -0,0 +1,280 @@
+"""
+Image cache trên đĩa, content-addressed theo hash của URL
+
+Lưu bytes ảnh gốc và các biến thể đã resize sẵn (512px cho Qwen2.5-VL, kích thước
+input của Jina CLIP v2), dùng chung giữa labeling, embedding và UI.
+Giới hạn dung lượng bằng LRU eviction theo tổng số bytes. Index LRU được dựng lười
+(quét thư mục ở lần evict đầu tiên), process chỉ đọc cache không phải quét cả thư mục.
+Mỗi process tự evict theo index của mình, thứ tự LRU giữa các process dựa vào mtime.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from PIL import Image
+
+from utils.http_fetcher import get_default_fetcher
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pod_image_cache")
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3  # 5 GB
+
+# variant -> (kích thước cạnh dài tối đa, chất lượng JPEG)
+VARIANTS = {
+    'vlm': (512, 90),    # Input cho Qwen2.5-VL
+    'clip': (512, 95),   # Input size của Jina CLIP v2
+}
+
+
+class ImageCache:
+    """Cache ảnh trên đĩa với LRU eviction theo byte budget (thread-safe)"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir: Thư mục lưu cache (có thể dùng chung giữa nhiều process)
+            max_bytes: Tổng dung lượng tối đa của cache
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # path -> size, cũ nhất ở đầu
+        self._total_bytes = 0
+        self._index_loaded = False
+        self._index_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # === INDEX ===
+    def _ensure_index(self):
+        """
+        Quét thư mục cache 1 lần (lần đầu cần tổng dung lượng), sắp xếp theo thời gian
+        truy cập để dựng lại thứ tự LRU. File đã đọc / ghi trong process giữ vị trí mới nhất.
+        """
+        if self._index_loaded:
+            return
+        with self._index_lock:
+            if self._index_loaded:
+                return
+            files = self._scan()
+            with self._lock:
+                entries: "OrderedDict[str, int]" = OrderedDict(
+                    (path, size) for _, path, size in files if path not in self._entries
+                )
+                entries.update(self._entries)
+                self._entries = entries
+                self._total_bytes = sum(entries.values())
+                self._index_loaded = True
+
+    def _scan(self) -> list:
+        """[(mtime, path, size)] của các file trong cache, cũ nhất ở đầu"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, path, st.st_size))
+
+        files.sort()
+        return files
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        """Hash của URL dùng làm key"""
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, url: str, variant: str) -> str:
+        key = self.url_key(url)
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{variant}")
+
+    # === READ / WRITE ===
+    def _read(self, path: str) -> Optional[bytes]:
+        """Đọc file, cập nhật thứ tự LRU"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if not data:
+                raise ValueError("File rỗng")
+            # Lưu thời gian truy cập xuống đĩa để process khác thấy được thứ tự LRU
+            os.utime(path, None)
+        except (OSError, ValueError):
+            # File bị xoá bởi process khác hoặc rỗng
+            with self._lock:
+                size = self._entries.pop(path, None)
+                if size is not None:
+                    self._total_bytes -= size
+            return None
+
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+            else:
+                self._entries[path] = len(data)
+                self._total_bytes += len(data)
+        return data
+
+    def _write(self, path: str, data: bytes):
+        """Ghi atomic (file tạm + rename) rồi evict nếu vượt budget"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            old_size = self._entries.pop(path, 0)
+            self._entries[path] = len(data)
+            self._total_bytes += len(data) - old_size
+        self._evict()
+
+    def _evict(self):
+        """Xoá các file ít dùng nhất cho tới khi nằm trong byte budget"""
+        self._ensure_index()
+        to_remove = []
+        with self._lock:
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                path, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                self.stats['evictions'] += 1
+                to_remove.append(path)
+
+        for path in to_remove:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # === PUBLIC API ===
+    def get(self, url: str, variant: str = 'raw') -> Optional[bytes]:
+        """Lấy ảnh từ cache, None nếu chưa có"""
+        data = self._read(self._path(url, variant))
+        with self._lock:
+            self.stats['hits' if data is not None else 'misses'] += 1
+        return data
+
+    def put(self, url: str, data: bytes, variant: str = 'raw'):
+        """Lưu ảnh vào cache"""
+        self._write(self._path(url, variant), data)
+
+    def get_or_fetch(self, url: str, fetch_fn: Optional[Callable[[str], bytes]] = None) -> bytes:
+        """
+        Lấy bytes ảnh gốc, tải về và lưu cache nếu chưa có
+
+        Args:
+            url: URL ảnh
+            fetch_fn: Hàm tải ảnh khi cache miss (mặc định dùng HTTP fetcher dùng chung)
+
+        Returns:
+            bytes ảnh gốc
+        """
+        data = self.get(url)
+        if data is None:
+            data = (fetch_fn or get_default_fetcher().fetch)(url)
+            self.put(url, data)
+        return data
+
+    def get_variant(self, url: str, variant: str, raw_bytes: Optional[bytes] = None,
+                    fetch_fn: Optional[Callable[[str], bytes]] = None) -> bytes:
+        """
+        Lấy biến thể đã resize ('vlm', 'clip'), tạo và lưu cache nếu chưa có
+
+        Args:
+            url: URL ảnh
+            variant: Tên biến thể trong VARIANTS
+            raw_bytes: Bytes ảnh gốc nếu đã có sẵn (tránh đọc/tải lại)
+            fetch_fn: Hàm tải ảnh khi cache miss
+
+        Returns:
+            bytes JPEG của biến thể
+        """
+        if variant not in VARIANTS:
+            raise ValueError(f"Variant không hợp lệ: {variant}")
+
+        data = self.get(url, variant)
+        if data is not None:
+            return data
+
+        if raw_bytes is None:
+            raw_bytes = self.get_or_fetch(url, fetch_fn)
+
+        max_side, quality = VARIANTS[variant]
+        data = resize_image_bytes(raw_bytes, max_side, quality)
+        self.put(url, data, variant)
+        return data
+
+    def clear(self):
+        """Xoá toàn bộ cache trên đĩa"""
+        self._ensure_index()
+        with self._lock:
+            paths = list(self._entries.keys())
+            self._entries.clear()
+            self._total_bytes = 0
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, int]:
+        """Thống kê cache"""
+        self._ensure_index()
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            stats['total_bytes'] = self._total_bytes
+            stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+def resize_image_bytes(image_bytes: bytes, max_side: int, quality: int) -> bytes:
+    """Resize giữ aspect ratio và encode lại thành JPEG (RGB, nền trắng cho ảnh có alpha)"""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        else:
+            img = img.copy()
+
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=quality, optimize=True)
+        return output.getvalue()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ImageCache:
+    """
+    Cache dùng chung trong process. Thư mục và dung lượng lấy từ
+    IMAGE_CACHE_DIR / IMAGE_CACHE_MAX_BYTES để ingestion và UI trỏ cùng một chỗ.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ImageCache(
+                cache_dir=os.path.expanduser(os.getenv("IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR)),
+                max_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            )
+        return _default_cache